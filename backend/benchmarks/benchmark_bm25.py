@@ -0,0 +1,115 @@
+"""
+Benchmark: Suche im vereinfachten Modus
+Vergleicht den bisherigen Keyword-Scorer (Teilstring-Treffer je Norm) mit dem
+BM25-Index über Chunks: Latenz pro Anfrage und Überschneidung der Top-k-Normen.
+
+Aufruf aus dem backend-Verzeichnis (nach process_din_pdfs im vereinfachten Modus):
+    python benchmarks/benchmark_bm25.py [--index-dir din_norms/simple_index] [-k 5] [--runs 50]
+
+Der alte Scorer bekommt pro Norm den Text aus dem Chunk-Store; mit --legacy-chars 5000
+sieht er wie früher nur die ersten 5000 Zeichen jeder Norm.
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from bm25_index import BM25Index  # noqa: E402
+from chunk_store import ChunkStore  # noqa: E402
+
+QUERIES = [
+    "Beton Bewehrung Betondeckung",
+    "Brandschutz Feuerwiderstand Bauteile",
+    "Expositionsklasse Dauerhaftigkeit",
+    "Rissbreite Begrenzung Mindestbewehrung",
+    "Querkraft Bemessung Stahlbeton",
+    "Abdichtung Bauwerk Fugen",
+    "Einwirkungen Lasten Brücke",
+    "Tunnel Innenschale Ausführung",
+    "Temperatur Brandfall Festigkeit",
+    "Behälter Silos Flüssigkeiten"
+]
+
+
+def legacy_search(simple_db: dict, query: str, k: int) -> list:
+    """Bisheriger Scorer aus _find_relevant_simple"""
+    query_words = query.lower().split()
+    results = []
+    for din_norm, data in simple_db.items():
+        content_lower = data["content"].lower()
+        score = sum(1 for word in query_words if word in content_lower)
+        if score > 0:
+            results.append({"din_norm": din_norm, "score": score})
+    results.sort(key=lambda x: x["score"], reverse=True)
+    return results[:k]
+
+
+def bm25_search(index: BM25Index, chunks: ChunkStore, query: str, k: int) -> list:
+    return [
+        {"din_norm": chunks.get(doc_id)["din_norm"], "score": score}
+        for doc_id, score in index.search(query, k)
+    ]
+
+
+def timed(func, runs: int) -> float:
+    """Mittlere Laufzeit in Millisekunden"""
+    start = time.perf_counter()
+    for _ in range(runs):
+        func()
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Keyword-Scorer vs. BM25-Index")
+    parser.add_argument("--index-dir", type=Path, default=Path("din_norms/simple_index"))
+    parser.add_argument("--legacy-chars", type=int, default=0, help="Text je Norm für den alten Scorer kürzen")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = BM25Index.load(args.index_dir)
+    if index is None:
+        sys.exit(f"❌ Kein BM25-Index in {args.index_dir}")
+    chunks = ChunkStore(args.index_dir)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    # Eingabe für den alten Scorer: ein Text pro Norm, wie früher in simple_din_db.json
+    simple_db = {}
+    for record in chunks:
+        entry = simple_db.setdefault(record["din_norm"], {"content": ""})
+        entry["content"] += record["content"] + " "
+    if args.legacy_chars:
+        for entry in simple_db.values():
+            entry["content"] = entry["content"][:args.legacy_chars]
+
+    print(f"📚 {len(simple_db)} Normen, {index.doc_count} Chunks, {index.term_count} Terme "
+          f"(Laden {load_ms:.1f} ms)\n")
+    print(f"{'Anfrage':<42} {'alt (ms)':>9} {'BM25 (ms)':>10} {'Überschneidung':>15}")
+
+    total_legacy = total_bm25 = total_overlap = 0.0
+    for query in QUERIES:
+        legacy_ms = timed(lambda: legacy_search(simple_db, query, args.k), args.runs)
+        bm25_ms = timed(lambda: bm25_search(index, chunks, query, args.k), args.runs)
+
+        # Vergleich auf Norm-Ebene: der alte Scorer liefert ganze Normen, BM25 Chunks
+        legacy_norms = {r["din_norm"] for r in legacy_search(simple_db, query, args.k)}
+        bm25_norms = {r["din_norm"] for r in bm25_search(index, chunks, query, args.k)}
+        union = legacy_norms | bm25_norms
+        overlap = len(legacy_norms & bm25_norms) / len(union) if union else 1.0
+
+        total_legacy += legacy_ms
+        total_bm25 += bm25_ms
+        total_overlap += overlap
+        print(f"{query:<42} {legacy_ms:>9.3f} {bm25_ms:>10.3f} {overlap:>15.2f}")
+
+    n = len(QUERIES)
+    print(f"{'Mittelwert':<42} {total_legacy / n:>9.3f} {total_bm25 / n:>10.3f} {total_overlap / n:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Benchmark: Kompakte DIN-Vektorindizes
+Vergleicht den vollständigen FAISS-Store (flat, komplett im RAM) mit den
+quantisierten, per mmap geladenen Indizes (sq_fp16, sq8, ivfpq).
+
+Gemessen werden Recall@k gegenüber der exakten Suche, Latenz pro Anfrage
+(Suche + Lesen der Chunk-Texte) und der Arbeitsspeicher des Prozesses.
+
+Aufruf aus dem backend-Verzeichnis:
+    python benchmarks/benchmark_vector_index.py [--index-dir din_norms/din_index] [-k 5]
+    python benchmarks/benchmark_vector_index.py --synthetic 20000 --dim 1536
+
+Als Anfragen dienen leicht verrauschte Vektoren aus dem Index selbst, so dass
+keine Embedding-API benötigt wird. Jede Variante läuft in einem eigenen Prozess.
+"""
+
+import sys
+import json
+import time
+import pickle
+import argparse
+import resource
+import tempfile
+import subprocess
+from pathlib import Path
+
+import numpy as np
+import faiss
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from compact_index import INDEX_TYPES, CompactVectorIndex, build_compact_index  # noqa: E402
+
+
+def current_rss_mb() -> float:
+    """Aktuell residenter Speicher (Linux), sonst Spitzenwert"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_source(args):
+    """Vektoren und Chunk-Daten aus dem bestehenden Index oder synthetisch erzeugen"""
+    if args.synthetic:
+        # Themen-Cluster wie bei echten Norm-Embeddings statt gleichverteiltem Rauschen
+        rng = np.random.default_rng(42)
+        topics = rng.standard_normal((max(1, args.synthetic // 100), args.dim))
+        vectors = (topics[rng.integers(0, len(topics), args.synthetic)]
+                   + 0.6 * rng.standard_normal((args.synthetic, args.dim))).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        records = [
+            {"content": f"Synthetischer Chunk {i} " + "x" * 480, "din_norm": "SYN", "source": "synthetic.pdf",
+             "chunk_index": i}
+            for i in range(args.synthetic)
+        ]
+        return vectors, records
+
+    index = faiss.read_index(str(args.index_dir / "index.faiss"))
+    vectors = index.reconstruct_n(0, index.ntotal)
+    with open(args.index_dir / "index.pkl", "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    records = []
+    for position in range(index.ntotal):
+        doc = docstore.search(index_to_docstore_id[position])
+        records.append({
+            "content": doc.page_content,
+            "din_norm": doc.metadata.get("din_norm", "Unbekannt"),
+            "source": doc.metadata.get("source", ""),
+            "chunk_index": doc.metadata.get("chunk_index", 0)
+        })
+    return vectors, records
+
+
+def make_queries(vectors: np.ndarray, count: int) -> np.ndarray:
+    rng = np.random.default_rng(7)
+    picks = rng.choice(len(vectors), size=min(count, len(vectors)), replace=False)
+    queries = vectors[picks] + rng.normal(0, 0.02, size=(len(picks), vectors.shape[1])).astype(np.float32)
+    return (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+
+def measure_child(variant: str, directory: Path, queries_path: Path, k: int):
+    """Index laden, alle Anfragen ausführen und Messwerte als JSON ausgeben"""
+    queries = np.load(queries_path)
+    base_rss = current_rss_mb()
+
+    start = time.perf_counter()
+    if variant == "flat":
+        # Wie FAISS.load_local: Index und gepickelter Docstore komplett im RAM
+        index = faiss.read_index(str(directory / "index.faiss"))
+        with open(directory / "records.pkl", "rb") as f:
+            records = pickle.load(f)
+
+        def search(query):
+            distances, positions = index.search(query.reshape(1, -1), k)
+            return [(records[p], p) for p in positions[0] if p >= 0]
+    else:
+        compact = CompactVectorIndex(directory)
+
+        def search(query):
+            _, positions = compact.search_vectors(query, k)
+            return [(compact.record(int(p)), int(p)) for p in positions[0] if p >= 0]
+    load_seconds = time.perf_counter() - start
+    load_rss = current_rss_mb()
+
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        hits = search(query)
+        latencies.append(time.perf_counter() - start)
+        results.append([int(p) for _, p in hits])
+
+    latencies.sort()
+    print(json.dumps({
+        "variant": variant,
+        "load_seconds": load_seconds,
+        "latency_ms_p50": latencies[len(latencies) // 2] * 1000,
+        "latency_ms_p95": latencies[int(len(latencies) * 0.95)] * 1000,
+        "rss_after_load_mb": load_rss - base_rss,
+        "rss_after_queries_mb": current_rss_mb() - base_rss,
+        "results": results
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark kompakter DIN-Vektorindizes")
+    parser.add_argument("--index-dir", type=Path, default=Path("din_norms/din_index"))
+    parser.add_argument("--synthetic", type=int, default=0, help="N synthetische Vektoren statt echtem Index")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--types", nargs="+", default=[t for t in INDEX_TYPES if t != "flat"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--child", choices=INDEX_TYPES, help=argparse.SUPPRESS)
+    parser.add_argument("--child-dir", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--child-queries", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure_child(args.child, args.child_dir, args.child_queries, args.k)
+        return
+
+    vectors, records = load_source(args)
+    queries = make_queries(vectors, args.queries)
+
+    # Referenz: exakte Suche
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        np.save(tmp / "queries.npy", queries)
+
+        flat_dir = tmp / "flat"
+        flat_dir.mkdir()
+        faiss.write_index(exact, str(flat_dir / "index.faiss"))
+        with open(flat_dir / "records.pkl", "wb") as f:
+            pickle.dump(records, f)
+
+        variants = {"flat": flat_dir}
+        sizes = {"flat": (flat_dir / "index.faiss").stat().st_size}
+        for index_type in args.types:
+            meta = build_compact_index(tmp / index_type, vectors, records, index_type)
+            variants[index_type] = tmp / index_type
+            sizes[index_type] = (tmp / index_type / "index.faiss").stat().st_size
+            print(f"🗜️ {index_type}: {meta['factory']} in {meta['build_seconds']}s")
+        del exact, vectors, records
+
+        print(f"\n{len(queries)} Anfragen, k={args.k}, {len(truth)} Referenzergebnisse\n")
+        print(f"{'Variante':<9} {'Recall@k':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} "
+              f"{'RSS Laden (MB)':>15} {'RSS Suche (MB)':>15} {'Index (MB)':>11}")
+
+        for variant, directory in variants.items():
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", variant, "--child-dir", str(directory),
+                 "--child-queries", str(tmp / "queries.npy"), "-k", str(args.k)],
+                capture_output=True, text=True, check=True, cwd=BACKEND_DIR
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+
+            found = sum(len(set(r) & set(t)) for r, t in zip(result["results"], truth.tolist()))
+            recall = found / (len(truth) * args.k)
+            print(f"{variant:<9} {recall:>9.3f} {result['latency_ms_p50']:>9.2f} "
+                  f"{result['latency_ms_p95']:>9.2f} {result['rss_after_load_mb']:>15.1f} "
+                  f"{result['rss_after_queries_mb']:>15.1f} {sizes[variant] / 1024 / 1024:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
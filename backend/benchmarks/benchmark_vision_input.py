@@ -0,0 +1,103 @@
+"""
+Benchmark: Vision-Eingabe beim Plan-Upload
+Vergleicht die alte Bildaufbereitung (Seiten 1-5 rendern, PNG über Temp-Datei)
+mit dem Vision-Input-Builder (nur Seite 1, Kodierung im Speicher).
+
+Aufruf aus dem backend-Verzeichnis:
+    python benchmarks/benchmark_vision_input.py uploads/<plan>.pdf [--runs 3]
+
+Jede Variante läuft in einem eigenen Prozess, damit die Spitzen-RSS
+(ru_maxrss) nicht von der anderen Variante verfälscht wird.
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import resource
+import tempfile
+import subprocess
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+def run_legacy(pdf_path: Path) -> int:
+    """Bisheriger Weg aus analyze_technical_drawing"""
+    from pdf2image import convert_from_path
+
+    images = convert_from_path(pdf_path, dpi=150, first_page=1, last_page=5)
+    image = images[0]
+
+    img_buffer = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
+    image.save(img_buffer.name, 'PNG')
+    with open(img_buffer.name, 'rb') as img_file:
+        data = img_file.read()
+    img_base64 = base64.b64encode(data).decode('utf-8')
+    os.unlink(img_buffer.name)
+
+    return len(data) if img_base64 else 0
+
+
+def run_builder(pdf_path: Path) -> int:
+    """Neuer Weg über den Vision-Input-Builder"""
+    from vision_input import build_vision_inputs, describe_vision_inputs
+
+    inputs = build_vision_inputs(pdf_path, pages=[1], dpi=150)
+    return describe_vision_inputs(inputs)["bytes"]
+
+
+VARIANTS = {
+    "legacy": run_legacy,
+    "builder": run_builder
+}
+
+
+def measure_child(variant: str, pdf_path: Path):
+    """Eine Variante im aktuellen Prozess messen und als JSON ausgeben"""
+    start = time.perf_counter()
+    image_bytes = VARIANTS[variant](pdf_path)
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        "variant": variant,
+        "seconds": elapsed,
+        "image_bytes": image_bytes,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Vision-Eingabe (alt vs. neu)")
+    parser.add_argument("pdf", type=Path)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--child", choices=VARIANTS.keys(), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure_child(args.child, args.pdf)
+        return
+
+    print(f"📄 {args.pdf} ({args.pdf.stat().st_size / 1024:.0f} KB), {args.runs} Läufe je Variante\n")
+    print(f"{'Variante':<10} {'Latenz (s)':>12} {'Peak RSS (MB)':>15} {'Bild (KB)':>11}")
+
+    for variant in VARIANTS:
+        results = []
+        for _ in range(args.runs):
+            output = subprocess.run(
+                [sys.executable, __file__, str(args.pdf.resolve()), "--child", variant],
+                capture_output=True, text=True, check=True, cwd=BACKEND_DIR
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+        latency = sorted(r["seconds"] for r in results)[len(results) // 2]
+        peak_rss = max(r["peak_rss_mb"] for r in results)
+        image_kb = results[-1]["image_bytes"] / 1024
+        print(f"{variant:<10} {latency:>12.2f} {peak_rss:>15.1f} {image_kb:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
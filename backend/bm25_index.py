@@ -0,0 +1,258 @@
+"""
+BM25 Index
+Invertierter Index mit BM25-Ranking für den vereinfachten Modus (ohne LangChain, ohne numpy).
+Gespeichert werden die Postings als Binärdatei, die beim Suchen per mmap gelesen wird;
+im RAM liegen nur Vokabular und Dokumentlängen.
+"""
+
+import re
+import gzip
+import json
+import math
+import mmap
+import heapq
+import shutil
+import logging
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from chunk_store import ChunkStore, ChunkStoreWriter, swap_directory
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 3
+
+# Übliche BM25-Parameter
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+META_FILE = "bm25_meta.json"
+TERMS_FILE = "bm25_terms.json.gz"
+POSTINGS_FILE = "bm25_postings.bin"
+LENGTHS_FILE = "bm25_doc_lengths.bin"
+
+# Abschnittsnummern wie "4.4.1.2" bleiben ein Token, sonst Wortzeichen
+_TOKEN_PATTERN = re.compile(r"\d+(?:\.\d+)+|\w+", re.UNICODE)
+
+STOPWORDS = {
+    "der", "die", "das", "den", "dem", "des", "ein", "eine", "einer", "eines", "einem", "einen",
+    "und", "oder", "in", "im", "ist", "sind", "mit", "von", "vom", "zu", "zur", "zum", "auf", "für",
+    "bei", "nach", "als", "an", "am", "aus", "nicht", "wird", "werden", "kann", "sich", "es",
+    "the", "of", "and", "or", "to", "a", "an", "is", "are", "for", "with", "on", "by", "be"
+}
+
+
+def read_index_meta(directory: Path) -> Optional[Dict]:
+    """Metadaten eines gespeicherten Index (None, falls keiner oder veraltet)"""
+    meta_path = Path(directory) / META_FILE
+    if not meta_path.exists():
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == INDEX_VERSION else None
+
+
+def tokenize(text: str) -> List[str]:
+    """Kleinschreibung, Wort-Token ab 2 Zeichen, ohne Stoppwörter"""
+    return [
+        token for token in _TOKEN_PATTERN.findall(text.lower())
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+class BM25Index:
+    """Postings (Dokument, Termfrequenz) je Term plus Dokumentlängen"""
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.doc_lengths = array("I")
+        self.avgdl = 0.0
+        self._total_length = 0
+        # Beim Aufbau: Term -> [doc, tf, doc, tf, ...]
+        self._build_postings: Dict[str, array] = {}
+        # Nach dem Laden: Term -> [Offset, Dokumentfrequenz] in der Postings-Datei
+        self.terms: Dict[str, List[int]] = {}
+        self._postings_file = None
+        self._postings_data = None
+
+    @property
+    def doc_count(self) -> int:
+        return len(self.doc_lengths)
+
+    @property
+    def term_count(self) -> int:
+        return len(self.terms) or len(self._build_postings)
+
+    def add_document(self, text: str) -> int:
+        """Dokument aufnehmen; Dokument-ID = Reihenfolge der Aufrufe"""
+        doc_id = len(self.doc_lengths)
+        counts = Counter(tokenize(text))
+        length = sum(counts.values())
+        self.doc_lengths.append(length)
+        self._total_length += length
+        for term, tf in counts.items():
+            postings = self._build_postings.get(term)
+            if postings is None:
+                postings = self._build_postings[term] = array("I")
+            postings.append(doc_id)
+            postings.append(tf)
+        self.avgdl = self._total_length / len(self.doc_lengths)
+        return doc_id
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "BM25Index":
+        index = cls()
+        for text in texts:
+            index.add_document(text)
+        return index
+
+    def _postings(self, term: str) -> Optional[array]:
+        if self._build_postings:
+            return self._build_postings.get(term)
+
+        entry = self.terms.get(term)
+        if entry is None:
+            return None
+        offset, df = entry
+        postings = array("I")
+        postings.frombytes(self._postings_data[offset * 4:(offset + 2 * df) * 4])
+        return postings
+
+    def _idf(self, df: int) -> float:
+        return math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[int, float]]:
+        """Die k besten Dokumente als (Dokument-ID, Score)"""
+        if not self.doc_count:
+            return []
+
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings(term)
+            if not postings:
+                continue
+
+            idf = self._idf(len(postings) // 2)
+            for i in range(0, len(postings), 2):
+                doc_id, tf = postings[i], postings[i + 1]
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / self.avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def save(self, directory: Path):
+        """Postings, Vokabular und Dokumentlängen in `directory` schreiben"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        terms = {}
+        offset = 0
+        with open(directory / POSTINGS_FILE, "wb") as f:
+            for term, postings in self._build_postings.items():
+                postings.tofile(f)
+                terms[term] = [offset, len(postings) // 2]
+                offset += len(postings)
+
+        with gzip.open(directory / TERMS_FILE, "wt", encoding="utf-8") as f:
+            json.dump(terms, f, ensure_ascii=False, separators=(",", ":"))
+        with open(directory / LENGTHS_FILE, "wb") as f:
+            self.doc_lengths.tofile(f)
+        with open(directory / META_FILE, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": INDEX_VERSION,
+                "k1": self.k1,
+                "b": self.b,
+                "avgdl": self.avgdl,
+                "doc_count": self.doc_count,
+                "term_count": len(terms)
+            }, f, indent=2)
+
+        logger.info(f"💾 BM25-Index gespeichert: {self.doc_count} Chunks, {len(terms)} Terme")
+
+    @classmethod
+    def load(cls, directory: Path) -> Optional["BM25Index"]:
+        """Gespeicherten Index öffnen (None bei fehlendem oder veraltetem Index)"""
+        directory = Path(directory)
+        meta = read_index_meta(directory)
+        if meta is None:
+            return None
+        try:
+            index = cls(k1=meta["k1"], b=meta["b"])
+            index.avgdl = meta["avgdl"]
+            with gzip.open(directory / TERMS_FILE, "rt", encoding="utf-8") as f:
+                index.terms = json.load(f)
+            with open(directory / LENGTHS_FILE, "rb") as f:
+                index.doc_lengths.frombytes(f.read())
+
+            index._postings_file = open(directory / POSTINGS_FILE, "rb")
+            if (directory / POSTINGS_FILE).stat().st_size:
+                index._postings_data = mmap.mmap(index._postings_file.fileno(), 0, access=mmap.ACCESS_READ)
+            return index
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"⚠️ BM25-Index nicht lesbar: {e}")
+            return None
+
+    def close(self):
+        if self._postings_data is not None:
+            self._postings_data.close()
+        if self._postings_file is not None:
+            self._postings_file.close()
+
+
+class LexicalIndex:
+    """BM25-Index plus Chunk-Store in einem Verzeichnis (Lesezugriff)"""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.bm25 = BM25Index.load(self.directory)
+        if self.bm25 is None:
+            raise ValueError(f"Kein gültiger BM25-Index in {self.directory}")
+        self.chunks = ChunkStore(self.directory)
+        # Zum Erkennen eines zwischenzeitlich neu geschriebenen Index
+        self.loaded_mtime = self.mtime()
+
+    @staticmethod
+    def exists(directory: Path) -> bool:
+        return read_index_meta(directory) is not None
+
+    @property
+    def doc_count(self) -> int:
+        return self.bm25.doc_count
+
+    def mtime(self) -> float:
+        return (self.directory / META_FILE).stat().st_mtime
+
+    def search(self, query: str, k: int) -> List[Dict]:
+        """Die k besten Chunk-Datensätze, jeweils mit BM25-Score"""
+        return [
+            dict(self.chunks.get(doc_id), score=score)
+            for doc_id, score in self.bm25.search(query, k)
+        ]
+
+    def close(self):
+        self.bm25.close()
+        self.chunks.close()
+
+
+def build_lexical_index(directory: Path, records: Iterable[Dict]) -> int:
+    """Chunk-Store und BM25-Index aus Datensätzen (mit "content") neu schreiben"""
+    directory = Path(directory)
+    tmp_dir = directory.with_name(directory.name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+
+    index = BM25Index()
+    with ChunkStoreWriter(tmp_dir) as writer:
+        for record in records:
+            writer.append(record)
+            index.add_document(record["content"])
+    index.save(tmp_dir)
+
+    swap_directory(tmp_dir, directory)
+    return index.doc_count
@@ -0,0 +1,262 @@
+"""
+Budget Admission
+Zulassung von LLM-Aufrufen gegen das Monatsbudget: Kosten vor dem Aufruf schätzen, als Reservierung
+verbuchen und bei knappem Budget auf ein günstigeres Modell ausweichen, zurückstellen, auf lokale
+Regeln beschränken oder ablehnen
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from token_counter import count_tokens
+from usage_tracker import UsageTracker, estimate_cost, get_usage_tracker
+
+logger = logging.getLogger(__name__)
+
+# Entscheidungen
+ADMIT = "admit"
+DOWNGRADE = "downgrade"
+DEFER = "defer"
+RULES_ONLY = "rules_only"
+REJECT = "reject"
+
+# Ausweichmodell bei knappem Budget (kann Text und Bilder)
+BUDGET_DOWNGRADE_MODEL = os.getenv("BUDGET_DOWNGRADE_MODEL", "gpt-4o-mini")
+# Wartezeit, bevor ein zurückgestellter Job erneut versucht wird
+BUDGET_DEFER_SECONDS = float(os.getenv("BUDGET_DEFER_SECONDS", "60"))
+# Reservierungen abgestürzter Aufrufe verfallen nach dieser Zeit; laufende Aufrufe
+# (Timeouts, Retries, Rate-Limit-Wartezeiten) verlängern sie regelmäßig
+RESERVATION_TTL_SECONDS = 600
+RESERVATION_RENEW_SECONDS = RESERVATION_TTL_SECONDS / 3
+# Eingabe-Token je Bild (Vision, detail=high, ca. 1024 px)
+VISION_IMAGE_TOKENS = 765
+# Zuschlag je Nachricht für Rollen- und Formatierungs-Token
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reservations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    endpoint TEXT NOT NULL,
+    model TEXT NOT NULL,
+    cost REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class BudgetDeferred(Exception):
+    """Aufruf passt erst nach Freigabe laufender Reservierungen ins Budget"""
+
+    def __init__(self, reason: str, retry_after: float = BUDGET_DEFER_SECONDS):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _ReservationRenewal:
+    """Verlängert eine Reservierung, solange der Aufruf läuft (eigener Thread)"""
+
+    def __init__(self, controller: "BudgetController", reservation_id: int):
+        self.controller = controller
+        self.reservation_id = reservation_id
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"reservation-{reservation_id}", daemon=True)
+
+    def _run(self):
+        while not self._done.wait(RESERVATION_RENEW_SECONDS):
+            try:
+                if not self.controller.renew(self.reservation_id):
+                    logger.warning(f"⚠️ Reservierung {self.reservation_id} bereits verfallen")
+                    return
+            except sqlite3.OperationalError as e:
+                logger.warning(f"⚠️ Reservierung {self.reservation_id} nicht verlängert: {e}")
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._done.set()
+        self._thread.join()
+
+
+class Admission:
+    """Ergebnis einer Zulassung; reservierte Kosten werden mit release() freigegeben"""
+
+    def __init__(self, controller: "BudgetController", decision: str, requested_model: str, model: str,
+                 estimated_cost: float, reason: str, reservation_id: Optional[int] = None):
+        self.controller = controller
+        self.decision = decision
+        self.requested_model = requested_model
+        self.model = model
+        self.estimated_cost = estimated_cost
+        self.reason = reason
+        self.reservation_id = reservation_id
+        self._renewal: Optional[_ReservationRenewal] = None
+
+    @property
+    def allowed(self) -> bool:
+        return self.decision in (ADMIT, DOWNGRADE)
+
+    def release(self):
+        if self._renewal is not None:
+            self._renewal.stop()
+            self._renewal = None
+        if self.reservation_id is not None:
+            self.controller.release(self.reservation_id)
+            self.reservation_id = None
+
+    def __enter__(self):
+        if self.reservation_id is not None and self._renewal is None:
+            self._renewal = _ReservationRenewal(self.controller, self.reservation_id)
+            self._renewal.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def to_dict(self) -> Dict:
+        return {
+            "decision": self.decision,
+            "requested_model": self.requested_model,
+            "model": self.model,
+            "estimated_cost": round(self.estimated_cost, 4),
+            "reason": self.reason
+        }
+
+
+def estimate_prompt_tokens(messages: List[Dict], model: str) -> int:
+    """Eingabe-Token der Chat-Nachrichten (Texte gezählt, Bilder pauschal)"""
+    tokens = 0
+    for message in messages:
+        tokens += MESSAGE_OVERHEAD_TOKENS
+        content = message.get("content")
+        if isinstance(content, str):
+            tokens += count_tokens(content, model)
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                tokens += count_tokens(part["text"], model)
+            elif part.get("type") == "image_url":
+                tokens += VISION_IMAGE_TOKENS
+    return tokens
+
+
+class BudgetController:
+    """Reservierungen liegen in derselben SQLite-Datei wie die Nutzungssummen (prozessübergreifend)"""
+
+    def __init__(self, tracker: UsageTracker, downgrade_model: str = BUDGET_DOWNGRADE_MODEL):
+        self.tracker = tracker
+        self.downgrade_model = downgrade_model
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.tracker.db_path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def admit(self, endpoint: str, model: str, messages: List[Dict], max_tokens: int,
+              fallbacks: Sequence[str] = (DOWNGRADE, RULES_ONLY)) -> Admission:
+        """
+        Kosten schätzen (Eingabe + max_tokens als Obergrenze der Ausgabe) und gegen das Restbudget
+        abzüglich laufender Reservierungen prüfen. Bis zur Warnschwelle wird zugelassen, darüber
+        wird – sofern in `fallbacks` erlaubt – herabgestuft; passt der Aufruf gar nicht mehr, wird
+        zurückgestellt (nur wenn Reservierungen frei werden können), auf Regeln beschränkt oder abgelehnt.
+        """
+        prompt_tokens = estimate_prompt_tokens(messages, model)
+        cost = estimate_cost(model, prompt_tokens, max_tokens)
+        cheaper_cost = estimate_cost(self.downgrade_model, prompt_tokens, max_tokens)
+        can_downgrade = DOWNGRADE in fallbacks and model != self.downgrade_model and cheaper_cost < cost
+        max_budget, warn_budget = self.tracker.max_budget, self.tracker.warn_budget
+
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM reservations WHERE expires_at < ?", (time.time(),))
+            spent = conn.execute(
+                "SELECT cost FROM usage_monthly WHERE month = ?", (datetime.now().strftime("%Y-%m"),)
+            ).fetchone()
+            spent = spent["cost"] if spent else 0.0
+            reserved = conn.execute("SELECT COALESCE(SUM(cost), 0) AS cost FROM reservations").fetchone()["cost"]
+            committed = spent + reserved
+
+            if committed + cost <= warn_budget:
+                decision, chosen, chosen_cost = ADMIT, model, cost
+                reason = "Budget ausreichend"
+            elif can_downgrade and committed + cheaper_cost <= max_budget:
+                decision, chosen, chosen_cost = DOWNGRADE, self.downgrade_model, cheaper_cost
+                reason = (f"Budget knapp (${committed:.2f} von ${max_budget:.2f} verbraucht/reserviert): "
+                          f"{model} → {self.downgrade_model}")
+            elif committed + cost <= max_budget:
+                decision, chosen, chosen_cost = ADMIT, model, cost
+                reason = f"Budget knapp (${committed:.2f} von ${max_budget:.2f}), Warnschwelle überschritten"
+            else:
+                cheapest = cheaper_cost if can_downgrade else cost
+                chosen, chosen_cost = model, cost
+                if DEFER in fallbacks and reserved > 0 and spent + cheapest <= max_budget:
+                    decision = DEFER
+                    reason = (f"Budget durch laufende Aufrufe ausgeschöpft (${reserved:.2f} reserviert), "
+                              f"neuer Versuch in {BUDGET_DEFER_SECONDS:.0f}s")
+                else:
+                    decision = RULES_ONLY if RULES_ONLY in fallbacks else REJECT
+                    reason = (f"Restbudget reicht nicht (${committed:.2f} von ${max_budget:.2f} verbraucht/"
+                              f"reserviert, Aufruf ca. ${cheapest:.2f})")
+                    if decision == RULES_ONLY:
+                        reason += f": nur lokale Prüfung ohne {model}"
+
+            reservation_id = None
+            if decision in (ADMIT, DOWNGRADE):
+                reservation_id = conn.execute(
+                    "INSERT INTO reservations (endpoint, model, cost, expires_at) VALUES (?, ?, ?, ?)",
+                    (endpoint, chosen, chosen_cost, time.time() + RESERVATION_TTL_SECONDS)
+                ).lastrowid
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        if decision != ADMIT or committed + cost > warn_budget:
+            logger.warning(f"💸 {endpoint}: {decision} – {reason}")
+        return Admission(self, decision, model, chosen, chosen_cost, reason, reservation_id)
+
+    def renew(self, reservation_id: int) -> bool:
+        """Ablaufzeit einer laufenden Reservierung verschieben (False, wenn sie schon verfallen ist)"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE reservations SET expires_at = ? WHERE id = ?",
+                (time.time() + RESERVATION_TTL_SECONDS, reservation_id)
+            )
+        return cursor.rowcount > 0
+
+    def release(self, reservation_id: int):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM reservations WHERE id = ?", (reservation_id,))
+
+    def reserved(self) -> float:
+        """Summe der laufenden Reservierungen (USD)"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COALESCE(SUM(cost), 0) AS cost FROM reservations WHERE expires_at >= ?", (time.time(),)
+            ).fetchone()
+        return row["cost"]
+
+
+_controller: Optional[BudgetController] = None
+_controller_lock = threading.Lock()
+
+
+def get_budget_controller() -> BudgetController:
+    """Ein Controller je Prozess"""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = BudgetController(get_usage_tracker())
+        return _controller
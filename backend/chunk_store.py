@@ -0,0 +1,93 @@
+"""
+Chunk Store
+Chunk-Datensätze als längenpräfixierte Binärdatei mit Offset-Index; gelesen wird per mmap,
+so dass nur tatsächlich abgefragte Chunks im Speicher landen
+"""
+
+import json
+import mmap
+import shutil
+import struct
+import logging
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator
+
+logger = logging.getLogger(__name__)
+
+CHUNKS_FILE = "chunks.bin"
+OFFSETS_FILE = "chunks.idx"
+
+# 4 Byte Länge (little endian) vor jedem UTF-8-JSON-Datensatz
+_LENGTH = struct.Struct("<I")
+
+
+def swap_directory(tmp_dir: Path, target: Path):
+    """Fertig geschriebenes Verzeichnis an die Stelle des alten setzen"""
+    old_dir = target.with_name(target.name + ".old")
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
+    if target.exists():
+        target.rename(old_dir)
+    tmp_dir.rename(target)
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
+
+
+class ChunkStoreWriter:
+    """Hängt Datensätze fortlaufend an; Position i = i-ter Aufruf von append()"""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.directory / CHUNKS_FILE, "wb")
+        self._offsets = array("Q")
+
+    def append(self, record: Dict) -> int:
+        data = json.dumps(record, ensure_ascii=False).encode("utf-8")
+        self._offsets.append(self._file.tell())
+        self._file.write(_LENGTH.pack(len(data)))
+        self._file.write(data)
+        return len(self._offsets) - 1
+
+    def close(self):
+        self._file.close()
+        with open(self.directory / OFFSETS_FILE, "wb") as f:
+            self._offsets.tofile(f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ChunkStore:
+    """Lesezugriff; im RAM liegen nur die Offsets (8 Byte pro Chunk)"""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.offsets = array("Q")
+        with open(self.directory / OFFSETS_FILE, "rb") as f:
+            self.offsets.frombytes(f.read())
+
+        self._file = open(self.directory / CHUNKS_FILE, "rb")
+        size = (self.directory / CHUNKS_FILE).stat().st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def get(self, position: int) -> Dict:
+        start = self.offsets[position] + _LENGTH.size
+        (length,) = _LENGTH.unpack_from(self._data, self.offsets[position])
+        return json.loads(self._data[start:start + length].decode("utf-8"))
+
+    def __iter__(self) -> Iterator[Dict]:
+        for position in range(len(self)):
+            yield self.get(position)
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
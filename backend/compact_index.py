@@ -0,0 +1,178 @@
+"""
+Compact Vector Index
+Quantisierter, per mmap geladener FAISS-Index für Geräte mit wenig RAM (z.B. Raspberry Pi).
+Chunk-Texte liegen in einer separaten Datei mit Offset-Tabelle und werden erst bei Treffern gelesen.
+"""
+
+import os
+import json
+import math
+import time
+import shutil
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import faiss
+
+from chunk_store import ChunkStore, ChunkStoreWriter, swap_directory
+
+logger = logging.getLogger(__name__)
+
+# "flat" = bisheriger LangChain-FAISS-Store komplett im RAM
+INDEX_TYPES = ("flat", "sq_fp16", "sq8", "ivfpq")
+DIN_INDEX_TYPE = os.getenv("DIN_INDEX_TYPE", "flat")
+DIN_INDEX_NPROBE = int(os.getenv("DIN_INDEX_NPROBE", "16"))
+
+# Darunter lohnt sich IVF-PQ nicht (und das PQ-Training braucht ≥256 Vektoren)
+IVFPQ_MIN_VECTORS = 1000
+
+INDEX_FILE = "index.faiss"
+META_FILE = "meta.json"
+# Erhöhen, wenn sich das Dateiformat ändert - ältere Indizes werden dann neu gebaut
+FORMAT_VERSION = 2
+
+
+def _pq_subquantizers(dim: int) -> int:
+    """Anzahl PQ-Teilvektoren (je 4 Bit): möglichst 8 Dimensionen pro Teilvektor"""
+    for m in (dim // 8, 64, 48, 32, 16, 8, 4, 2, 1):
+        if m > 0 and dim % m == 0:
+            return m
+    return 1
+
+
+def _factory_string(index_type: str, count: int, dim: int) -> Tuple[str, str]:
+    """
+    FAISS-Factory-String für den Index-Typ (ggf. mit Fallback bei zu wenig Vektoren).
+    Alle Typen sind IVF-Indizes: nur deren Inverted Lists lädt FAISS per mmap,
+    flache SQ-Indizes würden beim Laden komplett in den RAM kopiert.
+    """
+    if index_type == "ivfpq" and count < IVFPQ_MIN_VECTORS:
+        logger.warning(
+            f"⚠️ Nur {count} Vektoren - IVF-PQ braucht mindestens {IVFPQ_MIN_VECTORS}, verwende sq8"
+        )
+        index_type = "sq8"
+
+    # Wenige, große Listen: bei nprobe=16 wird ein großer Teil durchsucht (hoher Recall)
+    nlist = max(1, min(int(math.sqrt(count)), count // 39))
+    if index_type == "ivfpq":
+        # 4-Bit-PQ (Fast-Scan) trainiert in Sekunden statt Minuten; die Codes
+        # (dim/16 Byte pro Vektor) liegen im RAM, sind aber sehr klein
+        return index_type, f"IVF{nlist},PQ{_pq_subquantizers(dim)}x4fs"
+    if index_type == "sq8":
+        return index_type, f"IVF{nlist},SQ8"
+    return index_type, f"IVF{nlist},SQfp16"
+
+
+def build_compact_index(directory: Path, vectors: np.ndarray, records: List[Dict],
+                        index_type: str) -> Dict:
+    """
+    Kompakten Index aus Vektoren und zugehörigen Chunk-Daten schreiben.
+    Position i im FAISS-Index entspricht records[i].
+    """
+    if index_type not in INDEX_TYPES or index_type == "flat":
+        raise ValueError(f"Ungültiger Index-Typ für kompakten Index: {index_type}")
+
+    start = time.perf_counter()
+    directory = Path(directory)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dim = vectors.shape
+
+    effective_type, factory = _factory_string(index_type, count, dim)
+    index = faiss.index_factory(dim, factory)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+
+    # In ein temporäres Verzeichnis schreiben und danach austauschen,
+    # damit Leser nie Index und Chunk-Datei aus verschiedenen Ständen sehen
+    tmp_dir = directory.with_name(directory.name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    faiss.write_index(index, str(tmp_dir / INDEX_FILE))
+
+    with ChunkStoreWriter(tmp_dir) as writer:
+        for record in records:
+            writer.append(record)
+
+    meta = {
+        "format": FORMAT_VERSION,
+        "index_type": index_type,
+        "effective_type": effective_type,
+        "factory": factory,
+        "count": count,
+        "dim": dim,
+        "index_mb": round((tmp_dir / INDEX_FILE).stat().st_size / 1024 / 1024, 2),
+        "build_seconds": round(time.perf_counter() - start, 2),
+        "built_at": time.time()
+    }
+    with open(tmp_dir / META_FILE, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    swap_directory(tmp_dir, directory)
+
+    logger.info(
+        f"🗜️ Kompakter Index ({factory}) geschrieben: {count} Vektoren, "
+        f"{meta['index_mb']} MB in {meta['build_seconds']}s"
+    )
+    return meta
+
+
+def read_compact_meta(directory: Path) -> Optional[Dict]:
+    """Metadaten eines kompakten Index (None, falls keiner existiert oder das Format veraltet ist)"""
+    meta_path = Path(directory) / META_FILE
+    if not meta_path.exists():
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("format") == FORMAT_VERSION else None
+
+
+class CompactVectorIndex:
+    """Lesezugriff auf einen kompakten Index; SQ-Codes und Offsets bleiben gemappt"""
+
+    def __init__(self, directory: Path, nprobe: int = DIN_INDEX_NPROBE):
+        self.directory = Path(directory)
+        self.meta = read_compact_meta(self.directory) or {}
+        self.index = faiss.read_index(
+            str(self.directory / INDEX_FILE),
+            faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        )
+        self.index.nprobe = nprobe
+        self.chunks = ChunkStore(self.directory)
+        # Zum Erkennen eines zwischenzeitlich neu geschriebenen Index
+        self.loaded_mtime = self.mtime()
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    def mtime(self) -> float:
+        return (self.directory / INDEX_FILE).stat().st_mtime
+
+    def record(self, position: int) -> Dict:
+        """Chunk-Daten einer Index-Position von der Platte lesen"""
+        return self.chunks.get(position)
+
+    def search_vectors(self, query_vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Rohe FAISS-Suche: (Distanzen, Positionen)"""
+        query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32).reshape(-1, self.index.d)
+        return self.index.search(query_vectors, k)
+
+    def search(self, query_vector: List[float], k: int) -> List[Tuple[Dict, float]]:
+        """Die k nächsten Chunks inklusive Distanz"""
+        distances, positions = self.search_vectors(np.asarray(query_vector), k)
+        return [
+            (self.record(int(pos)), float(dist))
+            for pos, dist in zip(positions[0], distances[0])
+            if pos >= 0
+        ]
+
+    def close(self):
+        self.chunks.close()
@@ -0,0 +1,113 @@
+"""
+DIN-Prüfungs-Jobs
+Handler, die von den Worker-Prozessen der Job-Queue ausgeführt werden
+"""
+
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict
+
+from job_queue import JobContext, JobDeferred
+from budget_admission import ADMIT, BudgetDeferred
+from din_processor import DINNormProcessor
+from technical_drawing_processor import TechnicalDrawingProcessor
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DIR = Path("analysis_results")
+
+# Pro Worker-Prozess einmal initialisiert
+_din_processor = None
+_technical_processor = None
+
+
+def _get_processors():
+    global _din_processor, _technical_processor
+    if _din_processor is None:
+        _din_processor = DINNormProcessor()
+        _technical_processor = TechnicalDrawingProcessor()
+    return _din_processor, _technical_processor
+
+
+def _text_based_check(din_processor: DINNormProcessor, plan_text: str) -> Dict:
+    """Textbasierte Normprüfung; reicht das Budget erst später, wird der Job zurückgestellt"""
+    try:
+        return din_processor.check_against_norms(plan_text)
+    except BudgetDeferred as e:
+        raise JobDeferred(f"Budget: {e.reason}", e.retry_after)
+
+
+def perform_din_check(ctx: JobContext, plan_id: str, plan_text: str) -> Dict:
+    """Technische DIN-Prüfung für Zeichnungen durchführen (Worker-Job)"""
+    din_processor, technical_processor = _get_processors()
+
+    logger.info(f"🔍 Starte technische DIN-Prüfung für Plan {plan_id}")
+    ctx.progress(5, "Plan-Daten werden geladen")
+
+    # Analyse-Datei laden um visuelle Analyse zu bekommen
+    analysis_file = RESULTS_DIR / f"{plan_id}_analysis.json"
+
+    with open(analysis_file, "r", encoding="utf-8") as f:
+        plan_data = json.load(f)
+
+    # Visuelle Analyse für DIN-Check verwenden
+    visual_analysis = plan_data.get("initial_analysis", {}).get("visual_analysis", {})
+
+    if visual_analysis:
+        # Technische DIN-Normen-Prüfung
+        ctx.progress(20, "Technische Normprüfung")
+        technical_compliance = technical_processor.analyze_technical_compliance(visual_analysis)
+
+        # Zusätzlich: Textbasierte Analyse falls vorhanden
+        ctx.check_cancelled()
+        ctx.progress(40, "Textbasierte Normprüfung")
+        text_based_check = _text_based_check(din_processor, plan_text) if plan_text else {}
+
+        # Kombinierte DIN-Prüfung
+        combined_din_check = {
+            "technical_compliance": technical_compliance,
+            "text_based_analysis": text_based_check,
+            "analysis_type": "comprehensive_technical",
+            "timestamp": datetime.now().isoformat()
+        }
+    else:
+        # Fallback auf reine Textanalyse
+        ctx.check_cancelled()
+        ctx.progress(40, "Textbasierte Normprüfung")
+        combined_din_check = {
+            "text_based_analysis": _text_based_check(din_processor, plan_text),
+            "analysis_type": "text_only_fallback",
+            "note": "Keine visuelle Analyse verfügbar",
+            "timestamp": datetime.now().isoformat()
+        }
+
+    ctx.check_cancelled()
+    ctx.progress(90, "Ergebnis wird gespeichert")
+
+    # Plan-Daten neu laden, damit zwischenzeitliches Feedback nicht überschrieben wird
+    with open(analysis_file, "r", encoding="utf-8") as f:
+        plan_data = json.load(f)
+
+    plan_data["din_check"] = combined_din_check
+    plan_data["din_check_timestamp"] = datetime.now().isoformat()
+    plan_data["status"] = "technical_din_checked"
+
+    with open(analysis_file, "w", encoding="utf-8") as f:
+        json.dump(plan_data, f, ensure_ascii=False, indent=2)
+
+    logger.info(f"✅ Technische DIN-Prüfung abgeschlossen für Plan {plan_id}")
+
+    # Herabstufung oder reine Regelprüfung im Job-Status sichtbar machen
+    budget = combined_din_check["text_based_analysis"].get("budget") or {}
+    status_message = "Abgeschlossen"
+    if budget and budget["decision"] != ADMIT:
+        status_message = f"Abgeschlossen – {budget['reason']}"
+
+    return {
+        "plan_id": plan_id,
+        "analysis_type": combined_din_check["analysis_type"],
+        "budget": budget or None,
+        "status_message": status_message
+    }
@@ -5,14 +5,40 @@ Verarbeitung und Abfrage von DIN-Normen für Bauplan-Prüfung
 
 import os
 import json
+import time
+import shutil
+import hashlib
+import threading
 import PyPDF2
 from typing import List, Dict, Optional
 import openai
 from datetime import datetime
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
 
+from pdf_rasterizer import iter_pdf_pages, count_pdf_pages, render_page
+from page_selection import select_figure_pages
+from embedding_cache import EmbeddingCache, CachedEmbeddings, QUERY_EMBEDDING_CACHE_MAX_MB
+from bm25_index import BM25Index, LexicalIndex, build_lexical_index, read_index_meta
+from chunk_store import ChunkStore, ChunkStoreWriter, OFFSETS_FILE, swap_directory
+from hybrid_retrieval import (
+    RETRIEVAL_MODES, DIN_RETRIEVAL_MODE, HYBRID_VECTOR_WEIGHT, HYBRID_LEXICAL_WEIGHT,
+    HYBRID_CANDIDATES, reciprocal_rank_fusion
+)
+from plan_retrieval import (
+    PLAN_QUERY_K, PLAN_RETRIEVAL_TOKEN_BUDGET, split_plan_queries, merge_query_results, select_mmr,
+    covered_queries
+)
+from prompt_packer import pack_analysis_prompt
+from feedback_store import FeedbackStore, POSITIVE, NEGATIVE
+from feedback_summary import FeedbackSummary
+from usage_tracker import UsageTrackingEmbeddings, get_usage_tracker
+from budget_admission import DOWNGRADE, DEFER, RULES_ONLY, BudgetDeferred, get_budget_controller
+from llm_gateway import get_llm_gateway
+from vision_page_cache import VisionPageCache, page_image_hash
+
 # Environment laden
 load_dotenv()
 
@@ -22,6 +48,11 @@ try:
     from langchain_openai import OpenAIEmbeddings
     from langchain_community.vectorstores import FAISS
     from langchain_core.documents import Document
+    import numpy as np
+    from vector_index_builder import VectorIndexBuilder
+    from compact_index import (
+        INDEX_TYPES, DIN_INDEX_TYPE, CompactVectorIndex, build_compact_index, read_compact_meta
+    )
     LANGCHAIN_AVAILABLE = True
 except ImportError:
     LANGCHAIN_AVAILABLE = False
@@ -29,6 +60,42 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Vereinfachter Modus: Chunk-Texte und BM25-Postings auf der Platte statt im RAM
+SIMPLE_INDEX_DIRNAME = "simple_index"
+SIMPLE_CHUNK_SIZE = 500
+SIMPLE_CHUNK_OVERLAP = 100
+
+# Serialisiert Index-Updates innerhalb eines Prozesses
+_INDEX_LOCK = threading.Lock()
+
+# Version des Vision-Prompts für Normseiten (_analyze_image_with_gpt4_vision); bei jeder
+# Änderung am Prompt erhöhen, damit gecachte Seitenbeschreibungen neu erzeugt werden
+VISION_PROMPT_VERSION = 1
+
+# User-Prompt der DIN-Prüfung; {plan}, {norms} und {feedback} füllt der Prompt Packer
+ANALYSIS_PROMPT_TEMPLATE = """
+Prüfe diesen Bauplan-Auszug gegen die DIN-Normen:
+
+BAUPLAN:
+{plan}
+
+RELEVANTE DIN-NORMEN:
+{norms}
+
+{feedback}
+
+Gib eine strukturierte JSON-Analyse mit:
+1. "erfuellte_anforderungen": Liste der erfüllten DIN-Anforderungen
+2. "moegliche_verstoesse": Liste möglicher Verstöße oder Probleme
+3. "empfehlungen": Konkrete Empfehlungen zur Verbesserung
+4. "kritische_punkte": Besonders wichtige Punkte die geprüft werden sollten
+5. "anwendbare_normen": Liste der relevanten DIN-Normen mit Referenzen
+6. "gesamtbewertung": "gut", "akzeptabel", "problematisch"
+
+Berücksichtige die oben genannten Best Practices und vermeide häufige Fehler.
+Nur JSON-Format, keine anderen Texte.
+"""
+
 
 class DINNormProcessor:
     """Verarbeitung und Abfrage von DIN-Normen"""
@@ -38,18 +105,55 @@ class DINNormProcessor:
         self.text_splitter = None
         self.vectorstore = None
         self.din_index_path = "din_norms/din_index.faiss"
+        self._loaded_index_mtime = 0.0
+        self.last_build_stats = {}
+        self.simple_index = None
+        
+        # Hybrid-Suche: BM25 über dieselben Chunks wie der Vektorindex (DIN_RETRIEVAL_MODE)
+        self.retrieval_mode = "vector"
+        self.lexical_index = None
+        self.lexical_index_path = Path("din_norms/din_index_lexical")
+        self.last_retrieval_stats = {}
+        
+        # Feedback-Protokoll (SQLite) und daraus vorberechnete Aggregate für den Prompt-Kontext
+        self.feedback_store = FeedbackStore()
+        self.feedback_summary = FeedbackSummary(Path("din_norms"))
+        
+        # Optional: quantisierter, per mmap geladener Such-Index (DIN_INDEX_TYPE)
+        self.index_type = "flat"
+        self.compact_index = None
+        self.compact_index_path = Path("din_norms/din_index_compact")
         
         # Erweiterte Features
         self.enable_ocr = enable_ocr
         self.enable_vision = enable_vision
         
+        # Bildbeschreibungen bereits analysierter Normseiten (Seitenbild-Hash + Prompt-Version)
+        self.vision_cache = VisionPageCache(Path("din_norms/vision_page_cache.db"))
+        
         if LANGCHAIN_AVAILABLE:
-            self.embeddings = OpenAIEmbeddings()
+            # Embeddings nur für noch nie gesehene Chunk-Texte und Anfragen anfragen
+            self.embedding_cache = EmbeddingCache(Path("din_norms/embedding_cache.db"))
+            self.query_cache = EmbeddingCache(
+                Path("din_norms/query_embedding_cache.db"), max_mb=QUERY_EMBEDDING_CACHE_MAX_MB
+            )
+            self.embeddings = CachedEmbeddings(
+                UsageTrackingEmbeddings(OpenAIEmbeddings(), get_usage_tracker()),
+                self.embedding_cache, self.query_cache
+            )
             self.text_splitter = RecursiveCharacterTextSplitter(
                 chunk_size=500,  # Kleinere Chunks für bessere Verarbeitung
                 chunk_overlap=100,
                 length_function=len,
             )
+            if DIN_INDEX_TYPE in INDEX_TYPES:
+                self.index_type = DIN_INDEX_TYPE
+            else:
+                logger.warning(f"⚠️ Unbekannter DIN_INDEX_TYPE '{DIN_INDEX_TYPE}' - verwende flat")
+            if DIN_RETRIEVAL_MODE in RETRIEVAL_MODES:
+                self.retrieval_mode = DIN_RETRIEVAL_MODE
+            else:
+                logger.warning(f"⚠️ Unbekannter DIN_RETRIEVAL_MODE '{DIN_RETRIEVAL_MODE}' - verwende vector")
         else:
             logger.warning("🔧 LangChain nicht verfügbar - vereinfachter Modus")
         
@@ -60,7 +164,7 @@ class DINNormProcessor:
             logger.info("🖼️ GPT-4 Vision für Bildanalyse aktiviert")
     
     def process_din_pdfs(self, din_folder="din_norms", force_reprocess=False) -> int:
-        """Alle DIN PDFs einlesen und in Vektordatenbank speichern (mit Token-Sparmodus)"""
+        """DIN PDFs inkrementell in die Vektordatenbank übernehmen (nur neue/geänderte Dateien)"""
         if not LANGCHAIN_AVAILABLE:
             return self._process_simple_mode(din_folder, force_reprocess)
         
@@ -69,141 +173,292 @@ class DINNormProcessor:
             logger.warning(f"⚠️ DIN-Normen Ordner {din_folder} nicht gefunden")
             return 0
         
-        pdf_files = list(din_path.glob("*.pdf"))
-        if not pdf_files:
-            logger.warning(f"⚠️ Keine PDF-Dateien in {din_folder} gefunden")
-            return 0
-        
-        # Token-Sparmodus: Prüfe ob bereits verarbeitet
-        if not force_reprocess and self._is_processing_up_to_date(pdf_files, din_folder):
-            logger.info("✅ DIN-Normen bereits aktuell - überspringe Verarbeitung (Token-Sparmodus)")
-            return self._get_cached_chunk_count(din_folder)
-        
-        documents = []
-        processed_files = 0
-        
-        logger.info(f"📚 Verarbeite {len(pdf_files)} DIN-Norm PDFs...")
-        
-        for pdf_file in pdf_files:
-            try:
-                logger.info(f"🔄 Verarbeite: {pdf_file.name}")
-                
-                # Text extrahieren
-                text = self._extract_pdf_text(pdf_file)
-                if not text.strip():
-                    logger.warning(f"⚠️ Keine Textinhalte in {pdf_file.name}")
-                    continue
-                
-                # In Chunks aufteilen
-                chunks = self.text_splitter.split_text(text)
-                logger.info(f"📄 {len(chunks)} Textblöcke aus {pdf_file.name}")
-                
-                # Dokumente erstellen mit Metadaten
-                for i, chunk in enumerate(chunks):
-                    if len(chunk.strip()) < 50:  # Zu kurze Chunks überspringen
+        with _INDEX_LOCK:
+            self.embedding_cache.reset_stats()
+            self.vision_cache.reset_stats()
+            self.last_build_stats = {}
+            pdf_files = list(din_path.glob("*.pdf"))
+            metadata = self._load_processing_metadata(din_folder)
+            if not pdf_files and not metadata.get("processed_files"):
+                logger.warning(f"⚠️ Keine PDF-Dateien in {din_folder} gefunden")
+                return 0
+            
+            changes = self._detect_file_changes(pdf_files, metadata)
+            
+            # Vorhandenen Index laden - ohne Index oder bei force_reprocess komplett neu aufbauen
+            index_exists = (din_path / "din_index" / "index.faiss").exists()
+            if force_reprocess or not index_exists:
+                self.vectorstore = None
+            elif self.vectorstore is None:
+                self.load_vectorstore()
+            
+            # Auch ein nicht ladbarer Index (beschädigt/inkompatibel) führt zum kompletten Neuaufbau
+            full_rebuild = self.vectorstore is None
+            if full_rebuild:
+                to_index = pdf_files
+                to_remove = []
+                logger.info(f"📚 Kompletter Aufbau der Vektordatenbank aus {len(pdf_files)} DIN-Norm PDFs...")
+            else:
+                to_index = changes["new"] + changes["changed"]
+                to_remove = [f.name for f in changes["changed"]] + changes["removed"]
+            
+            if self.vectorstore is not None and not to_index and not to_remove:
+                logger.info("✅ DIN-Normen bereits aktuell - überspringe Verarbeitung (Token-Sparmodus)")
+                if self._compact_index_outdated():
+                    self._export_compact_index()
+                if self._lexical_index_outdated():
+                    self._export_lexical_index()
+                if changes["hashes_added"]:
+                    self._save_processing_metadata(changes["unchanged"], changes["file_info"])
+                return self._get_cached_chunk_count(din_folder)
+            
+            # Vektoren entfernter oder ersetzter Dateien löschen
+            for filename in to_remove:
+                removed = self._remove_source_vectors(filename)
+                logger.info(f"🗑️ {removed} Vektoren von {filename} entfernt")
+            
+            # Neue und geänderte Dateien einlesen
+            documents = []
+            indexed_files = []
+            for pdf_file in to_index:
+                try:
+                    logger.info(f"🔄 Verarbeite: {pdf_file.name}")
+                    file_documents = self._build_documents(pdf_file, changes["file_info"][pdf_file.name]["sha256"])
+                    if not file_documents:
                         continue
-                        
-                    doc = Document(
-                        page_content=chunk,
-                        metadata={
-                            "source": pdf_file.name,
-                            "din_norm": pdf_file.stem,
-                            "chunk_index": i,
-                            "file_path": str(pdf_file),
-                            "processed_date": datetime.now().isoformat()
-                        }
-                    )
-                    documents.append(doc)
-                
-                processed_files += 1
-                
-            except Exception as e:
-                logger.error(f"❌ Fehler bei {pdf_file.name}: {e}")
-                continue
-        
-        # Vektordatenbank erstellen mit Batch-Verarbeitung
-        if documents:
-            try:
-                logger.info(f"🔧 Erstelle Vektordatenbank mit {len(documents)} Dokumenten...")
-                
-                # Batch-Verarbeitung für große Dokumentmengen
-                batch_size = 50  # Kleinere Batches zur Vermeidung von Token-Limits
-                total_batches = (len(documents) + batch_size - 1) // batch_size
-                
-                logger.info(f"📦 Verarbeite in {total_batches} Batches (je {batch_size} Dokumente)")
-                
-                # Erste Batch erstellen
-                first_batch = documents[:batch_size]
-                self.vectorstore = FAISS.from_documents(first_batch, self.embeddings)
-                logger.info(f"✅ Erste Batch verarbeitet: {len(first_batch)} Dokumente")
-                
-                # Weitere Batches hinzufügen
-                for i in range(1, total_batches):
-                    start_idx = i * batch_size
-                    end_idx = min((i + 1) * batch_size, len(documents))
-                    batch_docs = documents[start_idx:end_idx]
                     
-                    logger.info(f"🔄 Verarbeite Batch {i+1}/{total_batches}: {len(batch_docs)} Dokumente")
+                    documents.extend(file_documents)
+                    changes["file_info"][pdf_file.name]["chunk_count"] = len(file_documents)
+                    indexed_files.append(pdf_file)
                     
-                    # Neue FAISS-Instanz für Batch erstellen und zusammenführen
-                    batch_vectorstore = FAISS.from_documents(batch_docs, self.embeddings)
-                    self.vectorstore.merge_from(batch_vectorstore)
-                
-                # Speichern
-                index_dir = Path(self.din_index_path).parent
-                index_dir.mkdir(exist_ok=True)
-                self.vectorstore.save_local(str(index_dir / "din_index"))
+                except Exception as e:
+                    logger.error(f"❌ Fehler bei {pdf_file.name}: {e}")
+                    continue
+            
+            try:
+                # Alle neuen Chunks in einem Durchgang embedden und in den Index übernehmen
+                if documents:
+                    logger.info(f"🔧 Übernehme {len(documents)} Dokumente in die Vektordatenbank...")
+                    builder = VectorIndexBuilder(self.embeddings)
+                    ids = [self._document_id(doc) for doc in documents]
+                    if self.vectorstore is None:
+                        self.vectorstore = builder.build(documents, ids)
+                    else:
+                        builder.add(self.vectorstore, documents, ids)
+                    self.last_build_stats = builder.last_stats
                 
-                logger.info(f"✅ {len(documents)} Chunks aus {processed_files} DIN-Normen verarbeitet")
+                if self.vectorstore is not None:
+                    index_dir = Path(self.din_index_path).parent
+                    index_dir.mkdir(exist_ok=True)
+                    self.vectorstore.save_local(str(index_dir / "din_index"))
+                    self._loaded_index_mtime = self._index_mtime()
+                    if self.index_type != "flat":
+                        self._export_compact_index()
+                    if self.retrieval_mode == "hybrid":
+                        self._export_lexical_index()
                 
-                # Metadaten speichern
-                self._save_processing_metadata(processed_files, len(documents), pdf_files)
+                kept_files = [] if full_rebuild else changes["unchanged"]
+                self._save_processing_metadata(kept_files + indexed_files, changes["file_info"])
                 
             except Exception as e:
                 logger.error(f"❌ Vektordatenbank-Erstellung fehlgeschlagen: {e}")
                 return 0
+            
+            chunk_count = self._vector_count()
+            cache_stats = self.embedding_cache.stats()
+            vision_stats = self.vision_cache.stats()
+            logger.info(
+                f"✅ {len(indexed_files)} DIN-Normen neu indiziert, {len(to_remove)} entfernt/ersetzt - "
+                f"{chunk_count} Chunks im Index (Embedding-Cache: {cache_stats['hits']} Treffer, "
+                f"{cache_stats['misses']} neu berechnet; Bildanalyse: {vision_stats['hits']} Seiten aus dem Cache)"
+            )
+            return chunk_count
+    
+    def _build_documents(self, pdf_file: Path, file_hash: str) -> List:
+        """Text einer PDF extrahieren und in Dokumente mit stabilen IDs zerlegen"""
+        # Text extrahieren
+        text = self._extract_pdf_text(pdf_file)
+        if not text.strip():
+            logger.warning(f"⚠️ Keine Textinhalte in {pdf_file.name}")
+            return []
+        
+        # In Chunks aufteilen
+        chunks = self.text_splitter.split_text(text)
+        logger.info(f"📄 {len(chunks)} Textblöcke aus {pdf_file.name}")
+        
+        # Dokumente erstellen mit Metadaten
+        documents = []
+        for i, chunk in enumerate(chunks):
+            if len(chunk.strip()) < 50:  # Zu kurze Chunks überspringen
+                continue
+            
+            documents.append(Document(
+                page_content=chunk,
+                metadata={
+                    "source": pdf_file.name,
+                    "din_norm": pdf_file.stem,
+                    "chunk_index": i,
+                    "file_path": str(pdf_file),
+                    "file_sha256": file_hash,
+                    "processed_date": datetime.now().isoformat()
+                }
+            ))
+        
+        return documents
+    
+    @staticmethod
+    def _document_id(doc) -> str:
+        """
+        Stabile Dokument-ID aus Datei-Hash, Dateiname und Chunk-Index
+        (liegt dieselbe PDF unter zwei Namen vor, bleiben die IDs eindeutig)
+        """
+        metadata = doc.metadata
+        return f"{metadata['file_sha256'][:16]}:{metadata['source']}:{metadata['chunk_index']}"
+    
+    def _remove_source_vectors(self, filename: str) -> int:
+        """Alle Vektoren einer Quelldatei aus der Vektordatenbank löschen"""
+        if self.vectorstore is None:
+            return 0
+        
+        ids = []
+        for doc_id in self.vectorstore.index_to_docstore_id.values():
+            doc = self.vectorstore.docstore.search(doc_id)
+            if getattr(doc, "metadata", {}).get("source") == filename:
+                ids.append(doc_id)
+
+        if ids:
+            self.vectorstore.delete(ids)
+        return len(ids)
+    
+    def _compact_index_outdated(self) -> bool:
+        """Fehlt der kompakte Index oder wurde er mit einem anderen Typ gebaut?"""
+        if self.index_type == "flat" or self.vectorstore is None:
+            return False
+        meta = read_compact_meta(self.compact_index_path)
+        return (
+            meta is None
+            or meta.get("index_type") != self.index_type
+            or meta.get("count") != self.vectorstore.index.ntotal
+        )
+    
+    def _index_records(self) -> List[Dict]:
+        """Chunk-Datensätze des FAISS-Stores in Index-Reihenfolge"""
+        records = []
+        for position in range(self.vectorstore.index.ntotal):
+            doc = self.vectorstore.docstore.search(self.vectorstore.index_to_docstore_id[position])
+            records.append({
+                "content": doc.page_content,
+                "din_norm": doc.metadata.get("din_norm", "Unbekannt"),
+                "source": doc.metadata.get("source", ""),
+                "chunk_index": doc.metadata.get("chunk_index", 0)
+            })
+        return records
+    
+    def _export_compact_index(self):
+        """Kompakten Such-Index aus dem vollständigen FAISS-Store ableiten"""
+        ntotal = self.vectorstore.index.ntotal if self.vectorstore is not None else 0
+        if ntotal == 0:
+            return
+        
+        vectors = self.vectorstore.index.reconstruct_n(0, ntotal)
+        self.last_build_stats["compact_index"] = build_compact_index(
+            self.compact_index_path, vectors, self._index_records(), self.index_type
+        )
+    
+    def _lexical_index_outdated(self) -> bool:
+        """Fehlt der BM25-Index für die Hybrid-Suche oder passt er nicht zum Vektorindex?"""
+        if self.retrieval_mode != "hybrid" or self.vectorstore is None:
+            return False
+        meta = read_index_meta(self.lexical_index_path)
+        return meta is None or meta.get("doc_count") != self.vectorstore.index.ntotal
+    
+    def _export_lexical_index(self):
+        """BM25-Index über dieselben Chunks wie der Vektorindex schreiben"""
+        if self.vectorstore is None or self.vectorstore.index.ntotal == 0:
+            return
         
-        return len(documents)
+        start = time.perf_counter()
+        count = build_lexical_index(self.lexical_index_path, self._index_records())
+        self.last_build_stats["lexical_index"] = {
+            "chunks": count,
+            "build_seconds": round(time.perf_counter() - start, 2)
+        }
     
-    def _is_processing_up_to_date(self, pdf_files: List[Path], din_folder: str) -> bool:
-        """Prüft, ob die DIN-Verarbeitung aktuell ist (Token-Sparmodus)"""
+    def _vector_count(self) -> int:
+        """Anzahl der Vektoren im geladenen Index"""
+        if self.vectorstore is None:
+            return 0
+        return len(self.vectorstore.index_to_docstore_id)
+    
+    @staticmethod
+    def _file_hash(filepath: Path) -> str:
+        """SHA-256 einer Datei, blockweise gelesen"""
+        digest = hashlib.sha256()
+        with open(filepath, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def _load_processing_metadata(self, din_folder: str) -> Dict:
+        """Verarbeitungs-Metadaten laden (leer, falls nicht vorhanden)"""
         try:
             metadata_path = Path(din_folder) / "processing_metadata.json"
-            if not metadata_path.exists():
-                return False
-                
-            with open(metadata_path, "r", encoding="utf-8") as f:
-                metadata = json.load(f)
+            if metadata_path.exists():
+                with open(metadata_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+        except Exception as e:
+            logger.warning(f"⚠️ Metadaten konnten nicht geladen werden: {e}")
+        return {}
+    
+    def _detect_file_changes(self, pdf_files: List[Path], metadata: Dict) -> Dict:
+        """Neue, geänderte, unveränderte und entfernte Dateien anhand von SHA-256 bestimmen"""
+        cached_files = {f["filename"]: f for f in metadata.get("processed_files", [])}
+        changes = {"new": [], "changed": [], "unchanged": [], "removed": [],
+                   "file_info": {}, "hashes_added": False}
+        
+        for pdf_file in pdf_files:
+            file_stat = pdf_file.stat()
+            cached = cached_files.get(pdf_file.name)
+            same_stat = (
+                cached is not None
+                and cached.get("size") == file_stat.st_size
+                and abs(file_stat.st_mtime - cached.get("last_modified", 0)) <= 1  # 1 Sekunde Toleranz
+            )
             
-            # Prüfe Anzahl und Änderungsdaten der PDFs
-            cached_files = metadata.get("processed_files", [])
-            if len(cached_files) != len(pdf_files):
-                logger.info(f"📊 Anzahl der PDFs geändert: {len(cached_files)} → {len(pdf_files)}")
-                return False
+            # Hash nur neu berechnen, wenn Größe oder Änderungsdatum abweichen
+            if same_stat and cached.get("sha256"):
+                file_hash = cached["sha256"]
+            else:
+                file_hash = self._file_hash(pdf_file)
             
-            for pdf_file in pdf_files:
-                file_info = next((f for f in cached_files if f["filename"] == pdf_file.name), None)
-                if not file_info:
-                    logger.info(f"📄 Neue Datei gefunden: {pdf_file.name}")
-                    return False
-                    
-                current_mtime = pdf_file.stat().st_mtime
-                cached_mtime = file_info.get("last_modified", 0)
-                if abs(current_mtime - cached_mtime) > 1:  # 1 Sekunde Toleranz
-                    logger.info(f"📄 {pdf_file.name} wurde geändert - Neuverarbeitung erforderlich")
-                    return False
+            changes["file_info"][pdf_file.name] = {
+                "filename": pdf_file.name,
+                "last_modified": file_stat.st_mtime,
+                "size": file_stat.st_size,
+                "path": str(pdf_file),
+                "sha256": file_hash,
+                "chunk_count": cached.get("chunk_count") if cached else None
+            }
             
-            # Prüfe ob Datenbank existiert
-            if LANGCHAIN_AVAILABLE:
-                index_path = Path(din_folder) / "din_index" / "index.faiss"
-                return index_path.exists()
+            if cached is None:
+                logger.info(f"📄 Neue Datei gefunden: {pdf_file.name}")
+                changes["new"].append(pdf_file)
+            elif cached.get("sha256") == file_hash:
+                changes["unchanged"].append(pdf_file)
+            elif not cached.get("sha256") and same_stat:
+                # Ältere Metadaten ohne Hash: unverändert laut Änderungsdatum, Hash nachtragen
+                changes["unchanged"].append(pdf_file)
+                changes["hashes_added"] = True
             else:
-                simple_db_path = Path(din_folder) / "simple_din_db.json"
-                return simple_db_path.exists()
-                
-        except Exception as e:
-            logger.warning(f"⚠️ Cache-Prüfung fehlgeschlagen: {e}")
-            return False
+                logger.info(f"📄 {pdf_file.name} wurde geändert - Neuverarbeitung erforderlich")
+                changes["changed"].append(pdf_file)
+        
+        current_names = {f.name for f in pdf_files}
+        changes["removed"] = [name for name in cached_files if name not in current_names]
+        for name in changes["removed"]:
+            logger.info(f"📄 {name} wurde entfernt")
+        
+        return changes
     
     def _get_cached_chunk_count(self, din_folder: str) -> int:
         """Gibt die Anzahl der Chunks aus Cache zurück"""
@@ -219,39 +474,164 @@ class DINNormProcessor:
                 if simple_db_path.exists():
                     with open(simple_db_path, "r", encoding="utf-8") as f:
                         simple_db = json.load(f)
-                    return len(simple_db)
+                    return sum(entry.get("chunk_count", 1) for entry in simple_db.values())
         except Exception as e:
             logger.warning(f"⚠️ Chunk-Count aus Cache fehlgeschlagen: {e}")
         return 0
 
     def _process_simple_mode(self, din_folder: str, force_reprocess=False) -> int:
-        """Vereinfachte Verarbeitung ohne LangChain"""
+        """
+        Vereinfachte Verarbeitung ohne LangChain (nur neue/geänderte Dateien werden gelesen).
+        Der vollständige Text jeder Norm wird in Chunks zerlegt und im Chunk-Store abgelegt;
+        simple_din_db.json enthält nur noch die Datei-Informationen. Gibt die Anzahl der Chunks zurück.
+        """
         din_path = Path(din_folder)
         if not din_path.exists():
             return 0
         
-        pdf_files = list(din_path.glob("*.pdf"))
-        simple_db = {}
-        
-        for pdf_file in pdf_files:
-            try:
-                text = self._extract_pdf_text(pdf_file)
-                if text.strip():
-                    simple_db[pdf_file.stem] = {
-                        "content": text[:5000],  # Erste 5000 Zeichen
-                        "file": pdf_file.name,
-                        "processed": datetime.now().isoformat()
-                    }
-            except Exception as e:
-                logger.error(f"❌ Fehler bei {pdf_file.name}: {e}")
-        
-        # Einfache Datenbank speichern
-        simple_db_path = Path(din_folder) / "simple_din_db.json"
-        with open(simple_db_path, "w", encoding="utf-8") as f:
-            json.dump(simple_db, f, ensure_ascii=False, indent=2)
-        
-        logger.info(f"✅ {len(simple_db)} DIN-Normen im vereinfachten Modus verarbeitet")
-        return len(simple_db)
+        with _INDEX_LOCK:
+            self.vision_cache.reset_stats()
+            pdf_files = list(din_path.glob("*.pdf"))
+            simple_db_path = din_path / "simple_din_db.json"
+            index_dir = din_path / SIMPLE_INDEX_DIRNAME
+            
+            previous_db = {}
+            old_store = None
+            if simple_db_path.exists() and not force_reprocess:
+                with open(simple_db_path, "r", encoding="utf-8") as f:
+                    previous_db = json.load(f)
+            if previous_db and (index_dir / OFFSETS_FILE).exists():
+                old_store = ChunkStore(index_dir)
+            
+            # Wiederverwendbar: gleicher Hash und Chunks bereits im Store (neues Format)
+            hashes = {}
+            for pdf_file in pdf_files:
+                try:
+                    hashes[pdf_file.name] = self._file_hash(pdf_file)
+                except OSError as e:
+                    logger.error(f"❌ Fehler bei {pdf_file.name}: {e}")
+            
+            def reusable(pdf_file: Path) -> bool:
+                previous = previous_db.get(pdf_file.stem)
+                return (
+                    old_store is not None and previous is not None
+                    and previous.get("sha256") == hashes.get(pdf_file.name)
+                    and "chunk_count" in previous
+                )
+            
+            current = [f for f in pdf_files if f.name in hashes]
+            if (LexicalIndex.exists(index_dir) and all(reusable(f) for f in current)
+                    and {f.stem for f in current} == set(previous_db)):
+                old_store.close()
+                self.simple_db = previous_db
+                logger.info("✅ DIN-Normen bereits aktuell - überspringe Verarbeitung")
+                return sum(entry["chunk_count"] for entry in previous_db.values())
+            
+            simple_db = {}
+            reused = 0
+            bm25 = BM25Index()
+            tmp_dir = index_dir.with_name(index_dir.name + ".tmp")
+            if tmp_dir.exists():
+                shutil.rmtree(tmp_dir)
+            
+            with ChunkStoreWriter(tmp_dir) as writer:
+                for pdf_file in current:
+                    try:
+                        previous = previous_db.get(pdf_file.stem)
+                        if reusable(pdf_file):
+                            start = previous["chunk_start"]
+                            records = [old_store.get(i) for i in range(start, start + previous["chunk_count"])]
+                            entry = dict(previous)
+                            reused += 1
+                        else:
+                            text = self._extract_pdf_text(pdf_file)
+                            if not text.strip():
+                                continue
+                            records = [
+                                {
+                                    "content": chunk,
+                                    "din_norm": pdf_file.stem,
+                                    "source": pdf_file.name,
+                                    "chunk_index": chunk_index
+                                }
+                                for chunk_index, chunk in enumerate(self._split_simple_chunks(text))
+                            ]
+                            entry = {
+                                "file": pdf_file.name,
+                                "sha256": hashes[pdf_file.name],
+                                "chars": len(text),
+                                "processed": datetime.now().isoformat()
+                            }
+                        
+                        entry["chunk_start"] = bm25.doc_count
+                        entry["chunk_count"] = len(records)
+                        for record in records:
+                            writer.append(record)
+                            bm25.add_document(record["content"])
+                        simple_db[pdf_file.stem] = entry
+                    except Exception as e:
+                        logger.error(f"❌ Fehler bei {pdf_file.name}: {e}")
+            
+            bm25.save(tmp_dir)
+            
+            # Alte Dateien schließen, bevor das Verzeichnis ersetzt wird
+            if old_store is not None:
+                old_store.close()
+            self._close_simple_index()
+            swap_directory(tmp_dir, index_dir)
+            
+            # Einfache Datenbank speichern
+            with open(simple_db_path, "w", encoding="utf-8") as f:
+                json.dump(simple_db, f, ensure_ascii=False, indent=2)
+            
+            self.simple_db = simple_db
+            self._save_simple_metadata(din_folder, len(simple_db), bm25.doc_count)
+            logger.info(
+                f"✅ {len(simple_db)} DIN-Normen im vereinfachten Modus verarbeitet "
+                f"({reused} unverändert übernommen, {bm25.doc_count} Chunks, "
+                f"Bildanalyse: {self.vision_cache.hits} Seiten aus dem Cache)"
+            )
+            # Wie im LangChain-Modus: Anzahl der Chunks im Index, nicht der Dateien
+            return bm25.doc_count
+    
+    def _save_simple_metadata(self, din_folder: str, file_count: int, chunk_count: int):
+        """Metadaten des vereinfachten Modus speichern (inkl. Vision-Cache wie im LangChain-Modus)"""
+        try:
+            # Einträge einer LangChain-Verarbeitung (processed_files, total_chunks) bleiben erhalten
+            metadata = self._load_processing_metadata(din_folder)
+            metadata.update({
+                "processed_date": datetime.now().isoformat(),
+                "file_count": file_count,
+                "chunk_count": chunk_count,
+                "langchain_available": False,
+                "vision_cache": self.vision_cache.stats()
+            })
+            
+            metadata_path = Path(din_folder) / "processing_metadata.json"
+            with open(metadata_path, "w", encoding="utf-8") as f:
+                json.dump(metadata, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logger.error(f"❌ Metadaten-Speicherung fehlgeschlagen: {e}")
+    
+    @staticmethod
+    def _split_simple_chunks(text: str, chunk_size: int = SIMPLE_CHUNK_SIZE,
+                             overlap: int = SIMPLE_CHUNK_OVERLAP) -> List[str]:
+        """Text ohne LangChain in überlappende Chunks zerlegen (bevorzugt an Leerzeichen)"""
+        chunks = []
+        start = 0
+        while start < len(text):
+            end = min(start + chunk_size, len(text))
+            if end < len(text):
+                space = text.rfind(" ", start + chunk_size // 2, end)
+                if space > 0:
+                    end = space
+            chunk = text[start:end].strip()
+            if chunk:
+                chunks.append(chunk)
+            if end >= len(text):
+                break
+            start = max(end - overlap, start + 1)
+        return chunks
     
     def _extract_pdf_text(self, filepath: Path) -> str:
         """Erweiterte Text- und Bildextraktion aus PDF"""
@@ -295,17 +675,16 @@ class DINNormProcessor:
         """OCR-basierte Textextraktion für gescannte PDFs"""
         try:
             import pytesseract
-            from pdf2image import convert_from_path
             
             logger.info(f"🔄 Konvertiere PDF zu Bildern: {filepath.name}")
             
-            # PDF zu Bildern konvertieren
-            pages = convert_from_path(filepath, dpi=200, first_page=1, last_page=10)  # Erste 10 Seiten
+            # Seiten einzeln rendern (erste 10 Seiten)
+            last_page = min(count_pdf_pages(filepath), 10)
             
             ocr_text = ""
-            for page_num, page in enumerate(pages, 1):
+            for page_num, page in iter_pdf_pages(filepath, dpi=200, first_page=1, last_page=last_page):
                 try:
-                    logger.info(f"📖 OCR Seite {page_num}/{len(pages)}")
+                    logger.info(f"📖 OCR Seite {page_num}/{last_page}")
                     
                     # OCR mit Deutsch und Englisch
                     page_text = pytesseract.image_to_string(
@@ -344,37 +723,57 @@ class DINNormProcessor:
     def _analyze_pdf_images(self, filepath: Path) -> str:
         """Analysiert Bilder/Diagramme in PDFs mit GPT-4 Vision"""
         try:
-            from pdf2image import convert_from_path
             import base64
             import io
             
             logger.info(f"🖼️ Konvertiere PDF für Bildanalyse: {filepath.name}")
             
-            # Nur erste 5 Seiten für Bildanalyse (Kosten sparen)
-            pages = convert_from_path(filepath, dpi=150, first_page=1, last_page=5)
-            
-            image_analyses = []
+            # Nur die Seiten mit den meisten Abbildungen (Kosten sparen), Seite für Seite gerendert.
+            # Die Seiten laufen parallel; Tempo bestimmt das RPM/TPM-Limit des LLM-Gateways.
+            selected_pages = select_figure_pages(filepath)
+            if not selected_pages:
+                return ""
             
-            for page_num, page in enumerate(pages, 1):
-                try:
-                    # Bild komprimieren für API
-                    img_buffer = io.BytesIO()
-                    page.save(img_buffer, format='JPEG', quality=70)
-                    img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
+            pending = []
+            with ThreadPoolExecutor(max_workers=len(selected_pages)) as executor:
+                for page_num in selected_pages:
+                    try:
+                        page = render_page(filepath, page_num, dpi=150)
+                        if page is None:
+                            continue
+                        try:
+                            # Bild komprimieren für API
+                            img_buffer = io.BytesIO()
+                            page.save(img_buffer, format='JPEG', quality=70)
+                            img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
+                            page_hash = page_image_hash(page)
+                        finally:
+                            page.close()
+                    except Exception as e:
+                        logger.warning(f"⚠️ Seite {page_num} von {filepath.name} nicht renderbar: {e}")
+                        continue
                     
-                    # GPT-4 Vision API
-                    analysis = self._analyze_image_with_gpt4_vision(img_base64, page_num, filepath.name)
+                    # Bereits analysierte Seiten (gleiches Seitenbild, gleicher Prompt) aus dem Cache
+                    cached = self.vision_cache.get(page_hash, VISION_PROMPT_VERSION)
+                    if cached is not None:
+                        pending.append((page_num, cached, None))
+                        continue
                     
+                    # GPT-4 Vision API
+                    pending.append((page_num, None, executor.submit(
+                        self._analyze_image_with_gpt4_vision, img_base64, page_num, filepath.name, page_hash
+                    )))
+                
+                # Ergebnisse in Seitenreihenfolge einsammeln
+                image_analyses = []
+                for page_num, cached, future in pending:
+                    try:
+                        analysis = cached if future is None else future.result()
+                    except Exception as e:
+                        logger.warning(f"⚠️ Bildanalyse Seite {page_num} fehlgeschlagen: {e}")
+                        continue
                     if analysis:
                         image_analyses.append(f"[Seite {page_num} Bildanalyse]\n{analysis}")
-                        
-                    # Pause zwischen API-Aufrufen
-                    import time
-                    time.sleep(1)
-                        
-                except Exception as e:
-                    logger.warning(f"⚠️ Bildanalyse Seite {page_num} fehlgeschlagen: {e}")
-                    continue
             
             return "\n\n".join(image_analyses) if image_analyses else ""
             
@@ -382,90 +781,105 @@ class DINNormProcessor:
             logger.error(f"❌ Bildanalyse fehlgeschlagen: {e}")
             return ""
     
-    def _analyze_image_with_gpt4_vision(self, image_base64: str, page_num: int, filename: str) -> str:
-        """Analysiert ein Bild mit GPT-4 Vision"""
+    def _analyze_image_with_gpt4_vision(self, image_base64: str, page_num: int, filename: str,
+                                        page_hash: Optional[str] = None) -> str:
+        """Analysiert ein Bild mit GPT-4 Vision (mit page_hash wird die Beschreibung gecacht)"""
         try:
             if not openai.api_key:
                 return ""
             
-            client = openai.OpenAI()
-            
-            response = client.chat.completions.create(
-                model="gpt-4o",  # Aktuelles Vision-Model
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """Du bist ein Experte für technische Dokumentation und DIN-Normen. 
-                        Analysiere das Bild und extrahiere alle technischen Informationen, die für die 
-                        Bauplan-Prüfung relevant sind. Fokussiere dich auf:
-                        - Technische Diagramme und Zeichnungen
-                        - Tabellen mit Grenzwerten und Spezifikationen  
-                        - Maße, Toleranzen und technische Parameter
-                        - Symbole und Legenden
-                        - Konstruktionsdetails und Anweisungen
-                        Antworte auf Deutsch."""
-                    },
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": f"Analysiere diese Seite {page_num} aus der DIN-Norm '{filename}'. Extrahiere alle technischen Informationen, die für Bauplan-Prüfungen relevant sind. Beschreibe Diagramme, Tabellen, Maße und technische Details."
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_base64}",
-                                    "detail": "high"
-                                }
+            messages = [
+                {
+                    "role": "system",
+                    "content": """Du bist ein Experte für technische Dokumentation und DIN-Normen. 
+                    Analysiere das Bild und extrahiere alle technischen Informationen, die für die 
+                    Bauplan-Prüfung relevant sind. Fokussiere dich auf:
+                    - Technische Diagramme und Zeichnungen
+                    - Tabellen mit Grenzwerten und Spezifikationen  
+                    - Maße, Toleranzen und technische Parameter
+                    - Symbole und Legenden
+                    - Konstruktionsdetails und Anweisungen
+                    Antworte auf Deutsch."""
+                },
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": f"Analysiere diese Seite {page_num} aus der DIN-Norm '{filename}'. Extrahiere alle technischen Informationen, die für Bauplan-Prüfungen relevant sind. Beschreibe Diagramme, Tabellen, Maße und technische Details."
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:image/jpeg;base64,{image_base64}",
+                                "detail": "high"
                             }
-                        ]
-                    }
-                ],
-                max_tokens=800,
-                temperature=0.2
-            )
+                        }
+                    ]
+                }
+            ]
             
-            return response.choices[0].message.content
+            # Budget prüfen: bei knappem Budget günstigeres Modell oder Seite ohne Bildanalyse
+            admission = get_budget_controller().admit("din_norm_vision", "gpt-4o", messages, max_tokens=800)
+            if not admission.allowed:
+                logger.warning(f"💸 Bildanalyse Seite {page_num} übersprungen: {admission.reason}")
+                return ""
+            
+            with admission:
+                # Aktuelles Vision-Model (gpt-4o) bzw. Ausweichmodell; Seiten cacht der Vision-Cache
+                response = get_llm_gateway().chat_sync(
+                    "din_norm_vision", admission.model, messages, kind="vision", cache=page_hash is None,
+                    max_tokens=800,
+                    temperature=0.2
+                )
+            
+            description = response.choices[0].message.content
+            if page_hash and description:
+                self.vision_cache.put(page_hash, VISION_PROMPT_VERSION, description, admission.model,
+                                      filename, page_num)
+            return description
             
         except Exception as e:
             logger.warning(f"⚠️ GPT-4 Vision Analyse fehlgeschlagen: {e}")
             return ""
     
-    def _save_processing_metadata(self, file_count: int, chunk_count: int, files: List[Path]):
-        """Metadaten der Verarbeitung speichern (für Token-Sparmodus)"""
+    def _save_processing_metadata(self, files: List[Path], file_info: Dict):
+        """Metadaten der Verarbeitung speichern (für inkrementelle Updates)"""
         try:
-            # Detaillierte Datei-Informationen für Cache-Prüfung
-            processed_files = []
-            for f in files:
-                file_stat = f.stat()
-                processed_files.append({
-                    "filename": f.name,
-                    "last_modified": file_stat.st_mtime,
-                    "size": file_stat.st_size,
-                    "path": str(f)
-                })
+            # Detaillierte Datei-Informationen inkl. SHA-256 für die Änderungserkennung
+            processed_files = [file_info[f.name] for f in files]
+            chunk_count = self._vector_count()
             
             metadata = {
                 "processed_date": datetime.now().isoformat(),
-                "file_count": file_count,
+                "file_count": len(processed_files),
                 "total_chunks": chunk_count,  # Für _get_cached_chunk_count()
                 "chunk_count": chunk_count,   # Legacy für Kompatibilität
-                "processed_files": processed_files,  # Für Cache-Prüfung
-                "files": [f.name for f in files],    # Legacy für Kompatibilität
+                "processed_files": processed_files,  # Für Änderungserkennung
+                "files": [f["filename"] for f in processed_files],    # Legacy für Kompatibilität
                 "langchain_available": LANGCHAIN_AVAILABLE,
-                "cache_version": "1.0"
+                "cache_version": "2.0",
+                "vision_cache": self.vision_cache.stats()
             }
             
+            if LANGCHAIN_AVAILABLE:
+                metadata["embedding_cache"] = self.embedding_cache.stats()
+                metadata["index_build"] = self.last_build_stats
+            
             metadata_path = Path("din_norms") / "processing_metadata.json"
             with open(metadata_path, "w", encoding="utf-8") as f:
                 json.dump(metadata, f, ensure_ascii=False, indent=2)
                 
-            logger.info(f"💾 Cache-Metadaten gespeichert: {file_count} Dateien, {chunk_count} Chunks")
+            logger.info(f"💾 Cache-Metadaten gespeichert: {len(processed_files)} Dateien, {chunk_count} Chunks")
             
         except Exception as e:
             logger.error(f"❌ Metadaten-Speicherung fehlgeschlagen: {e}")
     
+    def _index_mtime(self) -> float:
+        """Änderungszeit des gespeicherten Index (0, falls keiner existiert)"""
+        index_file = Path("din_norms/din_index/index.faiss")
+        return index_file.stat().st_mtime if index_file.exists() else 0.0
+    
     def load_vectorstore(self) -> bool:
         """Gespeicherte Vektordatenbank laden"""
         if not LANGCHAIN_AVAILABLE:
@@ -479,6 +893,7 @@ class DINNormProcessor:
                     self.embeddings,
                     allow_dangerous_deserialization=True
                 )
+                self._loaded_index_mtime = self._index_mtime()
                 logger.info("✅ Vektordatenbank geladen")
                 return True
             except Exception as e:
@@ -488,6 +903,24 @@ class DINNormProcessor:
         logger.warning("⚠️ Keine Vektordatenbank gefunden")
         return False
     
+    def _load_compact_index(self) -> bool:
+        """Kompakten Index per mmap öffnen (nur Offsets und Index-Header landen im RAM)"""
+        if not read_compact_meta(self.compact_index_path):
+            return False
+        try:
+            if self.compact_index is not None:
+                self.compact_index.close()
+            self.compact_index = CompactVectorIndex(self.compact_index_path)
+            logger.info(
+                f"✅ Kompakter Index geladen ({self.compact_index.meta.get('factory')}, "
+                f"{self.compact_index.ntotal} Vektoren)"
+            )
+            return True
+        except Exception as e:
+            logger.error(f"❌ Fehler beim Laden des kompakten Index: {e}")
+            self.compact_index = None
+            return False
+    
     def _load_simple_db(self) -> bool:
         """Einfache Datenbank laden"""
         simple_db_path = Path("din_norms/simple_din_db.json")
@@ -503,66 +936,248 @@ class DINNormProcessor:
     
     def find_relevant_norms(self, query: str, k: int = 5) -> List[Dict]:
         """Relevante DIN-Norm Abschnitte finden"""
-        if not LANGCHAIN_AVAILABLE:
-            return self._find_relevant_simple(query, k)
+        return self.find_relevant_norms_many([query], k)[0]
+    
+    def find_relevant_norms_many(self, queries: List[str], k: int = 5) -> List[List[Dict]]:
+        """
+        Relevante Abschnitte für mehrere Anfragen finden: alle Anfragen werden mit einem
+        Embedding-Request eingebettet (bzw. aus dem Cache gelesen) und als eine Matrix gesucht.
+        """
+        if not queries:
+            return []
         
-        if not self.vectorstore:
-            if not self.load_vectorstore():
-                return []
+        if LANGCHAIN_AVAILABLE and self.retrieval_mode == "hybrid":
+            return self._find_relevant_hybrid(queries, k)
+        
+        stats = {"mode": "vector" if LANGCHAIN_AVAILABLE else "lexical", "k": k, "queries": len(queries)}
+        start = time.perf_counter()
+        if LANGCHAIN_AVAILABLE:
+            results = self._find_relevant_vector(queries, k, stats)
+            stats["vector_hits"] = sum(len(r) for r in results)
+        else:
+            results = [self._find_relevant_simple(query, k) for query in queries]
+            stats["lexical_hits"] = sum(len(r) for r in results)
+        stats["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        
+        self.last_retrieval_stats = stats
+        return results
+    
+    def find_relevant_norms_for_plan(self, plan_text: str) -> List[Dict]:
+        """
+        Relevante Abschnitte für den ganzen Plan: eine Anfrage je Seite bzw. Abschnitt, gemeinsam
+        gesucht, dedupliziert und per MMR unter dem Token-Budget ausgewählt
+        """
+        queries = split_plan_queries(plan_text)
+        if not queries:
+            return []
+        
+        labels = [label for label, _ in queries]
+        results = self.find_relevant_norms_many([query for _, query in queries], k=PLAN_QUERY_K)
+        
+        start = time.perf_counter()
+        candidates = merge_query_results(labels, results)
+        selected, tokens = select_mmr(candidates, PLAN_RETRIEVAL_TOKEN_BUDGET)
+        covered = covered_queries(selected)
+        
+        stats = self.last_retrieval_stats
+        stats.update({
+            "plan_queries": len(queries),
+            "plan_sections_covered": len(covered),
+            "plan_hits": sum(len(hits) for hits in results),
+            "unique_candidates": len(candidates),
+            "selected": len(selected),
+            "context_tokens": tokens,
+            "token_budget": PLAN_RETRIEVAL_TOKEN_BUDGET,
+            "merge_ms": round((time.perf_counter() - start) * 1000, 2)
+        })
+        logger.info(f"🔎 {len(queries)} Plan-Anfragen → {len(candidates)} Kandidaten → "
+                    f"{len(selected)} Abschnitte ({tokens}/{PLAN_RETRIEVAL_TOKEN_BUDGET} Token, "
+                    f"{len(covered)} Planabschnitte abgedeckt)")
+        return selected
+    
+    def _embed_queries(self, queries: List[str], stats: Dict) -> "np.ndarray":
+        """Anfragen einbetten (ein Request für alle nicht gecachten) und Cache-Treffer protokollieren"""
+        start = time.perf_counter()
+        hits_before, misses_before = self.query_cache.hits, self.query_cache.misses
+        vectors = np.asarray(self.embeddings.embed_queries(queries), dtype=np.float32)
+        stats["embed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        stats["query_cache_hits"] = self.query_cache.hits - hits_before
+        stats["query_cache_misses"] = self.query_cache.misses - misses_before
+        return vectors
+    
+    def _find_relevant_vector(self, queries: List[str], k: int, stats: Dict) -> List[List[Dict]]:
+        """Vektorsuche im kompakten oder vollständigen FAISS-Index (eine Matrixsuche für alle Anfragen)"""
+        backend = self._vector_backend()
+        if backend is None:
+            return [[] for _ in queries]
         
         try:
-            # Ähnliche Dokumente finden
-            docs = self.vectorstore.similarity_search(query, k=k)
-            
-            # Formatieren
-            results = []
-            for doc in docs:
-                results.append({
-                    "content": doc.page_content[:1000],  # Erste 1000 Zeichen
-                    "din_norm": doc.metadata.get("din_norm", "Unbekannt"),
-                    "source": doc.metadata.get("source", ""),
-                    "chunk_index": doc.metadata.get("chunk_index", 0)
-                })
+            vectors = self._embed_queries(queries, stats)
             
+            start = time.perf_counter()
+            if backend == "compact":
+                _, positions = self.compact_index.search_vectors(vectors, k)
+                results = [
+                    [self._format_chunk(self.compact_index.record(int(p))) for p in row if p >= 0]
+                    for row in positions
+                ]
+            else:
+                _, positions = self.vectorstore.index.search(vectors, k)
+                results = [
+                    [self._format_vector_doc(int(p)) for p in row if p >= 0]
+                    for row in positions
+                ]
+            stats["vector_ms"] = round((time.perf_counter() - start) * 1000, 2)
             return results
             
         except Exception as e:
             logger.error(f"❌ Suche fehlgeschlagen: {e}")
-            return []
+            return [[] for _ in queries]
     
-    def _find_relevant_simple(self, query: str, k: int) -> List[Dict]:
-        """Vereinfachte Suche ohne Vektor-DB"""
-        if not hasattr(self, 'simple_db'):
-            self._load_simple_db()
+    def _format_vector_doc(self, position: int) -> Dict:
+        doc = self.vectorstore.docstore.search(self.vectorstore.index_to_docstore_id[position])
+        return self._format_chunk(dict(doc.metadata, content=doc.page_content))
+    
+    def _vector_backend(self) -> Optional[str]:
+        """Such-Index bereitstellen: "compact", "flat" oder None, wenn keiner verfügbar ist"""
+        if self.index_type != "flat":
+            if self._ensure_compact_index():
+                return "compact"
+            logger.warning("⚠️ Kein kompakter Index vorhanden - verwende vollständige Vektordatenbank")
         
-        if not hasattr(self, 'simple_db'):
+        # Index wurde von einem anderen Prozess aktualisiert? Dann neu laden
+        if self.vectorstore and self._index_mtime() != self._loaded_index_mtime:
+            logger.info("🔄 Vektordatenbank wurde aktualisiert - lade neu")
+            self.vectorstore = None
+        
+        if not self.vectorstore:
+            if not self.load_vectorstore():
+                return None
+        return "flat"
+    
+    def _ensure_compact_index(self) -> bool:
+        """Kompakten Index öffnen bzw. neu öffnen, wenn er auf der Platte ersetzt wurde"""
+        if self.compact_index is not None:
+            try:
+                outdated = self.compact_index.mtime() != self.compact_index.loaded_mtime
+            except OSError:
+                outdated = True
+            if outdated:
+                logger.info("🔄 Kompakter Index wurde aktualisiert - lade neu")
+                self.compact_index.close()
+                self.compact_index = None
+        
+        return self.compact_index is not None or self._load_compact_index()
+    
+    @staticmethod
+    def _format_chunk(record: Dict) -> Dict:
+        """Einheitliches Ergebnisformat für gefundene Chunks"""
+        result = {
+            "content": record["content"][:1000],  # Erste 1000 Zeichen
+            "din_norm": record.get("din_norm", "Unbekannt"),
+            "source": record.get("source", ""),
+            "chunk_index": record.get("chunk_index", 0)
+        }
+        if "score" in record:
+            result["score"] = round(record["score"], 3)
+        return result
+    
+    @staticmethod
+    def _reload_lexical_index(current: Optional[LexicalIndex], directory: Path) -> Optional[LexicalIndex]:
+        """Lexikalischen Index öffnen bzw. neu öffnen, wenn er auf der Platte ersetzt wurde"""
+        if current is not None:
+            try:
+                if current.mtime() == current.loaded_mtime:
+                    return current
+            except OSError:
+                pass
+            current.close()
+        
+        if not LexicalIndex.exists(directory):
+            return None
+        try:
+            index = LexicalIndex(directory)
+            logger.info(f"✅ BM25-Index geladen ({index.doc_count} Chunks)")
+            return index
+        except (OSError, ValueError) as e:
+            logger.error(f"❌ Fehler beim Laden des BM25-Index: {e}")
+            return None
+    
+    def _close_simple_index(self):
+        if self.simple_index is not None:
+            self.simple_index.close()
+            self.simple_index = None
+    
+    def _load_simple_index(self) -> bool:
+        """
+        BM25-Index und Chunk-Store öffnen. Fehlen sie (ältere Installation), wird nicht im
+        Anfragepfad neu aufgebaut - das übernimmt /process-din-norms.
+        """
+        index_dir = Path("din_norms") / SIMPLE_INDEX_DIRNAME
+        if not LexicalIndex.exists(index_dir):
+            logger.warning("⚠️ Kein Chunk-Index für den vereinfachten Modus - bitte DIN-Normen verarbeiten")
+            return False
+        
+        self.simple_index = self._reload_lexical_index(self.simple_index, index_dir)
+        return self.simple_index is not None
+    
+    def _find_relevant_simple(self, query: str, k: int) -> List[Dict]:
+        """Vereinfachte Suche ohne Vektor-DB: BM25-Ranking über Chunks"""
+        if not self._load_simple_index():
             return []
         
-        # Einfache Keyword-Suche
-        query_words = query.lower().split()
-        results = []
+        return [self._format_chunk(record) for record in self.simple_index.search(query, k)]
+    
+    def _find_relevant_hybrid(self, queries: List[str], k: int) -> List[List[Dict]]:
+        """BM25- und Vektorsuche getrennt ausführen und je Anfrage per Reciprocal Rank Fusion kombinieren"""
+        stats = {"mode": "hybrid", "k": k, "queries": len(queries)}
         
-        for din_norm, data in self.simple_db.items():
-            content_lower = data["content"].lower()
-            score = sum(1 for word in query_words if word in content_lower)
-            
-            if score > 0:
-                results.append({
-                    "content": data["content"][:1000],
-                    "din_norm": din_norm,
-                    "source": data["file"],
-                    "score": score
-                })
+        self.lexical_index = self._reload_lexical_index(self.lexical_index, self.lexical_index_path)
+        if self.lexical_index is None:
+            logger.warning("⚠️ Kein BM25-Index für die Hybrid-Suche - verwende nur Vektorsuche")
+            stats["mode"] = "vector"
+            results = self._find_relevant_vector(queries, k, stats)
+            self.last_retrieval_stats = stats
+            return results
         
-        # Nach Score sortieren
-        results.sort(key=lambda x: x["score"], reverse=True)
-        return results[:k]
+        candidates = max(k, HYBRID_CANDIDATES)
+        weights = {"lexical": HYBRID_LEXICAL_WEIGHT, "vector": HYBRID_VECTOR_WEIGHT}
+        
+        start = time.perf_counter()
+        lexical = [
+            [self._format_chunk(record) for record in self.lexical_index.search(query, candidates)]
+            for query in queries
+        ]
+        lexical_done = time.perf_counter()
+        vector = self._find_relevant_vector(queries, candidates, stats)
+        vector_done = time.perf_counter()
+        results = [
+            reciprocal_rank_fusion({"lexical": lex, "vector": vec}, weights, k)
+            for lex, vec in zip(lexical, vector)
+        ]
+        fusion_done = time.perf_counter()
+        
+        stats.update({
+            "candidates": candidates,
+            "weights": weights,
+            "lexical_hits": sum(len(r) for r in lexical),
+            "vector_hits": sum(len(r) for r in vector),
+            "lexical_ms": round((lexical_done - start) * 1000, 2),
+            "fusion_ms": round((fusion_done - vector_done) * 1000, 2),
+            "total_ms": round((fusion_done - start) * 1000, 2)
+        })
+        self.last_retrieval_stats = stats
+        logger.info(
+            f"🔀 Hybrid-Suche: BM25 {stats['lexical_ms']} ms, Embedding {stats.get('embed_ms', 0)} ms, "
+            f"Vektor {stats.get('vector_ms', 0)} ms, Fusion {stats['fusion_ms']} ms"
+        )
+        return results
     
     def check_against_norms(self, plan_text: str) -> Dict:
         """Plan gegen DIN-Normen prüfen"""
         try:
             # Relevante Normen finden
-            relevant_norms = self.find_relevant_norms(plan_text[:2000], k=8)
+            relevant_norms = self.find_relevant_norms_for_plan(plan_text)
             
             if not relevant_norms:
                 return {
@@ -571,17 +1186,14 @@ class DINNormProcessor:
                     "timestamp": datetime.now().isoformat()
                 }
             
-            # Kontext für GPT vorbereiten
-            norm_context = "\n\n".join([
-                f"DIN {norm['din_norm']}:\n{norm['content'][:800]}"
-                for norm in relevant_norms[:5]  # Top 5 Normen
-            ])
-            
-            # GPT-Analyse durchführen
-            analysis = self._perform_gpt_analysis(plan_text, norm_context, relevant_norms)
+            # GPT-Analyse durchführen (Prompt wird unter PROMPT_TOKEN_BUDGET zusammengestellt)
+            analysis = self._perform_gpt_analysis(plan_text, relevant_norms)
+            analysis["retrieval"] = self.last_retrieval_stats
             
             return analysis
             
+        except BudgetDeferred:
+            raise
         except Exception as e:
             logger.error(f"❌ DIN-Prüfung fehlgeschlagen: {e}")
             return {
@@ -605,80 +1217,16 @@ class DINNormProcessor:
             return "Du bist ein Experte für DIN-Normen im Bauwesen."
     
     def _load_feedback_context(self) -> str:
-        """Lädt ALLE Feedback-Kontexte für bessere Analysen"""
+        """Feedback-Kontext aus den vorberechneten Aggregaten (gecacht bis zum nächsten Feedback)"""
         try:
-            feedback_db_path = Path("din_norms/feedback_db.json")
-            if not feedback_db_path.exists():
-                return ""
-            
-            with open(feedback_db_path, "r", encoding="utf-8") as f:
-                feedback_db = json.load(f)
-            
-            context_parts = []
-            
-            # ALLE positiven Beispiele als Best Practices
-            if feedback_db.get("positive_examples"):
-                positive_examples = feedback_db["positive_examples"]  # ALLE statt nur letzte 3
-                context_parts.append("\n=== BEST PRACTICES (aus ALLEM positivem Feedback) ===")
-                
-                # Sammle alle positiven Aspekte
-                all_positive_aspects = []
-                for example in positive_examples:
-                    if example.get("positive_aspects"):
-                        all_positive_aspects.extend(example['positive_aspects'])
-                
-                # Entferne Duplikate und sortiere
-                unique_positive = list(set(all_positive_aspects))
-                for aspect in unique_positive:
-                    context_parts.append(f"✅ Bewährte Praxis: {aspect}")
-                
-                # Zusätzlich: Häufigkeitsanalyse
-                from collections import Counter
-                aspect_frequency = Counter(all_positive_aspects)
-                most_common = aspect_frequency.most_common(5)
-                if most_common:
-                    context_parts.append("\n🏆 MEIST GELOBTE ASPEKTE:")
-                    for aspect, count in most_common:
-                        context_parts.append(f"   • {aspect} (erwähnt {count}x)")
-            
-            # ALLE negativen Beispiele als Warnungen
-            if feedback_db.get("negative_examples"):
-                negative_examples = feedback_db["negative_examples"]  # ALLE statt nur letzte 3
-                context_parts.append("\n=== HÄUFIGE FEHLER (aus ALLEM negativem Feedback) ===")
-                
-                # Sammle alle negativen Aspekte
-                all_negative_aspects = []
-                for example in negative_examples:
-                    if example.get("negative_aspects"):
-                        all_negative_aspects.extend(example['negative_aspects'])
-                
-                # Entferne Duplikate
-                unique_negative = list(set(all_negative_aspects))
-                for aspect in unique_negative:
-                    context_parts.append(f"❌ Zu vermeiden: {aspect}")
-                
-                # Häufigkeitsanalyse für kritische Probleme
-                from collections import Counter
-                problem_frequency = Counter(all_negative_aspects)
-                most_common_problems = problem_frequency.most_common(5)
-                if most_common_problems:
-                    context_parts.append("\n🚨 HÄUFIGSTE KRITIKPUNKTE:")
-                    for problem, count in most_common_problems:
-                        context_parts.append(f"   • {problem} (kritisiert {count}x)")
-            
-            # Statistiken hinzufügen
-            total_positive = len(feedback_db.get("positive_examples", []))
-            total_negative = len(feedback_db.get("negative_examples", []))
-            if total_positive > 0 or total_negative > 0:
-                context_parts.append(f"\n📊 FEEDBACK-STATISTIK: {total_positive} positive, {total_negative} negative Bewertungen")
-            
-            return "\n".join(context_parts) if context_parts else ""
+            self.feedback_summary.sync(self.feedback_store)
+            return self.feedback_summary.context()
             
         except Exception as e:
             logger.warning(f"⚠️ Feedback-Kontext konnte nicht geladen werden: {e}")
             return ""
-
-    def _perform_gpt_analysis(self, plan_text: str, norm_context: str, relevant_norms: List[Dict]) -> Dict:
+    
+    def _perform_gpt_analysis(self, plan_text: str, relevant_norms: List[Dict]) -> Dict:
         """GPT-Analyse mit DIN-Normen Kontext und Lernfähigkeit"""
         if not openai.api_key:
             return {
@@ -687,51 +1235,44 @@ class DINNormProcessor:
             }
         
         try:
-            client = openai.OpenAI()
-            
             # System-Prompt und Feedback-Kontext laden
             system_prompt = self._load_system_prompt()
             feedback_context = self._load_feedback_context()
             
-            # Erweiterte Prompt mit Lernkontext
-            user_prompt = f"""
-Prüfe diesen Bauplan-Auszug gegen die DIN-Normen:
-
-BAUPLAN:
-{plan_text[:3000]}
-
-RELEVANTE DIN-NORMEN:
-{norm_context}
-
-{feedback_context}
-
-Gib eine strukturierte JSON-Analyse mit:
-1. "erfuellte_anforderungen": Liste der erfüllten DIN-Anforderungen
-2. "moegliche_verstoesse": Liste möglicher Verstöße oder Probleme
-3. "empfehlungen": Konkrete Empfehlungen zur Verbesserung
-4. "kritische_punkte": Besonders wichtige Punkte die geprüft werden sollten
-5. "anwendbare_normen": Liste der relevanten DIN-Normen mit Referenzen
-6. "gesamtbewertung": "gut", "akzeptabel", "problematisch"
-
-Berücksichtige die oben genannten Best Practices und vermeide häufige Fehler.
-Nur JSON-Format, keine anderen Texte.
-            """
-            
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": system_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": user_prompt
-                    }
-                ],
-                temperature=0.2,
-                max_tokens=2000
+            # Planauszug, Normen und Lernkontext nach Priorität im Token-Budget unterbringen
+            user_prompt, prompt_tokens = pack_analysis_prompt(
+                ANALYSIS_PROMPT_TEMPLATE, system_prompt, plan_text, relevant_norms, feedback_context
             )
+            logger.info(f"🧮 Prompt: {prompt_tokens['total']}/{prompt_tokens['budget']} Token "
+                        f"(Plan {prompt_tokens['plan']}, Normen {prompt_tokens['norms']}, "
+                        f"Feedback {prompt_tokens['feedback']})")
+            
+            messages = [
+                {
+                    "role": "system",
+                    "content": system_prompt
+                },
+                {
+                    "role": "user",
+                    "content": user_prompt
+                }
+            ]
+            
+            # Budget prüfen: ggf. günstigeres Modell, Job zurückstellen oder nur lokale Auswertung
+            admission = get_budget_controller().admit(
+                "din_analysis", "gpt-4", messages, max_tokens=2000, fallbacks=(DOWNGRADE, DEFER, RULES_ONLY)
+            )
+            if admission.decision == DEFER:
+                raise BudgetDeferred(admission.reason)
+            if not admission.allowed:
+                return self._rules_only_analysis(relevant_norms, admission)
+            
+            with admission:
+                response = get_llm_gateway().chat_sync(
+                    "din_analysis", admission.model, messages,
+                    temperature=0.2,
+                    max_tokens=2000
+                )
             
             content = response.choices[0].message.content
             
@@ -741,9 +1282,11 @@ Nur JSON-Format, keine anderen Texte.
                 # Metadaten hinzufügen
                 analysis.update({
                     "timestamp": datetime.now().isoformat(),
-                    "gpt_model": "gpt-4",
+                    "gpt_model": admission.model,
                     "normen_gefunden": len(relevant_norms),
-                    "top_normen": [norm["din_norm"] for norm in relevant_norms[:3]]
+                    "top_normen": [norm["din_norm"] for norm in relevant_norms[:3]],
+                    "prompt_tokens": prompt_tokens,
+                    "budget": admission.to_dict()
                 })
                 
                 return analysis
@@ -753,9 +1296,13 @@ Nur JSON-Format, keine anderen Texte.
                 return {
                     "error": "JSON Parse Fehler",
                     "raw_response": content[:500],
-                    "relevant_norms": [norm["din_norm"] for norm in relevant_norms[:3]]
+                    "relevant_norms": [norm["din_norm"] for norm in relevant_norms[:3]],
+                    "prompt_tokens": prompt_tokens,
+                    "budget": admission.to_dict()
                 }
                 
+        except BudgetDeferred:
+            raise
         except Exception as e:
             logger.error(f"❌ GPT-Analyse fehlgeschlagen: {e}")
             return {
@@ -763,43 +1310,45 @@ Nur JSON-Format, keine anderen Texte.
                 "relevant_norms": [norm["din_norm"] for norm in relevant_norms[:3]]
             }
     
+    @staticmethod
+    def _rules_only_analysis(relevant_norms: List[Dict], admission) -> Dict:
+        """Lokales Ergebnis ohne LLM-Aufruf: gefundene Normabschnitte und der Budget-Grund"""
+        norms = list(dict.fromkeys(norm["din_norm"] for norm in relevant_norms))
+        logger.warning(f"💸 DIN-Prüfung ohne GPT: {admission.reason}")
+        return {
+            "analysis_mode": "rules_only",
+            "hinweis": f"Keine KI-Analyse durchgeführt: {admission.reason}",
+            "anwendbare_normen": norms,
+            "timestamp": datetime.now().isoformat(),
+            "normen_gefunden": len(relevant_norms),
+            "top_normen": norms[:3],
+            "budget": admission.to_dict()
+        }
+    
     def learn_from_feedback(self, plan_text: str, feedback: Dict):
         """Aus Feedback lernen (experimentell)"""
         try:
-            # Feedback-Datenbank erstellen/erweitern
-            feedback_db_path = Path("din_norms/feedback_db.json")
-            
-            # Bestehende Datenbank laden
-            if feedback_db_path.exists():
-                with open(feedback_db_path, "r", encoding="utf-8") as f:
-                    feedback_db = json.load(f)
-            else:
-                feedback_db = {"positive_examples": [], "negative_examples": []}
-            
             # Feedback kategorisieren
             rating = feedback.get("rating", 3)
             
             if rating >= 4:  # Positive Beispiele
-                example = {
+                self.feedback_store.append(POSITIVE, {
                     "plan_excerpt": plan_text[:1000],
                     "positive_aspects": feedback.get("positive_aspects", []),
                     "rating": rating,
                     "timestamp": feedback.get("timestamp", datetime.now().isoformat())
-                }
-                feedback_db["positive_examples"].append(example)
+                })
                 
             elif rating <= 2:  # Negative Beispiele
-                example = {
+                self.feedback_store.append(NEGATIVE, {
                     "plan_excerpt": plan_text[:1000],
                     "negative_aspects": feedback.get("negative_aspects", []),
                     "rating": rating,
                     "timestamp": feedback.get("timestamp", datetime.now().isoformat())
-                }
-                feedback_db["negative_examples"].append(example)
+                })
             
-            # Speichern
-            with open(feedback_db_path, "w", encoding="utf-8") as f:
-                json.dump(feedback_db, f, ensure_ascii=False, indent=2)
+            # Aggregate inkrementell fortschreiben
+            self.feedback_summary.sync(self.feedback_store)
             
             logger.info(f"✅ Feedback gespeichert (Rating: {rating})")
             
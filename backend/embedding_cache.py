@@ -0,0 +1,192 @@
+"""
+Embedding Cache
+Persistenter Cache für Chunk- und Anfrage-Embeddings (SQLite), Schlüssel: Embedding-Modell + Text-Hash
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    from langchain_core.embeddings import Embeddings as _EmbeddingsBase
+except ImportError:
+    _EmbeddingsBase = object
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_MAX_MB = float(os.getenv("EMBEDDING_CACHE_MAX_MB", "256"))
+# Anfragen (z.B. plan_text[:2000]) in einer eigenen, kleineren Datenbank
+QUERY_EMBEDDING_CACHE_MAX_MB = float(os.getenv("QUERY_EMBEDDING_CACHE_MAX_MB", "16"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (model, text_hash)
+);
+CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used);
+"""
+
+
+def text_hash(text: str) -> str:
+    """SHA-256 eines Textes"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Speichert Embeddings als float32-Blobs und verdrängt die am längsten ungenutzten zuerst"""
+
+    def __init__(self, db_path: Path, max_mb: float = EMBEDDING_CACHE_MAX_MB):
+        self.db_path = Path(db_path)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        """Vorhandene Vektoren laden und als zuletzt genutzt markieren"""
+        found = {}
+        with self._lock, self._connect() as conn:
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model] + batch
+                ).fetchall()
+                for row_hash, blob in rows:
+                    found[row_hash] = array("f", blob).tolist()
+
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, h) for h in found]
+                )
+
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, List[float]]):
+        """Neue Vektoren speichern und danach bei Bedarf verdrängen"""
+        now = time.time()
+        rows = []
+        for h, vector in vectors.items():
+            blob = array("f", vector).tobytes()
+            rows.append((model, h, blob, len(blob), now))
+
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Älteste Einträge löschen, bis die Gesamtgröße unter dem Limit liegt"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        excess = total - self.max_bytes
+        freed = 0
+        evicted = 0
+        for model, h, size in conn.execute(
+            "SELECT model, text_hash, size FROM embeddings ORDER BY last_used"
+        ).fetchall():
+            if freed >= excess:
+                break
+            conn.execute("DELETE FROM embeddings WHERE model = ? AND text_hash = ?", (model, h))
+            freed += size
+            evicted += 1
+
+        logger.info(f"🧹 Embedding-Cache: {evicted} Einträge verdrängt ({freed / 1024 / 1024:.1f} MB)")
+
+    def record(self, hits: int, misses: int):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict:
+        """Trefferzahlen seit dem letzten Reset sowie Größe des Caches"""
+        with self._connect() as conn:
+            entries, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings"
+            ).fetchone()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": entries,
+            "size_mb": round(size / 1024 / 1024, 2),
+            "max_mb": round(self.max_bytes / 1024 / 1024, 2)
+        }
+
+
+class CachedEmbeddings(_EmbeddingsBase):
+    """Embeddings-Wrapper: berechnet nur Texte, die noch nie eingebettet wurden"""
+
+    def __init__(self, underlying, cache: EmbeddingCache, query_cache: Optional[EmbeddingCache] = None):
+        self.underlying = underlying
+        self.cache = cache
+        self.query_cache = query_cache
+        self.model = getattr(underlying, "model", type(underlying).__name__)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed_cached(texts, self.cache)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Mehrere Anfragen mit einem Request einbetten. OpenAI-Embeddings unterscheiden
+        nicht zwischen Anfrage und Dokument, daher genügt embed_documents.
+        """
+        if self.query_cache is None:
+            return self.underlying.embed_documents(texts)
+        return self._embed_cached(texts, self.query_cache)
+
+    def _embed_cached(self, texts: List[str], cache: EmbeddingCache) -> List[List[float]]:
+        hashes = [text_hash(text) for text in texts]
+        cached = cache.get_many(self.model, list(set(hashes)))
+
+        missing = {}
+        for h, text in zip(hashes, texts):
+            if h not in cached and h not in missing:
+                missing[h] = text
+
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            new_vectors = dict(zip(missing.keys(), vectors))
+            cache.put_many(self.model, new_vectors)
+            cached.update(new_vectors)
+
+        cache.record(hits=len(texts) - len(missing), misses=len(missing))
+        return [cached[h] for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.query_cache is None:
+            return self.underlying.embed_query(text)
+        return self.embed_queries([text])[0]
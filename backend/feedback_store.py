@@ -0,0 +1,140 @@
+"""
+Feedback Store
+Append-only Feedback-Protokoll (SQLite) mit indizierten Spalten für Bewertung und Zeitpunkt;
+löst die bei jedem Feedback komplett neu geschriebene feedback_db.json ab
+"""
+
+import os
+import json
+import sqlite3
+import logging
+from pathlib import Path
+from typing import Dict, Iterator
+
+logger = logging.getLogger(__name__)
+
+FEEDBACK_DB = Path(os.getenv("FEEDBACK_DB", "din_norms/feedback.db"))
+# Bisheriges Format; wird einmalig übernommen und danach umbenannt
+LEGACY_FEEDBACK_JSON = Path("din_norms/feedback_db.json")
+
+POSITIVE = "positive"
+NEGATIVE = "negative"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS feedback (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    rating INTEGER,
+    aspects TEXT NOT NULL,
+    plan_excerpt TEXT,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_feedback_rating ON feedback (rating);
+CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback (timestamp);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _aspects_key(kind: str) -> str:
+    return "positive_aspects" if kind == POSITIVE else "negative_aspects"
+
+
+class FeedbackStore:
+    """Feedback-Beispiele als Zeilen; Schreiben ist ein INSERT, Statistik eine Aggregat-Abfrage"""
+
+    def __init__(self, db_path: Path = FEEDBACK_DB, legacy_path: Path = LEGACY_FEEDBACK_JSON):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+        if Path(legacy_path).exists():
+            self.migrate_json(Path(legacy_path))
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def append(self, kind: str, example: Dict) -> int:
+        """Beispiel anhängen (kind = positive/negative) und seine ID zurückgeben"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO feedback (kind, rating, aspects, plan_excerpt, timestamp) VALUES (?, ?, ?, ?, ?)",
+                (kind, example.get("rating"), json.dumps(example.get(_aspects_key(kind)) or [], ensure_ascii=False),
+                 example.get("plan_excerpt"), example["timestamp"])
+            )
+            return cursor.lastrowid
+
+    def migrate_json(self, legacy_path: Path) -> int:
+        """
+        feedback_db.json einmalig übernehmen und umbenennen - beides unter der Schreibsperre,
+        da API-Prozess und Job-Worker gleichzeitig starten; eine fehlende Datei gilt als übernommen
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            migrated = 0
+            if not conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_json'").fetchone():
+                try:
+                    with open(legacy_path, "r", encoding="utf-8") as f:
+                        feedback_db = json.load(f)
+                except FileNotFoundError:
+                    feedback_db = None
+                if feedback_db is not None:
+                    rows = [
+                        (kind, example.get("rating"),
+                         json.dumps(example.get(_aspects_key(kind)) or [], ensure_ascii=False),
+                         example.get("plan_excerpt"), example.get("timestamp", ""))
+                        for kind, key in ((POSITIVE, "positive_examples"), (NEGATIVE, "negative_examples"))
+                        for example in feedback_db.get(key, [])
+                    ]
+                    conn.executemany(
+                        "INSERT INTO feedback (kind, rating, aspects, plan_excerpt, timestamp) VALUES (?, ?, ?, ?, ?)",
+                        rows
+                    )
+                    conn.execute("INSERT INTO meta (key, value) VALUES ('migrated_json', ?)", (str(legacy_path),))
+                    migrated = len(rows)
+            try:
+                legacy_path.rename(legacy_path.with_name(legacy_path.name + ".migrated"))
+            except FileNotFoundError:
+                pass
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        if migrated:
+            logger.info(f"📦 {migrated} Feedback-Beispiele aus {legacy_path} übernommen")
+        return migrated
+
+    def examples_since(self, last_id: int) -> Iterator[Dict]:
+        """Beispiele mit ID > last_id in Einfügereihenfolge"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, kind, rating, aspects FROM feedback WHERE id > ? ORDER BY id", (last_id,)
+            ).fetchall()
+        for row in rows:
+            example = {"id": row["id"], "kind": row["kind"], _aspects_key(row["kind"]): json.loads(row["aspects"])}
+            if row["rating"] is not None:
+                example["rating"] = row["rating"]
+            yield example
+
+    def statistics(self) -> Dict:
+        """Anzahl positiver/negativer Beispiele und Durchschnittsbewertung in einer Abfrage"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COALESCE(SUM(kind = ?), 0) AS positive, COALESCE(SUM(kind = ?), 0) AS negative, "
+                "AVG(rating) AS average_rating FROM feedback",
+                (POSITIVE, NEGATIVE)
+            ).fetchone()
+        return {
+            "positive": row["positive"],
+            "negative": row["negative"],
+            "average_rating": row["average_rating"] or 0
+        }
@@ -0,0 +1,178 @@
+"""
+Feedback Summary
+Inkrementell gepflegte Feedback-Aggregate (Aspekt-Häufigkeiten, Summen) als kleines Dokument;
+der daraus erzeugte Prompt-Kontext bleibt bis zum nächsten Feedback gecacht.
+Das Dokument merkt sich die letzte eingerechnete Zeile des Feedback-Protokolls (FeedbackStore)
+und holt nur neuere Zeilen nach – auch solche, die andere Prozesse geschrieben haben.
+"""
+
+import os
+import copy
+import json
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from feedback_store import FeedbackStore, POSITIVE
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_VERSION = 2
+
+# Einträge der Listen "meist gelobt" / "häufigste Kritikpunkte"
+FEEDBACK_CONTEXT_TOP_N = int(os.getenv("FEEDBACK_CONTEXT_TOP_N", "5"))
+# Aspekte je Kategorie im Kontext (häufigste zuerst)
+FEEDBACK_CONTEXT_MAX_ASPECTS = int(os.getenv("FEEDBACK_CONTEXT_MAX_ASPECTS", "50"))
+# Gezählte Aspekte je Kategorie; darüber hinaus fallen die seltensten heraus
+FEEDBACK_MAX_TRACKED_ASPECTS = int(os.getenv("FEEDBACK_MAX_TRACKED_ASPECTS", "2000"))
+
+
+def _empty_summary() -> Dict:
+    return {
+        "version": SUMMARY_VERSION,
+        "last_id": 0,
+        "positive_total": 0,
+        "negative_total": 0,
+        "rating_sum": 0,
+        "rating_count": 0,
+        "positive_aspects": {},
+        "negative_aspects": {},
+        "updated": None
+    }
+
+
+def _count_aspects(counts: Dict[str, int], aspects: List[str]):
+    for aspect in aspects:
+        counts[aspect] = counts.get(aspect, 0) + 1
+    if len(counts) > FEEDBACK_MAX_TRACKED_ASPECTS:
+        kept = Counter(counts).most_common(FEEDBACK_MAX_TRACKED_ASPECTS)
+        counts.clear()
+        counts.update(kept)
+
+
+def _apply_example(summary: Dict, example: Dict, positive: bool):
+    """Ein gespeichertes Beispiel in die Aggregate aufnehmen"""
+    if positive:
+        summary["positive_total"] += 1
+        _count_aspects(summary["positive_aspects"], example.get("positive_aspects") or [])
+    else:
+        summary["negative_total"] += 1
+        _count_aspects(summary["negative_aspects"], example.get("negative_aspects") or [])
+    if "rating" in example:
+        summary["rating_sum"] += example["rating"]
+        summary["rating_count"] += 1
+
+
+def render_feedback_context(summary: Dict) -> str:
+    """Prompt-Kontext aus den Aggregaten; Zusammenfassungen zuerst, da der Prompt Packer von hinten kürzt"""
+    summary_parts = []
+    context_parts = []
+
+    total_positive = summary["positive_total"]
+    total_negative = summary["negative_total"]
+    if total_positive > 0 or total_negative > 0:
+        summary_parts.append(f"\n📊 FEEDBACK-STATISTIK: {total_positive} positive, {total_negative} negative Bewertungen")
+
+    if total_positive:
+        positive = Counter(summary["positive_aspects"])
+        most_common = positive.most_common(FEEDBACK_CONTEXT_TOP_N)
+        if most_common:
+            summary_parts.append("\n🏆 MEIST GELOBTE ASPEKTE:")
+            for aspect, count in most_common:
+                summary_parts.append(f"   • {aspect} (erwähnt {count}x)")
+
+        context_parts.append("\n=== BEST PRACTICES (aus ALLEM positivem Feedback) ===")
+        for aspect, _ in positive.most_common(FEEDBACK_CONTEXT_MAX_ASPECTS):
+            context_parts.append(f"✅ Bewährte Praxis: {aspect}")
+
+    if total_negative:
+        negative = Counter(summary["negative_aspects"])
+        most_common_problems = negative.most_common(FEEDBACK_CONTEXT_TOP_N)
+        if most_common_problems:
+            summary_parts.append("\n🚨 HÄUFIGSTE KRITIKPUNKTE:")
+            for problem, count in most_common_problems:
+                summary_parts.append(f"   • {problem} (kritisiert {count}x)")
+
+        context_parts.append("\n=== HÄUFIGE FEHLER (aus ALLEM negativem Feedback) ===")
+        for aspect, _ in negative.most_common(FEEDBACK_CONTEXT_MAX_ASPECTS):
+            context_parts.append(f"❌ Zu vermeiden: {aspect}")
+
+    return "\n".join(summary_parts + context_parts)
+
+
+class FeedbackSummary:
+    """Aggregate in `feedback_summary.json`; gelesen wird nur bei geänderter Datei"""
+
+    def __init__(self, directory: Path):
+        self.path = Path(directory) / "feedback_summary.json"
+        self._lock = threading.Lock()
+        self._cached_mtime: Optional[int] = None
+        self._cached_summary: Optional[Dict] = None
+        self._cached_context = ""
+
+    def _mtime(self) -> Optional[int]:
+        try:
+            return self.path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _read(self) -> Optional[Dict]:
+        """Aggregate lesen (aus dem Cache, solange die Datei unverändert ist)"""
+        mtime = self._mtime()
+        if mtime is None:
+            return None
+        if mtime == self._cached_mtime:
+            return self._cached_summary
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                summary = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Feedback-Zusammenfassung nicht lesbar: {e}")
+            return None
+        if summary.get("version") != SUMMARY_VERSION:
+            return None
+        self._remember(summary, mtime)
+        return summary
+
+    def _remember(self, summary: Dict, mtime: Optional[int]):
+        self._cached_summary = summary
+        self._cached_context = render_feedback_context(summary)
+        self._cached_mtime = mtime
+
+    def _write(self, summary: Dict):
+        summary["updated"] = datetime.now().isoformat()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Eigene Temp-Datei je Prozess/Thread; os.replace ersetzt atomar
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._remember(summary, self._mtime())
+
+    def sync(self, store: FeedbackStore) -> int:
+        """Neue Zeilen aus dem Feedback-Protokoll einrechnen (O(neue Beispiele)); liefert deren Anzahl"""
+        with self._lock:
+            summary = self._read() or _empty_summary()
+            examples = list(store.examples_since(summary["last_id"]))
+            if not examples:
+                return 0
+
+            summary = copy.deepcopy(summary)  # Cache-Objekt nicht teilweise verändern
+            for example in examples:
+                _apply_example(summary, example, positive=example["kind"] == POSITIVE)
+                summary["last_id"] = example["id"]
+            self._write(summary)
+
+        if len(examples) > 1:
+            logger.info(f"📊 Feedback-Zusammenfassung: {len(examples)} Beispiele eingerechnet")
+        return len(examples)
+
+    def summary(self) -> Dict:
+        return self._read() or _empty_summary()
+
+    def context(self) -> str:
+        """Gerenderter Prompt-Kontext; neu erzeugt nur nach neuem Feedback"""
+        return self._cached_context if self._read() is not None else ""
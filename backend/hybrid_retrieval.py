@@ -0,0 +1,44 @@
+"""
+Hybrid Retrieval
+Fusion der Rankings aus lexikalischer (BM25) und Vektorsuche per Reciprocal Rank Fusion
+"""
+
+import os
+from typing import Dict, List, Tuple
+
+# "vector" = nur FAISS, "hybrid" = BM25 + FAISS
+RETRIEVAL_MODES = ("vector", "hybrid")
+DIN_RETRIEVAL_MODE = os.getenv("DIN_RETRIEVAL_MODE", "vector")
+
+HYBRID_VECTOR_WEIGHT = float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0"))
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "1.0"))
+# Kandidaten je Suchverfahren vor der Fusion (das Ergebnis bleibt bei k)
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+# Dämpfung der Rangplätze; 60 ist der übliche Wert aus der RRF-Literatur
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+
+
+def result_key(result: Dict) -> Tuple[str, int]:
+    """Ein Chunk ist über Quelldatei und Chunk-Nummer eindeutig"""
+    return result.get("source", ""), result.get("chunk_index", 0)
+
+
+def reciprocal_rank_fusion(rankings: Dict[str, List[Dict]], weights: Dict[str, float],
+                           k: int, rrf_k: int = HYBRID_RRF_K) -> List[Dict]:
+    """
+    Gewichtete RRF: score = Σ gewicht / (rrf_k + rang) über alle Rankings.
+    Jedes Ergebnis erhält "score" und "ranks" (Rang je Suchverfahren).
+    """
+    scores: Dict[Tuple[str, int], float] = {}
+    merged: Dict[Tuple[str, int], Dict] = {}
+
+    for stage, results in rankings.items():
+        weight = weights.get(stage, 1.0)
+        for rank, result in enumerate(results, 1):
+            key = result_key(result)
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+            entry = merged.setdefault(key, dict(result, ranks={}))
+            entry["ranks"][stage] = rank
+
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [dict(merged[key], score=round(scores[key], 5)) for key in best]
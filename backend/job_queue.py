@@ -0,0 +1,481 @@
+"""
+Job Queue
+Persistente Auftragswarteschlange (SQLite) mit Worker-Prozessen für langlaufende Prüfungen
+"""
+
+import os
+import json
+import time
+import random
+import sqlite3
+import logging
+import importlib
+import threading
+import multiprocessing
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Job-Zustände
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+RETRY_BASE_DELAY = 5.0  # Sekunden, verdoppelt sich je Versuch
+POLL_INTERVAL = 1.0
+# Laufende Jobs gehören einem Worker nur, solange er die Lease per Heartbeat verlängert;
+# abgelaufene Leases (Worker abgestürzt, z.B. OOM) werden beim nächsten claim() neu vergeben
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+HEARTBEAT_INTERVAL = JOB_LEASE_SECONDS / 3
+# Abstand, in dem der Pool abgestürzte Worker-Prozesse ersetzt
+SUPERVISE_INTERVAL = 5.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    plan_id TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    error TEXT,
+    result TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    run_after REAL NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (status, priority DESC, id);
+CREATE INDEX IF NOT EXISTS idx_jobs_plan ON jobs (plan_id, id DESC);
+"""
+
+
+class JobCancelled(Exception):
+    """Wird von Handlern ausgelöst, wenn ein Job abgebrochen werden soll"""
+
+
+class JobDeferred(Exception):
+    """Wird von Handlern ausgelöst, um einen Job ohne Fehlversuch später erneut auszuführen"""
+
+    def __init__(self, message: str, delay: float):
+        super().__init__(message)
+        self.message = message
+        self.delay = delay
+
+
+class JobQueue:
+    """Zugriff auf die Job-Tabelle; jeder Prozess verwendet eigene Verbindungen"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "lease_until" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def enqueue(self, kind: str, payload: Dict, plan_id: Optional[str] = None,
+                priority: int = 0, max_attempts: int = 3) -> int:
+        """Neuen Job anlegen und seine ID zurückgeben"""
+        now = datetime.now().isoformat()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (kind, plan_id, payload, status, priority, max_attempts, "
+                "message, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, plan_id, json.dumps(payload, ensure_ascii=False), QUEUED, priority,
+                 max_attempts, "Wartet auf freien Worker", now, now)
+            )
+            job_id = cursor.lastrowid
+
+        logger.info(f"📥 Job {job_id} ({kind}) eingereiht, Priorität {priority}")
+        return job_id
+
+    def claim(self, worker: str) -> Optional[Dict]:
+        """
+        Nächsten fälligen Job (höchste Priorität zuerst) exklusiv übernehmen. In derselben
+        Transaktion werden laufende Jobs mit abgelaufener Lease wieder freigegeben.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            self._requeue_expired(conn)
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = ? AND run_after <= ? "
+                "ORDER BY priority DESC, id LIMIT 1",
+                (QUEUED, time.time())
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            now = datetime.now().isoformat()
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, worker = ?, lease_until = ?, "
+                "started_at = ?, updated_at = ?, message = ? WHERE id = ?",
+                (RUNNING, worker, time.time() + JOB_LEASE_SECONDS, now, now, "Gestartet", row["id"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        return self.get(row["id"])
+
+    def renew_lease(self, job_id: int, worker: str) -> bool:
+        """Lease eines laufenden Jobs verlängern (False, wenn der Job dem Worker nicht mehr gehört)"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = ?",
+                (time.time() + JOB_LEASE_SECONDS, job_id, worker, RUNNING)
+            )
+        return bool(cursor.rowcount)
+
+    def expire_leases(self, worker: str) -> int:
+        """Leases eines beendeten Worker-Prozesses sofort verfallen lassen"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_until = 0 WHERE worker = ? AND status = ?", (worker, RUNNING)
+            )
+        return cursor.rowcount
+
+    def update_progress(self, job_id: int, progress: float, message: str = ""):
+        """Fortschritt (0-100) und Statusmeldung setzen"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET progress = ?, message = ?, updated_at = ? WHERE id = ?",
+                (progress, message, datetime.now().isoformat(), job_id)
+            )
+
+    def complete(self, job_id: int, result: Optional[Dict] = None, message: str = "Abgeschlossen"):
+        now = datetime.now().isoformat()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, progress = 100, message = ?, result = ?, "
+                "error = NULL, updated_at = ?, finished_at = ? WHERE id = ?",
+                (DONE, message, json.dumps(result or {}, ensure_ascii=False), now, now, job_id)
+            )
+
+    def fail(self, job_id: int, error: str):
+        """Fehlschlag verbuchen - mit Backoff erneut einreihen, solange Versuche übrig sind"""
+        job = self.get(job_id)
+        now = datetime.now().isoformat()
+
+        with self._connect() as conn:
+            if job and job["attempts"] < job["max_attempts"] and not job["cancel_requested"]:
+                delay = RETRY_BASE_DELAY * (2 ** (job["attempts"] - 1)) * random.uniform(0.8, 1.2)
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, message = ?, run_after = ?, "
+                    "worker = NULL, updated_at = ? WHERE id = ?",
+                    (QUEUED, error, f"Neuer Versuch in {delay:.0f}s", time.time() + delay, now, job_id)
+                )
+                logger.warning(f"🔁 Job {job_id} fehlgeschlagen, neuer Versuch in {delay:.0f}s: {error}")
+            else:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, message = ?, updated_at = ?, "
+                    "finished_at = ? WHERE id = ?",
+                    (FAILED, error, "Fehlgeschlagen", now, now, job_id)
+                )
+                logger.error(f"❌ Job {job_id} endgültig fehlgeschlagen: {error}")
+
+    def defer(self, job_id: int, delay: float, message: str):
+        """Job zurückstellen; der Versuch zählt nicht gegen max_attempts"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = MAX(attempts - 1, 0), message = ?, run_after = ?, "
+                "worker = NULL, updated_at = ? WHERE id = ?",
+                (QUEUED, message, time.time() + delay, datetime.now().isoformat(), job_id)
+            )
+        logger.info(f"⏸️ Job {job_id} zurückgestellt ({delay:.0f}s): {message}")
+
+    def mark_cancelled(self, job_id: int):
+        now = datetime.now().isoformat()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, updated_at = ?, finished_at = ? WHERE id = ?",
+                (CANCELLED, "Abgebrochen", now, now, job_id)
+            )
+
+    def cancel(self, job_id: int) -> bool:
+        """Wartende Jobs sofort abbrechen, laufende zum Abbruch markieren"""
+        now = datetime.now().isoformat()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, updated_at = ?, finished_at = ? "
+                "WHERE id = ? AND status = ?",
+                (CANCELLED, "Abgebrochen", now, now, job_id, QUEUED)
+            )
+            if cursor.rowcount:
+                return True
+
+            cursor = conn.execute(
+                "UPDATE jobs SET cancel_requested = 1, message = ?, updated_at = ? "
+                "WHERE id = ? AND status = ?",
+                ("Abbruch angefordert", now, job_id, RUNNING)
+            )
+            return bool(cursor.rowcount)
+
+    def is_cancel_requested(self, job_id: int) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def latest_for_plan(self, plan_id: str, kind: Optional[str] = None) -> Optional[Dict]:
+        """Jüngster Job eines Plans"""
+        query = "SELECT * FROM jobs WHERE plan_id = ?"
+        params = [plan_id]
+        if kind:
+            query += " AND kind = ?"
+            params.append(kind)
+
+        with self._connect() as conn:
+            row = conn.execute(query + " ORDER BY id DESC LIMIT 1", params).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        query = "SELECT * FROM jobs"
+        params = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+
+        with self._connect() as conn:
+            rows = conn.execute(query + " ORDER BY id DESC LIMIT ?", params + [limit]).fetchall()
+        return [self._to_dict(row, include_payload=False) for row in rows]
+
+    def count_by_status(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    @staticmethod
+    def _requeue_expired(conn: sqlite3.Connection) -> int:
+        """
+        Laufende Jobs ohne gültige Lease wieder einreihen bzw. - wenn keine Versuche mehr
+        übrig sind - als fehlgeschlagen markieren (läuft innerhalb der claim-Transaktion)
+        """
+        now, timestamp = time.time(), datetime.now().isoformat()
+        expired = "status = ? AND (lease_until IS NULL OR lease_until < ?)"
+        failed = conn.execute(
+            f"UPDATE jobs SET status = ?, error = ?, message = ?, updated_at = ?, finished_at = ? "
+            f"WHERE {expired} AND attempts >= max_attempts",
+            (FAILED, "Worker während der Ausführung beendet", "Fehlgeschlagen", timestamp, timestamp, RUNNING, now)
+        ).rowcount
+        requeued = conn.execute(
+            f"UPDATE jobs SET status = ?, worker = NULL, lease_until = NULL, run_after = 0, message = ?, "
+            f"updated_at = ? WHERE {expired}",
+            (QUEUED, "Worker nicht mehr aktiv - erneut eingereiht", timestamp, RUNNING, now)
+        ).rowcount
+        if requeued or failed:
+            logger.info(f"♻️ Abgelaufene Leases: {requeued} Jobs erneut eingereiht, {failed} fehlgeschlagen")
+        return requeued + failed
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row, include_payload: bool = True) -> Dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"]) if include_payload else None
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    @staticmethod
+    def public_view(job: Optional[Dict]) -> Optional[Dict]:
+        """Job-Informationen für API-Antworten (ohne Nutzdaten)"""
+        if job is None:
+            return None
+        return {
+            key: job[key] for key in (
+                "id", "kind", "plan_id", "status", "priority", "attempts", "max_attempts",
+                "progress", "message", "error", "created_at", "started_at", "finished_at"
+            )
+        }
+
+
+class JobContext:
+    """Wird an Job-Handler übergeben: Fortschritt melden und Abbruch prüfen"""
+
+    def __init__(self, queue: JobQueue, job: Dict):
+        self.queue = queue
+        self.job = job
+        self.job_id = job["id"]
+
+    def progress(self, progress: float, message: str = ""):
+        self.queue.update_progress(self.job_id, progress, message)
+
+    def check_cancelled(self):
+        if self.queue.is_cancel_requested(self.job_id):
+            raise JobCancelled()
+
+
+def _resolve_handler(path: str) -> Callable:
+    """Handler aus 'modul:funktion' laden"""
+    module_name, func_name = path.split(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+class _Heartbeat:
+    """Verlängert die Lease eines Jobs, solange der Handler läuft (eigener Thread im Worker)"""
+
+    def __init__(self, queue: JobQueue, job_id: int, worker: str):
+        self.queue = queue
+        self.job_id = job_id
+        self.worker = worker
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{job_id}", daemon=True)
+
+    def _run(self):
+        while not self._done.wait(HEARTBEAT_INTERVAL):
+            try:
+                if not self.queue.renew_lease(self.job_id, self.worker):
+                    logger.warning(f"⚠️ {self.worker}: Lease für Job {self.job_id} verloren")
+                    return
+            except sqlite3.OperationalError as e:
+                logger.warning(f"⚠️ {self.worker}: Heartbeat fehlgeschlagen: {e}")
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._done.set()
+        self._thread.join()
+
+
+def _worker_main(db_path: str, worker_name: str, handler_paths: Dict[str, str], stop_event):
+    """Hauptschleife eines Worker-Prozesses"""
+    logging.basicConfig(level=logging.INFO)
+    queue = JobQueue(Path(db_path))
+    handlers = {}
+
+    logger.info(f"👷 {worker_name} gestartet")
+
+    while not stop_event.is_set():
+        try:
+            job = queue.claim(worker_name)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"⚠️ {worker_name}: Queue nicht erreichbar: {e}")
+            job = None
+
+        if job is None:
+            stop_event.wait(POLL_INTERVAL)
+            continue
+
+        context = JobContext(queue, job)
+        heartbeat = _Heartbeat(queue, job["id"], worker_name)
+        heartbeat.start()
+        try:
+            if job["kind"] not in handlers:
+                handlers[job["kind"]] = _resolve_handler(handler_paths[job["kind"]])
+
+            context.check_cancelled()
+            logger.info(f"▶️ {worker_name}: Job {job['id']} ({job['kind']}), Versuch {job['attempts']}")
+            result = handlers[job["kind"]](context, **job["payload"])
+            # Handler können eine eigene Abschlussmeldung liefern (z.B. Budget-Hinweise)
+            message = result.pop("status_message", "Abgeschlossen") if isinstance(result, dict) else "Abgeschlossen"
+            queue.complete(job["id"], result, message)
+            logger.info(f"✅ {worker_name}: Job {job['id']} abgeschlossen")
+
+        except JobDeferred as e:
+            queue.defer(job["id"], e.delay, e.message)
+
+        except JobCancelled:
+            queue.mark_cancelled(job["id"])
+            logger.info(f"🛑 {worker_name}: Job {job['id']} abgebrochen")
+
+        except Exception as e:
+            queue.fail(job["id"], str(e))
+
+        finally:
+            heartbeat.stop()
+
+    logger.info(f"👋 {worker_name} beendet")
+
+
+class WorkerPool:
+    """Startet, überwacht (Neustart abgestürzter Prozesse) und beendet die Worker-Prozesse einer Queue"""
+
+    def __init__(self, db_path: Path, handlers: Dict[str, str], workers: Optional[int] = None):
+        self.db_path = Path(db_path)
+        self.handlers = handlers
+        self.workers = workers or int(os.getenv("JOB_WORKERS", "2"))
+        self._context = multiprocessing.get_context("spawn")
+        self._stop_event = None
+        self._processes = []
+        self._supervisor = None
+        self._supervisor_stop = threading.Event()
+
+    def _spawn(self, worker_name: str):
+        process = self._context.Process(
+            target=_worker_main,
+            args=(str(self.db_path), worker_name, self.handlers, self._stop_event),
+            name=worker_name,
+            daemon=True
+        )
+        process.start()
+        return process
+
+    def start(self):
+        # Verwaiste Jobs früherer Läufe übernimmt claim() nach Ablauf ihrer Lease; Worker-Namen
+        # enthalten die PID des Pools, damit mehrere App-Instanzen sich nicht in die Quere kommen
+        self._stop_event = self._context.Event()
+        self._supervisor_stop.clear()
+        self._processes = [self._spawn(f"worker-{os.getpid()}-{i + 1}") for i in range(self.workers)]
+
+        self._supervisor = threading.Thread(target=self._supervise, name="worker-supervisor", daemon=True)
+        self._supervisor.start()
+        logger.info(f"🚀 {self.workers} Job-Worker gestartet ({self.db_path})")
+
+    def _supervise(self):
+        """Abgestürzte Worker ersetzen und ihre Jobs sofort zur Neuvergabe freigeben"""
+        queue = JobQueue(self.db_path)
+        while not self._supervisor_stop.wait(SUPERVISE_INTERVAL):
+            for index, process in enumerate(self._processes):
+                if process.is_alive() or self._supervisor_stop.is_set():
+                    continue
+                logger.error(f"💥 {process.name} unerwartet beendet (Exit-Code {process.exitcode}) - starte neu")
+                try:
+                    queue.expire_leases(process.name)
+                except sqlite3.OperationalError as e:
+                    logger.warning(f"⚠️ Leases von {process.name} nicht freigegeben: {e}")
+                self._processes[index] = self._spawn(process.name)
+
+    def stop(self, timeout: float = 10.0):
+        if self._stop_event is None:
+            return
+
+        self._supervisor_stop.set()
+        if self._supervisor is not None:
+            self._supervisor.join(timeout)
+        self._stop_event.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+        self._processes = []
+        self._stop_event = None
+        self._supervisor = None
+        logger.info("🛑 Job-Worker beendet")
@@ -0,0 +1,265 @@
+"""
+LLM Gateway
+Gemeinsamer Zugang zu allen Chat-/Vision-Aufrufen: ein langlebiger AsyncOpenAI-Client mit
+gepooltem HTTP-Transport, Parallelitätsgrenze und RPM/TPM-Limit je Modell, Retry mit Jitter
+bei 429/5xx, Timeout je Aufruf, persistenter Antwort-Cache sowie Latenz- und Token-Metriken
+"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+import httpx
+import openai
+from openai.types.chat import ChatCompletion
+
+from usage_tracker import UsageTracker, get_usage_tracker
+from budget_admission import estimate_prompt_tokens
+from rate_limiter import RateLimiter
+from response_cache import ResponseCache, response_cache_key
+
+logger = logging.getLogger(__name__)
+
+# Abweichender Endpunkt (z.B. Proxy oder lokaler Mock-Server); leer = OpenAI
+LLM_BASE_URL = os.getenv("LLM_BASE_URL") or None
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+# Gleichzeitige Aufrufe je Modell, Standard und Ausnahmen ("gpt-4=2,gpt-4o=8")
+LLM_DEFAULT_CONCURRENCY = int(os.getenv("LLM_DEFAULT_CONCURRENCY", "4"))
+LLM_CONCURRENCY = os.getenv("LLM_CONCURRENCY", "")
+# Backoff: Basis und Obergrenze (Sekunden) für "full jitter"
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_SECONDS = 30.0
+# Latenzen je Modell für Perzentile
+LATENCY_WINDOW = 200
+
+
+def _parse_concurrency(spec: str) -> Dict[str, int]:
+    limits = {}
+    for item in spec.split(","):
+        model, _, value = item.partition("=")
+        if model.strip() and value.strip():
+            limits[model.strip()] = int(value)
+    return limits
+
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError, openai.RateLimitError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Retry-After des Servers beachten, sonst exponentieller Backoff mit vollem Jitter"""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), RETRY_MAX_SECONDS)
+        except ValueError:
+            pass
+    return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+
+
+class _ModelMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttled_seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def to_dict(self) -> Dict:
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3)
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "throttled_seconds": round(self.throttled_seconds, 3),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+            "latency_max": round(latencies[-1], 3) if latencies else None
+        }
+
+
+class LLMGateway:
+    """
+    Client, Semaphoren und Verbindungspool gehören zu einer eigenen Event-Loop in einem
+    Hintergrund-Thread; dadurch nutzen async-Endpunkte und synchrone Worker-Threads
+    dieselben Verbindungen, ohne die aufrufende Event-Loop zu blockieren.
+    """
+
+    def __init__(self, base_url: Optional[str] = LLM_BASE_URL, timeout: float = LLM_TIMEOUT_SECONDS,
+                 max_retries: int = LLM_MAX_RETRIES, max_connections: int = LLM_MAX_CONNECTIONS,
+                 default_concurrency: int = LLM_DEFAULT_CONCURRENCY, concurrency: str = LLM_CONCURRENCY,
+                 rate_limiter: Optional[RateLimiter] = None, response_cache: Optional[ResponseCache] = None,
+                 usage_tracker: Optional[UsageTracker] = None):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_connections = max_connections
+        self.default_concurrency = default_concurrency
+        self.concurrency = _parse_concurrency(concurrency)
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.response_cache = response_cache or ResponseCache()
+        self.usage_tracker = usage_tracker or get_usage_tracker()
+        self._metrics: Dict[str, _ModelMetrics] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._client: Optional[openai.AsyncOpenAI] = None
+        self._lock = threading.Lock()
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-gateway", daemon=True)
+        self._thread.start()
+
+    def _get_client(self) -> openai.AsyncOpenAI:
+        """Client erst beim ersten Aufruf anlegen (läuft in der Gateway-Loop)"""
+        if self._client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                timeout=self.timeout
+            )
+            # Retries übernimmt das Gateway selbst (mit Metriken und Jitter)
+            self._client = openai.AsyncOpenAI(
+                api_key=openai.api_key or os.getenv("OPENAI_API_KEY"), base_url=self.base_url,
+                http_client=http_client, max_retries=0, timeout=self.timeout
+            )
+        return self._client
+
+    def _semaphore(self, model: str) -> asyncio.Semaphore:
+        if model not in self._semaphores:
+            self._semaphores[model] = asyncio.Semaphore(self.concurrency.get(model, self.default_concurrency))
+        return self._semaphores[model]
+
+    def _model_metrics(self, model: str) -> _ModelMetrics:
+        with self._lock:
+            return self._metrics.setdefault(model, _ModelMetrics())
+
+    async def _chat(self, endpoint: str, model: str, messages: List[Dict], kind: str,
+                    timeout: Optional[float], params: Dict, cache: bool):
+        """Identische Anfragen (gleiches Modell, gleiche Inhalte und Parameter) aus dem Cache beantworten"""
+        use_cache = cache and self.response_cache.enabled
+        if use_cache:
+            key = response_cache_key(model, messages, params)
+            cached = await asyncio.to_thread(self.response_cache.get, key)
+            if cached is not None:
+                logger.info(f"♻️ {endpoint} ({model}): Antwort aus dem Cache")
+                return ChatCompletion.model_validate_json(cached)
+        elif self.response_cache.enabled:
+            self.response_cache.record_bypass()
+
+        response = await self._request(endpoint, model, messages, kind, timeout, params)
+        if use_cache:
+            await asyncio.to_thread(self.response_cache.put, key, model, response.model_dump_json())
+        return response
+
+    async def _request(self, endpoint: str, model: str, messages: List[Dict], kind: str,
+                       timeout: Optional[float], params: Dict):
+        metrics = self._model_metrics(model)
+        client = self._get_client()
+        # Für das TPM-Limit zählt die Eingabe plus die maximale Ausgabe
+        tokens = estimate_prompt_tokens(messages, model) + params.get("max_tokens", 0)
+        async with self._semaphore(model):
+            for attempt in range(self.max_retries + 1):
+                waited = await self.rate_limiter.acquire(model, tokens)
+                if waited:
+                    with self._lock:
+                        metrics.throttled_seconds += waited
+                started = time.perf_counter()
+                try:
+                    response = await client.chat.completions.create(
+                        model=model, messages=messages, timeout=timeout or self.timeout, **params
+                    )
+                except Exception as e:
+                    if attempt < self.max_retries and _retryable(e):
+                        delay = _retry_delay(e, attempt)
+                        with self._lock:
+                            metrics.retries += 1
+                        logger.warning(f"🔁 {endpoint} ({model}): {type(e).__name__}, "
+                                       f"neuer Versuch {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                        await asyncio.sleep(delay)
+                        continue
+                    with self._lock:
+                        metrics.requests += 1
+                        metrics.errors += 1
+                    raise
+
+                usage = getattr(response, "usage", None)
+                with self._lock:
+                    metrics.requests += 1
+                    metrics.latencies.append(time.perf_counter() - started)
+                    if usage is not None:
+                        metrics.prompt_tokens += usage.prompt_tokens or 0
+                        metrics.completion_tokens += usage.completion_tokens or 0
+                await asyncio.to_thread(self.usage_tracker.record_response, endpoint, response, model, kind)
+                return response
+
+    def _submit(self, endpoint: str, model: str, messages: List[Dict], kind: str,
+                timeout: Optional[float], params: Dict, cache: bool):
+        return asyncio.run_coroutine_threadsafe(
+            self._chat(endpoint, model, messages, kind, timeout, params, cache), self._loop
+        )
+
+    async def chat(self, endpoint: str, model: str, messages: List[Dict], kind: str = "chat",
+                   timeout: Optional[float] = None, cache: bool = True, **params):
+        """
+        Chat-/Vision-Aufruf aus einer beliebigen Event-Loop; Nutzung wird verbucht.
+        Mit cache=False wird der Antwort-Cache für diesen Aufruf umgangen.
+        """
+        return await asyncio.wrap_future(self._submit(endpoint, model, messages, kind, timeout, params, cache))
+
+    def chat_sync(self, endpoint: str, model: str, messages: List[Dict], kind: str = "chat",
+                  timeout: Optional[float] = None, cache: bool = True, **params):
+        """Blockierende Variante für synchronen Code (Worker-Jobs, Norm-Indexierung)"""
+        return self._submit(endpoint, model, messages, kind, timeout, params, cache).result()
+
+    def metrics(self) -> Dict:
+        """
+        Anfragen, Fehler, Retries, Wartezeit im Rate-Limit, Token und Latenz-Perzentile je Modell
+        sowie Trefferquote des Antwort-Caches
+        """
+        with self._lock:
+            models = {model: metrics.to_dict() for model, metrics in self._metrics.items()}
+        return {
+            "base_url": self.base_url or "https://api.openai.com/v1",
+            "models": models,
+            "response_cache": self.response_cache.stats()
+        }
+
+    def close(self):
+        """HTTP-Verbindungen schließen und die Gateway-Loop beenden"""
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.close(), self._loop).result(timeout=10)
+            self._client = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    """Ein Gateway je Prozess"""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway()
+        return _gateway
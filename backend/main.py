@@ -3,7 +3,7 @@ Bauplan-Checker Backend
 Haupt-FastAPI-Anwendung für die Prüfung von Bauplänen gegen DIN-Normen
 """
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import PyPDF2
@@ -17,11 +17,7 @@ import logging
 from pathlib import Path
 import shutil
 import asyncio
-import pytesseract
 from PIL import Image
-from pdf2image import convert_from_path
-import tempfile
-import base64
 import cv2
 import numpy as np
 import matplotlib.pyplot as plt
@@ -30,6 +26,14 @@ import psutil
 # Lokale Imports
 from din_processor import DINNormProcessor
 from technical_drawing_processor import TechnicalDrawingProcessor
+from ocr_engine import OCREngine
+from vision_input import build_vision_inputs, describe_vision_inputs
+from upload_store import UploadStore
+from plan_text_store import PlanTextStore, render_plan_text
+from job_queue import JobQueue, WorkerPool
+from usage_tracker import get_usage_tracker
+from budget_admission import ADMIT, get_budget_controller
+from llm_gateway import get_llm_gateway
 
 # Environment laden
 load_dotenv()
@@ -75,99 +79,82 @@ if not openai.api_key:
 # Processors initialisieren
 din_processor = DINNormProcessor()
 technical_processor = TechnicalDrawingProcessor()
+ocr_engine = OCREngine()
+upload_store = UploadStore(UPLOAD_DIR)
+plan_text_store = PlanTextStore(RESULTS_DIR)
+
+# Job-Queue für DIN-Prüfungen (überlebt Neustarts, Worker in eigenen Prozessen)
+JOB_QUEUE_DB = Path(os.getenv("JOB_QUEUE_DB", "jobs.db"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+job_queue = JobQueue(JOB_QUEUE_DB)
+worker_pool = WorkerPool(JOB_QUEUE_DB, handlers={
+    "din_check": "din_check_jobs:perform_din_check"
+})
 
 # Globale Variablen
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 ALLOWED_EXTENSIONS = {'.pdf'}
 
-# Budget-Überwachung
-USAGE_LOG_FILE = Path("usage_log.json")
+# Extraktions-Einstellungen (werden im Text-Sidecar mitgespeichert)
+EXTRACTION_SETTINGS = {
+    "ocr_dpi": ocr_engine.dpi,
+    "ocr_max_pages": ocr_engine.max_pages,
+    "ocr_lang": ocr_engine.lang,
+    "ocr_config": ocr_engine.config
+}
 
-def log_api_usage(endpoint: str, tokens_used: int, cost_estimate: float):
-    """API-Nutzung protokollieren"""
-    try:
-        usage_data = {
-            "timestamp": datetime.now().isoformat(),
-            "endpoint": endpoint,
-            "tokens": tokens_used,
-            "cost_estimate": cost_estimate,
-            "date": datetime.now().strftime("%Y-%m-%d")
-        }
-        
-        # Existing logs laden
-        usage_log = []
-        if USAGE_LOG_FILE.exists():
-            with open(USAGE_LOG_FILE, "r") as f:
-                usage_log = json.load(f)
-        
-        usage_log.append(usage_data)
-        
-        # Log speichern
-        with open(USAGE_LOG_FILE, "w") as f:
-            json.dump(usage_log, f, indent=2)
-            
-        # Budget-Check
-        check_monthly_budget()
-        
-    except Exception as e:
-        logger.warning(f"⚠️ Usage-Logging fehlgeschlagen: {e}")
+# Budget-Überwachung: Token und Kosten aller OpenAI-Aufrufe (Tages-/Monatssummen in usage.db)
+# und Zulassung neuer Aufrufe gegen das Restbudget
+usage_tracker = get_usage_tracker()
+budget_controller = get_budget_controller()
 
-def check_monthly_budget():
-    """Monatliches Budget prüfen"""
-    try:
-        if not USAGE_LOG_FILE.exists():
-            return
-        
-        with open(USAGE_LOG_FILE, "r") as f:
-            usage_log = json.load(f)
-        
-        current_month = datetime.now().strftime("%Y-%m")
-        monthly_cost = sum(
-            entry["cost_estimate"] for entry in usage_log
-            if entry["timestamp"].startswith(current_month)
-        )
-        
-        max_budget = float(os.getenv("MAX_MONTHLY_BUDGET", "20.0"))
-        warn_budget = float(os.getenv("WARN_AT_BUDGET", "15.0"))
-        
-        if monthly_cost >= max_budget:
-            logger.error(f"🚨 BUDGET ÜBERSCHRITTEN: ${monthly_cost:.2f} / ${max_budget:.2f}")
-        elif monthly_cost >= warn_budget:
-            logger.warning(f"⚠️ Budget-Warnung: ${monthly_cost:.2f} / ${max_budget:.2f}")
-        else:
-            logger.info(f"💰 Budget OK: ${monthly_cost:.2f} / ${max_budget:.2f}")
-            
-    except Exception as e:
-        logger.warning(f"⚠️ Budget-Check fehlgeschlagen: {e}")
+# Gemeinsamer OpenAI-Client (Verbindungspool, Parallelitätsgrenzen, Retries)
+llm_gateway = get_llm_gateway()
 
 @app.get("/budget-status")
 def get_budget_status():
     """Aktueller Budget-Status"""
     try:
-        if not USAGE_LOG_FILE.exists():
-            return {"monthly_cost": 0, "status": "no_usage"}
-        
-        with open(USAGE_LOG_FILE, "r") as f:
-            usage_log = json.load(f)
-        
-        current_month = datetime.now().strftime("%Y-%m")
-        monthly_cost = sum(
-            entry["cost_estimate"] for entry in usage_log
-            if entry["timestamp"].startswith(current_month)
-        )
-        
-        max_budget = float(os.getenv("MAX_MONTHLY_BUDGET", "20.0"))
-        
-        return {
-            "monthly_cost": round(monthly_cost, 2),
-            "max_budget": max_budget,
-            "remaining": round(max_budget - monthly_cost, 2),
-            "usage_percent": round((monthly_cost / max_budget) * 100, 1)
-        }
+        status = usage_tracker.status()
+        status["reserved"] = round(budget_controller.reserved(), 4)
+        return status
         
     except Exception as e:
         return {"error": str(e)}
 
+@app.get("/llm-metrics")
+def get_llm_metrics():
+    """Latenz, Retries, Fehler und Token der LLM-Aufrufe je Modell sowie Antwort-Cache (seit Prozessstart)"""
+    return llm_gateway.metrics()
+
+@app.on_event("startup")
+def migrate_upload_store():
+    """Vorhandene Uploads einmalig in den Blob-Store übernehmen"""
+    try:
+        existing_plans = []
+        for analysis_file in sorted(RESULTS_DIR.glob("*_analysis.json")):
+            with open(analysis_file, "r", encoding="utf-8") as f:
+                plan_data = json.load(f)
+            existing_plans.append((plan_data["id"], UPLOAD_DIR / plan_data["filename"]))
+        upload_store.index_existing(existing_plans)
+    except Exception as e:
+        logger.warning(f"⚠️ Migration des Blob-Stores fehlgeschlagen: {e}")
+
+
+@app.on_event("startup")
+def start_job_workers():
+    """Job-Worker starten (unterbrochene Jobs werden dabei wieder eingereiht)"""
+    worker_pool.start()
+
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    """Worker-Pools beim Herunterfahren beenden"""
+    ocr_engine.shutdown()
+    worker_pool.stop()
+    llm_gateway.close()
+
+
 @app.get("/")
 def read_root():
     """Root Endpoint - System Status"""
@@ -186,9 +173,8 @@ async def health_check():
         # System-Informationen
         start_time = datetime.now() - timedelta(seconds=psutil.boot_time())
         
-        # DIN-Normen Status prüfen
-        processor = DINNormProcessor()
-        processing_info = processor.get_processing_info()
+        # DIN-Normen Status prüfen (nur Metadaten lesen, keinen neuen Processor anlegen)
+        processing_info = din_processor.get_processing_info()
         
         return {
             "status": "healthy",
@@ -229,27 +215,41 @@ async def upload_plan(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="Datei zu groß (max. 50MB)")
     
     try:
-        # Datei speichern
+        # Datei inhaltsadressiert speichern
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         safe_filename = f"{timestamp}_{file.filename.replace(' ', '_')}"
         filepath = UPLOAD_DIR / safe_filename
         
-        with open(filepath, "wb") as f:
-            f.write(content)
+        content_hash, is_new = upload_store.save(content, filepath)
         
         logger.info(f"📁 Datei gespeichert: {filepath}")
         
-        # Text aus PDF extrahieren (für Metadaten)
-        text_content = await extract_text_from_pdf(filepath)
+        # Identische Datei schon analysiert? Dann Ergebnisse übernehmen
+        source_plan = None if is_new else find_reusable_analysis(content_hash)
         
-        # Technische Zeichnung analysieren mit GPT-4 Vision
-        visual_analysis = await analyze_technical_drawing(filepath)
-        
-        # Kombinierte Analyse
-        initial_analysis = {
-            "visual_analysis": visual_analysis,
-            "text_metadata": await analyze_plan_basic(text_content[:2000]) if text_content else {}
-        }
+        if source_plan:
+            logger.info(f"♻️ Übernehme Analyse von Plan {source_plan['id']} (identischer Inhalt)")
+            page_count = source_plan.get("page_count", 1)
+            text_preview = source_plan.get("text_preview", "")
+            text_length = source_plan.get("text_length", 0)
+            initial_analysis = source_plan["initial_analysis"]
+        else:
+            # Text aus PDF extrahieren und als Sidecar für spätere Prüfungen ablegen
+            pages = await extract_pages_from_pdf(filepath)
+            plan_text_store.save(content_hash, pages, EXTRACTION_SETTINGS)
+            text_content = render_plan_text(pages)
+            
+            # Technische Zeichnung analysieren mit GPT-4 Vision
+            visual_analysis = await analyze_technical_drawing(filepath)
+            
+            # Kombinierte Analyse
+            initial_analysis = {
+                "visual_analysis": visual_analysis,
+                "text_metadata": await analyze_plan_basic(text_content[:2000]) if text_content else {}
+            }
+            page_count = estimate_page_count(text_content)
+            text_preview = text_content[:500] + "..." if len(text_content) > 500 else text_content
+            text_length = len(text_content)
         
         # Ergebnis zusammenstellen
         result = {
@@ -258,18 +258,24 @@ async def upload_plan(file: UploadFile = File(...)):
             "original_filename": file.filename,
             "upload_time": timestamp,
             "file_size": len(content),
-            "page_count": estimate_page_count(text_content),
-            "text_preview": text_content[:500] + "..." if len(text_content) > 500 else text_content,
-            "text_length": len(text_content),
+            "content_hash": content_hash,
+            "page_count": page_count,
+            "text_preview": text_preview,
+            "text_length": text_length,
             "initial_analysis": initial_analysis,
             "status": "uploaded"
         }
         
+        if source_plan:
+            result["reused_from"] = source_plan["id"]
+        
         # Ergebnis speichern
         result_file = RESULTS_DIR / f"{timestamp}_analysis.json"
         with open(result_file, "w", encoding="utf-8") as f:
             json.dump(result, f, ensure_ascii=False, indent=2)
         
+        upload_store.register_plan(content_hash, timestamp, len(content))
+        
         logger.info(f"✅ Upload erfolgreich: {file.filename}")
         return JSONResponse(content=result)
         
@@ -278,14 +284,45 @@ async def upload_plan(file: UploadFile = File(...)):
         # Aufräumen bei Fehler
         if 'filepath' in locals() and filepath.exists():
             filepath.unlink()
+        if 'is_new' in locals() and is_new:
+            # Fehler vor register_plan: Blob gehört noch keinem Plan
+            if not upload_store.release(content_hash, timestamp):
+                upload_store.discard(content_hash)
         raise HTTPException(status_code=500, detail=f"Upload fehlgeschlagen: {str(e)}")
 
 
+def find_reusable_analysis(content_hash: str) -> Optional[Dict]:
+    """Neueste erfolgreiche Analyse eines Plans mit identischem Inhalt finden"""
+    for plan_id in reversed(upload_store.plans_for(content_hash)):
+        analysis_file = RESULTS_DIR / f"{plan_id}_analysis.json"
+        if not analysis_file.exists():
+            continue
+        
+        try:
+            with open(analysis_file, "r", encoding="utf-8") as f:
+                plan_data = json.load(f)
+        except Exception as e:
+            logger.warning(f"⚠️ Fehler beim Laden von {analysis_file}: {e}")
+            continue
+        
+        # Fehlgeschlagene Analysen (z.B. fehlender API-Key) nicht wiederverwenden
+        visual_analysis = plan_data.get("initial_analysis", {}).get("visual_analysis", {})
+        if visual_analysis and "error" not in visual_analysis:
+            return plan_data
+    
+    return None
+
+
 async def extract_text_from_pdf(filepath: Path) -> str:
     """Text aus PDF extrahieren - erst normal, dann OCR bei Bedarf"""
+    return render_plan_text(await extract_pages_from_pdf(filepath))
+
+
+async def extract_pages_from_pdf(filepath: Path) -> List[Dict]:
+    """Text seitenweise aus PDF extrahieren - erst normal, dann OCR bei Bedarf"""
     try:
         # Versuch 1: Normaler Text-Extrakt mit PyPDF2
-        text = ""
+        pages = []
         with open(filepath, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
             
@@ -293,74 +330,77 @@ async def extract_text_from_pdf(filepath: Path) -> str:
                 try:
                     page_text = page.extract_text()
                     if page_text.strip():
-                        text += f"--- Seite {page_num + 1} ---\n{page_text}\n\n"
+                        pages.append({"page": page_num + 1, "method": "native", "text": page_text})
                 except Exception as e:
                     logger.warning(f"⚠️ Seite {page_num + 1} konnte nicht gelesen werden: {e}")
                     continue
         
         # Wenn Text gefunden wurde, zurückgeben
-        if text.strip():
+        if pages:
             logger.info("✅ Text erfolgreich aus PDF extrahiert (normaler Modus)")
-            return text
+            return pages
         
         # Versuch 2: OCR für gescannte PDFs
         logger.info("📷 Kein Text gefunden - verwende OCR für gescanntes PDF...")
-        text = await extract_text_with_ocr(filepath)
+        pages = await extract_pages_with_ocr(filepath)
         
-        if text.strip():
+        if pages:
             logger.info("✅ Text erfolgreich mit OCR extrahiert")
-            return text
+            return pages
         
         logger.warning("⚠️ Kein Text mit OCR gefunden - verwende leeren Text für reine Bildanalyse")
-        return "# Gescanntes PDF - Nur visuelle Analyse verfügbar"
+        return []
         
     except Exception as e:
         logger.error(f"❌ PDF-Extraktion fehlgeschlagen: {e}")
         # Für gescannte PDFs ohne Text ist das normal - trotzdem fortfahren
         if "Keine Textinhalte" in str(e) or "OCR" in str(e):
             logger.info("💡 Kein Text verfügbar - System arbeitet nur mit visueller Analyse")
-            return "# Gescanntes PDF - Nur visuelle Analyse verfügbar"
+            return []
         raise Exception(f"PDF-Verarbeitung fehlgeschlagen: {str(e)}")
 
 
-async def extract_text_with_ocr(filepath: Path) -> str:
-    """Text mit OCR aus gescanntem PDF extrahieren"""
+async def extract_pages_with_ocr(filepath: Path) -> List[Dict]:
+    """Text mit OCR aus gescanntem PDF extrahieren (parallel über den OCR-Prozess-Pool)"""
     try:
-        # PDF in Bilder konvertieren
-        logger.info("🔄 Konvertiere PDF in Bilder für OCR...")
-        images = convert_from_path(
-            filepath,
-            dpi=200,  # Gute Balance zwischen Qualität und Geschwindigkeit
-            first_page=1,
-            last_page=10  # Limitierung auf erste 10 Seiten für Performance
-        )
+        logger.info("🔄 Starte seitenweise OCR...")
         
-        text = ""
-        for page_num, image in enumerate(images):
-            try:
-                logger.info(f"🔍 OCR für Seite {page_num + 1}...")
-                
-                # OCR mit Tesseract (Deutsch + Englisch)
-                page_text = pytesseract.image_to_string(
-                    image, 
-                    lang='deu+eng',  # Deutsch und Englisch
-                    config='--psm 1 --oem 3'  # Automatische Seitensegmentierung
-                )
-                
-                if page_text.strip():
-                    text += f"--- Seite {page_num + 1} (OCR) ---\n{page_text}\n\n"
-                    
-            except Exception as e:
-                logger.warning(f"⚠️ OCR für Seite {page_num + 1} fehlgeschlagen: {e}")
-                continue
+        pages = []
+        async for page_num, page_text in ocr_engine.iter_pages(filepath):
+            if page_text.strip():
+                pages.append({"page": page_num, "method": "ocr", "text": page_text})
         
-        return text
+        return pages
         
     except Exception as e:
         logger.error(f"❌ OCR-Verarbeitung fehlgeschlagen: {e}")
         raise Exception(f"OCR-Verarbeitung fehlgeschlagen: {str(e)}")
 
 
+async def get_plan_text(plan_data: Dict) -> str:
+    """Plan-Text aus dem Sidecar lesen (extrahiert nur, falls noch keiner existiert)"""
+    pdf_path = UPLOAD_DIR / plan_data["filename"]
+    content_hash = plan_data.get("content_hash")
+    
+    if not content_hash:
+        # Ältere Pläne ohne Hash: einmalig aus der Datei bestimmen
+        if not pdf_path.exists():
+            raise HTTPException(status_code=404, detail="Original-PDF nicht gefunden")
+        content_hash = upload_store.file_hash(pdf_path)
+    
+    text = plan_text_store.load_text(content_hash)
+    if text is not None:
+        return text
+    
+    if not pdf_path.exists():
+        raise HTTPException(status_code=404, detail="Original-PDF nicht gefunden")
+    
+    logger.info(f"📄 Kein Text-Sidecar für Plan {plan_data['id']} - extrahiere einmalig")
+    pages = await extract_pages_from_pdf(pdf_path)
+    plan_text_store.save(content_hash, pages, EXTRACTION_SETTINGS)
+    return render_plan_text(pages)
+
+
 def estimate_page_count(text: str) -> int:
     """Schätze Seitenanzahl basierend auf Text"""
     return max(1, text.count("--- Seite"))
@@ -375,43 +415,29 @@ async def analyze_technical_drawing(filepath: Path) -> Dict:
         }
     
     try:
-        # PDF in Bilder konvertieren für Vision API
+        # Nur die Seite rendern, die tatsächlich an das Vision-Modell geht
         logger.info("🎨 Konvertiere PDF für visuelle Analyse...")
-        images = convert_from_path(filepath, dpi=150, first_page=1, last_page=5)
+        vision_inputs = build_vision_inputs(filepath, pages=[1], dpi=150)
         
-        if not images:
+        if not vision_inputs:
             return {"error": "Keine Bilder aus PDF extrahiert"}
         
-        # Erstes Bild für Analyse verwenden
-        image = images[0]
-        
-        # Bild zu Base64 konvertieren
-        img_buffer = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
-        image.save(img_buffer.name, 'PNG')
-        
-        with open(img_buffer.name, 'rb') as img_file:
-            img_base64 = base64.b64encode(img_file.read()).decode('utf-8')
-        
-        os.unlink(img_buffer.name)  # Temp-Datei löschen
+        vision_input_info = describe_vision_inputs(vision_inputs)
+        logger.info(f"📦 Vision-Eingabe: {vision_input_info['bytes']} Bytes")
         
         # GPT-4 Vision API für technische Analyse
-        from openai import OpenAI
-        client = OpenAI(api_key=openai.api_key)
-        
-        response = client.chat.completions.create(
-            model="gpt-4-vision-preview",
-            messages=[
-                {
-                    "role": "system",
-                    "content": """Du bist ein Experte für technische Zeichnungen, CAD-Systeme und DIN-Normen im Bauwesen. 
-                    Analysiere die technische Zeichnung systematisch und strukturiert. Antworte nur auf Deutsch."""
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": """Analysiere diese technische Zeichnung/Bauplan detailliert:
+        messages = [
+            {
+                "role": "system",
+                "content": """Du bist ein Experte für technische Zeichnungen, CAD-Systeme und DIN-Normen im Bauwesen. 
+                Analysiere die technische Zeichnung systematisch und strukturiert. Antworte nur auf Deutsch."""
+            },
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": """Analysiere diese technische Zeichnung/Bauplan detailliert:
 
 1. **PLAN-TYP**: Identifiziere die Art der Zeichnung (Grundriss, Schnitt, Ansicht, Detail, Lageplan, etc.)
 
@@ -453,19 +479,33 @@ Antworte im JSON-Format mit diesen Schlüsseln:
   "massstab": "...",
   "vollstaendigkeit": "..."
 }"""
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/png;base64,{img_base64}"
-                            }
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": vision_inputs[0]["data_url"]
                         }
-                    ]
-                }
-            ],
-            max_tokens=2000,
-            temperature=0.2
-        )
+                    }
+                ]
+            }
+        ]
+        
+        # Budget prüfen: ggf. günstigeres Modell, sonst nur lokale Auswertung (Text/OCR)
+        admission = budget_controller.admit("analyze_technical_drawing", "gpt-4-vision-preview", messages, max_tokens=2000)
+        if not admission.allowed:
+            return {
+                "error": "Visuelle Analyse wegen Budget übersprungen",
+                "status": admission.reason,
+                "budget": admission.to_dict(),
+                "vision_input": vision_input_info
+            }
+        
+        with admission:
+            response = await llm_gateway.chat(
+                "analyze_technical_drawing", admission.model, messages, kind="vision",
+                max_tokens=2000,
+                temperature=0.2
+            )
         
         content = response.choices[0].message.content
         
@@ -474,13 +514,16 @@ Antworte im JSON-Format mit diesen Schlüsseln:
             analysis = json.loads(content)
             analysis["timestamp"] = datetime.now().isoformat()
             analysis["analysis_type"] = "vision_technical"
-            analysis["model"] = "gpt-4-vision"
+            analysis["model"] = "gpt-4-vision" if admission.decision == ADMIT else admission.model
+            analysis["vision_input"] = vision_input_info
+            analysis["budget"] = admission.to_dict()
             return analysis
         except json.JSONDecodeError:
             return {
                 "error": "JSON Parse Fehler",
                 "raw_response": content,
-                "status": "Vision API Antwort konnte nicht geparst werden"
+                "status": "Vision API Antwort konnte nicht geparst werden",
+                "vision_input": vision_input_info
             }
         
     except Exception as e:
@@ -501,20 +544,15 @@ async def analyze_plan_basic(text: str) -> Dict:
         }
     
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=openai.api_key)
-        
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {
-                    "role": "system", 
-                    "content": """Analysiere Textinhalte aus technischen Zeichnungen (Beschriftungen, Maße, etc.).
-                    Fokus auf Metadaten und Textinformationen."""
-                },
-                {
-                    "role": "user", 
-                    "content": f"""Analysiere diese Textinhalte aus einer technischen Zeichnung:
+        messages = [
+            {
+                "role": "system", 
+                "content": """Analysiere Textinhalte aus technischen Zeichnungen (Beschriftungen, Maße, etc.).
+                Fokus auf Metadaten und Textinformationen."""
+            },
+            {
+                "role": "user", 
+                "content": f"""Analysiere diese Textinhalte aus einer technischen Zeichnung:
 
 {text}
 
@@ -525,11 +563,25 @@ Extrahiere:
 4. "projekt_info": Projektinformationen (Titel, Datum, etc.)
 
 JSON-Format verwenden."""
-                }
-            ],
-            temperature=0.2,
-            max_tokens=800
-        )
+            }
+        ]
+        
+        # Budget prüfen: ggf. günstigeres Modell, sonst keine Text-Metadaten
+        admission = budget_controller.admit("analyze_plan_basic", "gpt-4", messages, max_tokens=800)
+        if not admission.allowed:
+            return {
+                "text_available": True,
+                "note": f"Textanalyse wegen Budget übersprungen: {admission.reason}",
+                "budget": admission.to_dict(),
+                "text_length": len(text)
+            }
+        
+        with admission:
+            response = await llm_gateway.chat(
+                "analyze_plan_basic", admission.model, messages,
+                temperature=0.2,
+                max_tokens=800
+            )
         
         content = response.choices[0].message.content
         
@@ -579,8 +631,8 @@ async def get_plans():
 
 
 @app.post("/check-against-din/{plan_id}")
-async def check_against_din(plan_id: str, background_tasks: BackgroundTasks):
-    """Plan gegen DIN-Normen prüfen"""
+async def check_against_din(plan_id: str, priority: int = 0):
+    """Plan gegen DIN-Normen prüfen (als Job in der Warteschlange)"""
     
     analysis_file = RESULTS_DIR / f"{plan_id}_analysis.json"
     
@@ -592,77 +644,32 @@ async def check_against_din(plan_id: str, background_tasks: BackgroundTasks):
         with open(analysis_file, "r", encoding="utf-8") as f:
             plan_data = json.load(f)
         
-        # Vollständigen Text aus Original-PDF holen
-        pdf_path = UPLOAD_DIR / plan_data["filename"]
-        if not pdf_path.exists():
-            raise HTTPException(status_code=404, detail="Original-PDF nicht gefunden")
-        
-        full_text = await extract_text_from_pdf(pdf_path)
+        # Vollständigen Text aus dem Sidecar holen
+        full_text = await get_plan_text(plan_data)
         
-        # DIN-Prüfung im Hintergrund starten
-        background_tasks.add_task(perform_din_check, plan_id, full_text)
+        # DIN-Prüfung als Job einreihen
+        job_id = job_queue.enqueue(
+            "din_check",
+            {"plan_id": plan_id, "plan_text": full_text},
+            plan_id=plan_id,
+            priority=priority,
+            max_attempts=JOB_MAX_ATTEMPTS
+        )
         
         return {
             "message": "DIN-Prüfung gestartet",
             "plan_id": plan_id,
+            "job_id": job_id,
             "status": "in_progress"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ DIN-Prüfung Fehler: {e}")
         raise HTTPException(status_code=500, detail=f"DIN-Prüfung fehlgeschlagen: {str(e)}")
 
 
-async def perform_din_check(plan_id: str, plan_text: str):
-    """Technische DIN-Prüfung für Zeichnungen durchführen (Background Task)"""
-    try:
-        logger.info(f"🔍 Starte technische DIN-Prüfung für Plan {plan_id}")
-        
-        # Analyse-Datei laden um visuelle Analyse zu bekommen
-        analysis_file = RESULTS_DIR / f"{plan_id}_analysis.json"
-        
-        with open(analysis_file, "r", encoding="utf-8") as f:
-            plan_data = json.load(f)
-        
-        # Visuelle Analyse für DIN-Check verwenden
-        visual_analysis = plan_data.get("initial_analysis", {}).get("visual_analysis", {})
-        
-        if visual_analysis:
-            # Technische DIN-Normen-Prüfung
-            technical_compliance = technical_processor.analyze_technical_compliance(visual_analysis)
-            
-            # Zusätzlich: Textbasierte Analyse falls vorhanden
-            text_based_check = din_processor.check_against_norms(plan_text) if plan_text else {}
-            
-            # Kombinierte DIN-Prüfung
-            combined_din_check = {
-                "technical_compliance": technical_compliance,
-                "text_based_analysis": text_based_check,
-                "analysis_type": "comprehensive_technical",
-                "timestamp": datetime.now().isoformat()
-            }
-        else:
-            # Fallback auf reine Textanalyse
-            combined_din_check = {
-                "text_based_analysis": din_processor.check_against_norms(plan_text),
-                "analysis_type": "text_only_fallback",
-                "note": "Keine visuelle Analyse verfügbar",
-                "timestamp": datetime.now().isoformat()
-            }
-        
-        plan_data["din_check"] = combined_din_check
-        plan_data["din_check_timestamp"] = datetime.now().isoformat()
-        plan_data["status"] = "technical_din_checked"
-        
-        with open(analysis_file, "w", encoding="utf-8") as f:
-            json.dump(plan_data, f, ensure_ascii=False, indent=2)
-        
-        logger.info(f"✅ Technische DIN-Prüfung abgeschlossen für Plan {plan_id}")
-        
-    except Exception as e:
-        logger.error(f"❌ Background DIN-Prüfung Fehler: {e}")
-
-
 @app.get("/din-check-status/{plan_id}")
 async def get_din_check_status(plan_id: str):
     """Status der DIN-Prüfung abfragen"""
@@ -675,15 +682,92 @@ async def get_din_check_status(plan_id: str):
         plan_data = json.load(f)
     
     has_din_check = "din_check" in plan_data
+    job = job_queue.latest_for_plan(plan_id, kind="din_check")
     
     return {
         "plan_id": plan_id,
         "has_din_check": has_din_check,
         "status": plan_data.get("status", "unknown"),
+        "job": JobQueue.public_view(job),
         "din_check": plan_data.get("din_check") if has_din_check else None
     }
 
 
+@app.get("/jobs")
+async def list_jobs(status: Optional[str] = None, limit: int = 50):
+    """Jobs der Warteschlange auflisten"""
+    return {
+        "counts": job_queue.count_by_status(),
+        "jobs": [JobQueue.public_view(job) for job in job_queue.list_jobs(status, limit)]
+    }
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: int):
+    """Status eines einzelnen Jobs"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job nicht gefunden")
+    return JobQueue.public_view(job)
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: int):
+    """Wartenden Job abbrechen bzw. laufenden Job zum Abbruch markieren"""
+    if job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job nicht gefunden")
+    
+    if not job_queue.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job ist bereits abgeschlossen")
+    
+    return JobQueue.public_view(job_queue.get(job_id))
+
+
+@app.post("/re-extract/{plan_id}")
+async def re_extract_plan_text(plan_id: str):
+    """Plan-Text neu extrahieren (z.B. nach geänderten OCR-Einstellungen)"""
+    analysis_file = RESULTS_DIR / f"{plan_id}_analysis.json"
+    
+    if not analysis_file.exists():
+        raise HTTPException(status_code=404, detail="Plan nicht gefunden")
+    
+    with open(analysis_file, "r", encoding="utf-8") as f:
+        plan_data = json.load(f)
+    
+    pdf_path = UPLOAD_DIR / plan_data["filename"]
+    if not pdf_path.exists():
+        raise HTTPException(status_code=404, detail="Original-PDF nicht gefunden")
+    
+    try:
+        content_hash = plan_data.get("content_hash") or upload_store.file_hash(pdf_path)
+        pages = await extract_pages_from_pdf(pdf_path)
+        sidecar = plan_text_store.save(content_hash, pages, EXTRACTION_SETTINGS)
+        text_content = render_plan_text(pages)
+        
+        plan_data["content_hash"] = content_hash
+        plan_data["page_count"] = estimate_page_count(text_content)
+        plan_data["text_preview"] = text_content[:500] + "..." if len(text_content) > 500 else text_content
+        plan_data["text_length"] = len(text_content)
+        
+        with open(analysis_file, "w", encoding="utf-8") as f:
+            json.dump(plan_data, f, ensure_ascii=False, indent=2)
+        
+        return {
+            "message": "Plan-Text neu extrahiert",
+            "plan_id": plan_id,
+            "pages": [
+                {"page": page["page"], "method": page["method"], "chars": len(page["text"])}
+                for page in sidecar["pages"]
+            ],
+            "text_length": len(text_content),
+            "settings": EXTRACTION_SETTINGS
+        }
+        
+    except Exception as e:
+        logger.error(f"❌ Neu-Extraktion Fehler: {e}")
+        raise HTTPException(status_code=500, detail=f"Neu-Extraktion fehlgeschlagen: {str(e)}")
+
+
 @app.post("/process-din-norms")
 async def process_din_norms():
     """DIN-Normen neu einlesen und in Vektordatenbank speichern"""
@@ -697,8 +781,8 @@ async def process_din_norms():
                 "count": 0
             }
         
-        # DIN-Normen verarbeiten
-        chunk_count = din_processor.process_din_pdfs(str(DIN_NORMS_DIR))
+        # DIN-Normen inkrementell verarbeiten (außerhalb der Event-Loop)
+        chunk_count = await asyncio.to_thread(din_processor.process_din_pdfs, str(DIN_NORMS_DIR))
         
         return {
             "message": f"DIN-Normen erfolgreich verarbeitet",
@@ -745,10 +829,8 @@ async def add_feedback(plan_id: str, feedback: Dict):
         # Optional: Aus Feedback lernen
         if hasattr(din_processor, 'learn_from_feedback'):
             try:
-                pdf_path = UPLOAD_DIR / plan_data["filename"]
-                if pdf_path.exists():
-                    plan_text = await extract_text_from_pdf(pdf_path)
-                    din_processor.learn_from_feedback(plan_text, feedback_entry)
+                plan_text = await get_plan_text(plan_data)
+                din_processor.learn_from_feedback(plan_text, feedback_entry)
             except Exception as e:
                 logger.warning(f"⚠️ Feedback-Learning Fehler: {e}")
         
@@ -775,10 +857,13 @@ async def delete_plan(plan_id: str):
         with open(analysis_file, "r", encoding="utf-8") as f:
             plan_data = json.load(f)
         
-        # PDF-Datei löschen
+        # PDF-Datei löschen (Blob nur, wenn kein anderer Plan ihn nutzt)
         pdf_file = UPLOAD_DIR / plan_data["filename"]
-        if pdf_file.exists():
-            pdf_file.unlink()
+        content_hash = plan_data.get("content_hash")
+        if not content_hash and pdf_file.exists():
+            content_hash = upload_store.file_hash(pdf_file)
+        if content_hash and upload_store.release(content_hash, plan_id, pdf_file):
+            plan_text_store.delete(content_hash)
         
         # Analyse-Datei löschen
         analysis_file.unlink()
@@ -801,36 +886,15 @@ async def get_statistics():
         analysis_dir = Path("analysis_results")
         analysis_files = list(analysis_dir.glob("*.json")) if analysis_dir.exists() else []
         
-        # Feedback-Statistiken
-        feedback_db_path = Path("din_norms/feedback_db.json")
+        # Feedback-Statistiken (eine Aggregat-Abfrage über das Feedback-Protokoll)
         feedback_stats = {"positive": 0, "negative": 0, "average_rating": 0}
-        
-        if feedback_db_path.exists():
-            try:
-                with open(feedback_db_path, "r", encoding="utf-8") as f:
-                    feedback_db = json.load(f)
-                    
-                feedback_stats["positive"] = len(feedback_db.get("positive_examples", []))
-                feedback_stats["negative"] = len(feedback_db.get("negative_examples", []))
-                
-                # Durchschnittsbewertung berechnen
-                all_ratings = []
-                for example in feedback_db.get("positive_examples", []):
-                    if "rating" in example:
-                        all_ratings.append(example["rating"])
-                for example in feedback_db.get("negative_examples", []):
-                    if "rating" in example:
-                        all_ratings.append(example["rating"])
-                        
-                if all_ratings:
-                    feedback_stats["average_rating"] = sum(all_ratings) / len(all_ratings)
-                    
-            except Exception as e:
-                logger.error(f"Fehler beim Laden der Feedback-Statistiken: {e}")
+        try:
+            feedback_stats = din_processor.feedback_store.statistics()
+        except Exception as e:
+            logger.error(f"Fehler beim Laden der Feedback-Statistiken: {e}")
         
         # DIN-Normen Information
-        processor = DINNormProcessor()
-        processing_info = processor.get_processing_info()
+        processing_info = din_processor.get_processing_info()
         
         return {
             "timestamp": datetime.now().isoformat(),
@@ -883,8 +947,8 @@ async def upload_din_norm(file: UploadFile = File(...)):
         
         logger.info(f"📚 DIN-Norm gespeichert: {filepath}")
         
-        # Sofort verarbeiten
-        chunks_processed = din_processor.process_din_pdfs(str(DIN_NORMS_DIR))
+        # Nur die neue bzw. ersetzte Datei indizieren (außerhalb der Event-Loop)
+        chunks_processed = await asyncio.to_thread(din_processor.process_din_pdfs, str(DIN_NORMS_DIR))
         
         result = {
             "filename": safe_filename,
@@ -893,7 +957,7 @@ async def upload_din_norm(file: UploadFile = File(...)):
             "upload_time": datetime.now().isoformat(),
             "chunks_processed": chunks_processed,
             "status": "processed",
-            "message": f"DIN-Norm erfolgreich hochgeladen und {chunks_processed} Textblöcke verarbeitet"
+            "message": f"DIN-Norm erfolgreich hochgeladen - Index enthält {chunks_processed} Textblöcke"
         }
         
         logger.info(f"✅ DIN-Norm Upload erfolgreich: {file.filename}")
@@ -911,8 +975,7 @@ async def upload_din_norm(file: UploadFile = File(...)):
 async def get_din_norms_status():
     """DIN-Normen Status für Home Assistant"""
     try:
-        processor = DINNormProcessor()
-        processing_info = processor.get_processing_info()
+        processing_info = din_processor.get_processing_info()
         
         # Verfügbare DIN-Normen auflisten
         din_path = Path("din_norms")
@@ -955,8 +1018,8 @@ async def delete_din_norm(filename: str):
         
         filepath.unlink()
         
-        # Vektordatenbank neu aufbauen
-        chunks_processed = din_processor.process_din_pdfs(str(DIN_NORMS_DIR))
+        # Vektoren der gelöschten Datei entfernen
+        chunks_processed = await asyncio.to_thread(din_processor.process_din_pdfs, str(DIN_NORMS_DIR))
         
         return {
             "message": f"DIN-Norm {filename} erfolgreich gelöscht",
@@ -0,0 +1,104 @@
+"""
+OCR Engine
+Parallele OCR-Verarbeitung gescannter PDFs über einen Prozess-Pool
+"""
+
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Optional, Tuple
+
+from pdf_rasterizer import count_pdf_pages, render_page
+
+logger = logging.getLogger(__name__)
+
+# Standardwerte (entsprechen der bisherigen OCR-Konfiguration)
+OCR_DPI = 200
+OCR_MAX_PAGES = 10
+OCR_LANG = 'deu+eng'
+OCR_CONFIG = '--psm 1 --oem 3'
+
+
+def _ocr_page(filepath: str, page_num: int, dpi: int, lang: str, config: str) -> str:
+    """Eine einzelne Seite rendern und mit Tesseract erkennen (läuft im Worker-Prozess)"""
+    import pytesseract
+
+    image = render_page(Path(filepath), page_num, dpi=dpi)
+    if image is None:
+        return ""
+
+    try:
+        return pytesseract.image_to_string(image, lang=lang, config=config)
+    finally:
+        image.close()
+
+
+class OCREngine:
+    """Verteilt OCR seitenweise auf einen Prozess-Pool und liefert Ergebnisse als Stream"""
+
+    def __init__(self, max_workers: Optional[int] = None, dpi: int = OCR_DPI,
+                 max_pages: int = OCR_MAX_PAGES, lang: str = OCR_LANG, config: str = OCR_CONFIG):
+        self.max_workers = max_workers or int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+        self.dpi = dpi
+        self.max_pages = max_pages
+        self.lang = lang
+        self.config = config
+        self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Prozess-Pool erst bei der ersten OCR-Anfrage starten"""
+        if self._executor is None:
+            logger.info(f"🔧 Starte OCR-Prozess-Pool mit {self.max_workers} Workern")
+            # spawn statt fork: der API-Prozess hat bereits Threads (LLM-Gateway, FastAPI-Threadpool)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def iter_pages(self, filepath: Path) -> AsyncIterator[Tuple[int, str]]:
+        """OCR-Text je Seite in Seitenreihenfolge liefern, sobald die Seite fertig ist"""
+        loop = asyncio.get_running_loop()
+        page_count = await loop.run_in_executor(None, count_pdf_pages, filepath, self.max_pages)
+        last_page = min(page_count, self.max_pages)
+
+        executor = self._get_executor()
+        futures = [
+            loop.run_in_executor(
+                executor, _ocr_page, str(filepath), page_num, self.dpi, self.lang, self.config
+            )
+            for page_num in range(1, last_page + 1)
+        ]
+
+        logger.info(f"🔍 OCR für {last_page} Seiten auf {self.max_workers} Workern gestartet...")
+
+        try:
+            for page_num, future in enumerate(futures, 1):
+                try:
+                    page_text = await future
+                except Exception as e:
+                    logger.warning(f"⚠️ OCR für Seite {page_num} fehlgeschlagen: {e}")
+                    continue
+
+                logger.info(f"✅ OCR Seite {page_num}/{last_page} fertig")
+                yield page_num, page_text
+        finally:
+            # Bei Abbruch des Streams noch wartende Seiten verwerfen
+            for future in futures:
+                future.cancel()
+
+    async def extract_text(self, filepath: Path) -> str:
+        """Gesamten OCR-Text mit Seitenmarkierungen zusammensetzen"""
+        text = ""
+        async for page_num, page_text in self.iter_pages(filepath):
+            if page_text.strip():
+                text += f"--- Seite {page_num} (OCR) ---\n{page_text}\n\n"
+        return text
+
+    def shutdown(self):
+        """Prozess-Pool beenden"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
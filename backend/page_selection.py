@@ -0,0 +1,111 @@
+"""
+Page Selection
+Auswahl der Normseiten für die Bildanalyse anhand der PDF-Struktur (Bild-XObjects, Dichte der
+Vektor-Zeichenoperatoren, Textdichte) – ohne zu rendern, über das ganze Dokument statt "Seiten 1–5"
+"""
+
+import os
+import re
+import math
+import time
+import logging
+from pathlib import Path
+from typing import Dict, List
+
+import PyPDF2
+
+logger = logging.getLogger(__name__)
+
+# Höchstens so viele Seiten je Norm an das Vision-Modell
+VISION_MAX_PAGES = int(os.getenv("VISION_MAX_PAGES", "5"))
+# Bilder unterhalb dieser Pixelzahl (Logos, Aufzählungszeichen) zählen nicht als Abbildung
+MIN_IMAGE_PIXELS = 128 * 128
+# Gewicht eines Bildes gegenüber log(1 + Zeichenoperatoren)
+IMAGE_WEIGHT = 3.0
+# Reine Textseiten (Deckblatt, Impressum, Inhaltsverzeichnis) werden bis auf die Hälfte abgewertet
+TEXT_PENALTY = 0.5
+# Formular-XObjects werden bis zu dieser Tiefe nach Bildern und Zeichnungen durchsucht
+MAX_FORM_DEPTH = 3
+
+# Pfadkonstruktion (m l c v y re) und Zeichnen (S s f F f* B B* b b*) bzw. Textausgabe (Tj TJ ' ")
+_DRAWING_OPERATOR = re.compile(rb"(?<![^\s\]\)>])(?:re|[mlcvySsFfBb]\*?)(?=[\s\[\(<]|$)")
+_TEXT_OPERATOR = re.compile(rb"(?<![^\s\]\)>])(?:Tj|TJ|'|\")(?=[\s\[\(<]|$)")
+
+
+def _stream_data(contents) -> bytes:
+    """Dekodierte Inhalte eines /Contents-Eintrags (Stream oder Array von Streams)"""
+    if contents is None:
+        return b""
+    contents = contents.get_object()
+    if isinstance(contents, PyPDF2.generic.ArrayObject):
+        return b"\n".join(part.get_object().get_data() for part in contents)
+    return contents.get_data()
+
+
+def _scan_resources(resources, counts: Dict, depth: int = 0):
+    """Bilder und Zeichnungen in (verschachtelten) XObjects zählen"""
+    if resources is None or depth > MAX_FORM_DEPTH:
+        return
+    xobjects = resources.get_object().get("/XObject")
+    if xobjects is None:
+        return
+    for ref in xobjects.get_object().values():
+        xobject = ref.get_object()
+        subtype = xobject.get("/Subtype")
+        if subtype == "/Image":
+            if int(xobject.get("/Width", 0)) * int(xobject.get("/Height", 0)) >= MIN_IMAGE_PIXELS:
+                counts["images"] += 1
+        elif subtype == "/Form":
+            data = xobject.get_data()
+            counts["drawing_ops"] += len(_DRAWING_OPERATOR.findall(data))
+            counts["text_ops"] += len(_TEXT_OPERATOR.findall(data))
+            _scan_resources(xobject.get("/Resources"), counts, depth + 1)
+
+
+def score_page(page) -> Dict:
+    """Abbildungs-Kennzahlen einer Seite und daraus ein Score (0 = keine Abbildung)"""
+    counts = {"images": 0, "drawing_ops": 0, "text_ops": 0}
+    data = _stream_data(page.get("/Contents"))
+    counts["drawing_ops"] += len(_DRAWING_OPERATOR.findall(data))
+    counts["text_ops"] += len(_TEXT_OPERATOR.findall(data))
+    _scan_resources(page.get("/Resources"), counts)
+
+    figure = IMAGE_WEIGHT * counts["images"] + math.log1p(counts["drawing_ops"])
+    text_share = counts["text_ops"] / (counts["text_ops"] + counts["drawing_ops"] + 1)
+    counts["score"] = round(figure * (1 - TEXT_PENALTY * text_share), 3)
+    return counts
+
+
+def select_figure_pages(filepath: Path, max_pages: int = VISION_MAX_PAGES) -> List[int]:
+    """
+    Die `max_pages` Seiten mit dem meisten Abbildungsinhalt (1-basiert, in Seitenreihenfolge).
+    Seiten ohne Bilder und Zeichnungen werden nie gewählt; ist die Struktur nicht lesbar,
+    gelten wie bisher die ersten Seiten.
+    """
+    started = time.perf_counter()
+    try:
+        with open(filepath, 'rb') as file:
+            reader = PyPDF2.PdfReader(file)
+            scores = []
+            for page_num, page in enumerate(reader.pages, 1):
+                try:
+                    scores.append((page_num, score_page(page)))
+                except Exception as e:
+                    logger.warning(f"⚠️ Seitenanalyse {filepath.name} Seite {page_num}: {e}")
+    except Exception as e:
+        logger.warning(f"⚠️ PDF-Struktur von {filepath.name} nicht lesbar ({e}) - verwende die ersten Seiten")
+        return list(range(1, max_pages + 1))
+
+    ranked = sorted((item for item in scores if item[1]["score"] > 0), key=lambda item: (-item[1]["score"], item[0]))
+    selected = sorted(page_num for page_num, _ in ranked[:max_pages])
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    details = ", ".join(
+        f"{page_num} ({counts['images']} Bilder, {counts['drawing_ops']} Zeichenop., Score {counts['score']})"
+        for page_num, counts in sorted(ranked[:max_pages])
+    )
+    logger.info(
+        f"🎯 Seitenauswahl {filepath.name}: {len(selected)} von {len(scores)} Seiten in {elapsed_ms:.0f} ms"
+        + (f" - {details}" if details else " - keine Abbildungen gefunden")
+    )
+    return selected
@@ -0,0 +1,76 @@
+"""
+PDF Rasterizer
+Seitenweises Rendern von PDFs mit begrenztem Speicherbedarf
+"""
+
+import os
+import logging
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+import PyPDF2
+
+logger = logging.getLogger(__name__)
+
+# Maximale Anzahl gleichzeitig im Speicher gehaltener Seitenbilder
+MAX_PAGES_IN_MEMORY = int(os.getenv("RASTER_MAX_PAGES_IN_MEMORY", "1"))
+
+
+def count_pdf_pages(filepath: Path, default: int = 10) -> int:
+    """Seitenanzahl eines PDFs bestimmen (ohne zu rendern)"""
+    try:
+        with open(filepath, 'rb') as file:
+            return len(PyPDF2.PdfReader(file).pages)
+    except Exception as e:
+        logger.warning(f"⚠️ Seitenanzahl über PyPDF2 nicht lesbar ({e}) - verwende pdfinfo")
+
+    try:
+        from pdf2image import pdfinfo_from_path
+        return int(pdfinfo_from_path(str(filepath))["Pages"])
+    except Exception as e:
+        logger.warning(f"⚠️ Seitenanzahl unbekannt ({e}) - nehme {default} Seiten an")
+        return default
+
+
+def render_page(filepath: Path, page_num: int, dpi: int = 150):
+    """Eine einzelne Seite als PIL-Bild rendern (None, falls die Seite nicht existiert)"""
+    from pdf2image import convert_from_path
+
+    images = convert_from_path(str(filepath), dpi=dpi, first_page=page_num, last_page=page_num)
+    return images[0] if images else None
+
+
+def iter_pdf_pages(filepath: Path, dpi: int = 150, first_page: int = 1,
+                   last_page: Optional[int] = None,
+                   max_in_memory: Optional[int] = None) -> Iterator[Tuple[int, object]]:
+    """
+    Seiten nacheinander als (Seitennummer, PIL-Bild) liefern.
+
+    Es werden höchstens `max_in_memory` Seiten gleichzeitig dekodiert. Ein geliefertes
+    Bild wird geschlossen, sobald der Aufrufer die nächste Seite anfordert - wer ein Bild
+    länger braucht, muss es vorher kopieren oder kodieren.
+    """
+    from pdf2image import convert_from_path
+
+    batch_size = max(1, max_in_memory or MAX_PAGES_IN_MEMORY)
+    if last_page is None:
+        last_page = count_pdf_pages(filepath)
+
+    page_num = first_page
+    while page_num <= last_page:
+        batch_last = min(page_num + batch_size - 1, last_page)
+        images = convert_from_path(str(filepath), dpi=dpi, first_page=page_num, last_page=batch_last)
+        if not images:
+            break
+
+        try:
+            for offset, image in enumerate(images):
+                yield page_num + offset, image
+        finally:
+            for image in images:
+                image.close()
+
+        if len(images) < batch_last - page_num + 1:
+            # Weniger Seiten geliefert als angefordert: Dokumentende erreicht
+            break
+        page_num = batch_last + 1
@@ -0,0 +1,153 @@
+"""
+Plan Retrieval
+Seitenweise Suchanfragen für lange Pläne: Zerlegung in Abschnitte, Zusammenführung der
+Trefferlisten (Deduplizierung per RRF) und diversitätsbewusste Auswahl (MMR) unter einem Token-Budget
+"""
+
+import os
+import re
+from typing import Dict, List, Set, Tuple
+
+from bm25_index import tokenize
+from hybrid_retrieval import reciprocal_rank_fusion
+from token_counter import count_tokens
+
+# Zeichen je Suchanfrage (entspricht der bisherigen Anfrage plan_text[:2000])
+PLAN_QUERY_CHARS = int(os.getenv("PLAN_QUERY_CHARS", "2000"))
+# Obergrenze der Anfragen pro Plan; bei mehr Abschnitten wird gleichmäßig über den Plan verteilt ausgewählt
+PLAN_MAX_QUERIES = int(os.getenv("PLAN_MAX_QUERIES", "16"))
+# Treffer je Anfrage vor der Zusammenführung
+PLAN_QUERY_K = int(os.getenv("PLAN_QUERY_K", "8"))
+# Token-Budget für alle ausgewählten Norm-Abschnitte zusammen
+PLAN_RETRIEVAL_TOKEN_BUDGET = int(os.getenv("PLAN_RETRIEVAL_TOKEN_BUDGET", "3000"))
+# 1.0 = nur Relevanz, 0.0 = nur Vielfalt
+PLAN_MMR_LAMBDA = float(os.getenv("PLAN_MMR_LAMBDA", "0.7"))
+
+# Abschnitte mit weniger Zeichen taugen nicht als Suchanfrage
+_MIN_QUERY_CHARS = 40
+
+# Seitenmarkierungen aus plan_text_store.render_plan_text
+_PAGE_PATTERN = re.compile(r"^--- Seite (\d+)(?: \(OCR\))? ---$", re.MULTILINE)
+
+
+def _windows(text: str, size: int) -> List[str]:
+    """Text an Absatzgrenzen in Stücke von höchstens `size` Zeichen teilen"""
+    windows, current = [], ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        while len(paragraph) > size:
+            if current:
+                windows.append(current)
+                current = ""
+            windows.append(paragraph[:size])
+            paragraph = paragraph[size:]
+        if current and len(current) + len(paragraph) + 2 > size:
+            windows.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        windows.append(current)
+    return windows
+
+
+def split_plan_pages(plan_text: str) -> List[Tuple[str, str, str]]:
+    """Seiten als (Bezeichnung, Seitenmarkierung, Text); leer, wenn der Text keine Markierungen hat"""
+    matches = list(_PAGE_PATTERN.finditer(plan_text))
+    return [
+        (f"Seite {match.group(1)}", match.group(0),
+         plan_text[match.end():matches[i + 1].start() if i + 1 < len(matches) else len(plan_text)])
+        for i, match in enumerate(matches)
+    ]
+
+
+def split_plan_queries(plan_text: str, max_queries: int = PLAN_MAX_QUERIES,
+                       query_chars: int = PLAN_QUERY_CHARS) -> List[Tuple[str, str]]:
+    """
+    Plan-Text in Suchanfragen (Bezeichnung, Text) zerlegen: je Seite laut Seitenmarkierung,
+    ohne Markierungen je Abschnitt. Lange Seiten ergeben mehrere Anfragen.
+    """
+    sections = [(label, text) for label, _, text in split_plan_pages(plan_text)] or [(None, plan_text)]
+
+    queries = []
+    for label, text in sections:
+        windows = [w for w in _windows(text, query_chars) if len(w) >= _MIN_QUERY_CHARS]
+        for i, window in enumerate(windows, 1):
+            if label is None:
+                name = f"Abschnitt {i}"
+            else:
+                name = f"{label} ({i})" if len(windows) > 1 else label
+            queries.append((name, window))
+
+    if not queries and plan_text.strip():
+        queries = [("Plan", plan_text[:query_chars])]
+
+    if len(queries) > max_queries:
+        step = len(queries) / max_queries
+        queries = [queries[int(i * step)] for i in range(max_queries)]
+    return queries
+
+
+def merge_query_results(labels: List[str], results: List[List[Dict]]) -> List[Dict]:
+    """
+    Trefferlisten aller Anfragen per RRF zusammenführen. Doppelte Chunks werden zusammengefasst;
+    "ranks" enthält den Rang je Planabschnitt, Chunks mit Treffern auf mehreren Seiten steigen auf.
+    """
+    rankings = {label: hits for label, hits in zip(labels, results) if hits}
+    total = sum(len(hits) for hits in rankings.values())
+    return reciprocal_rank_fusion(rankings, {}, k=total)
+
+
+def _similarity(a: Set[str], b: Set[str]) -> float:
+    """Jaccard-Ähnlichkeit der Token-Mengen zweier Chunks"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def select_mmr(candidates: List[Dict], token_budget: int = PLAN_RETRIEVAL_TOKEN_BUDGET,
+               mmr_lambda: float = PLAN_MMR_LAMBDA) -> Tuple[List[Dict], int]:
+    """
+    Maximal Marginal Relevance: schrittweise den Chunk mit dem besten Verhältnis aus Relevanz
+    (normierter Fusions-Score) und Neuheit gegenüber der bisherigen Auswahl wählen, solange das
+    Token-Budget reicht. Liefert Auswahl und verbrauchte Token.
+    """
+    if not candidates:
+        return [], 0
+
+    top_score = max(c["score"] for c in candidates) or 1.0
+    pool = [
+        (c, c["score"] / top_score, set(tokenize(c["content"])), count_tokens(c["content"]))
+        for c in candidates
+    ]
+
+    selected: List[Dict] = []
+    selected_terms: List[Set[str]] = []
+    used = 0
+    while pool:
+        best_index, best_value = None, None
+        for i, (_, relevance, terms, tokens) in enumerate(pool):
+            if used + tokens > token_budget:
+                continue
+            redundancy = max((_similarity(terms, other) for other in selected_terms), default=0.0)
+            value = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+            if best_value is None or value > best_value:
+                best_index, best_value = i, value
+        if best_index is None:
+            break
+
+        candidate, _, terms, tokens = pool.pop(best_index)
+        selected.append(candidate)
+        selected_terms.append(terms)
+        used += tokens
+    return selected, used
+
+
+def covered_queries(selected: List[Dict]) -> List[str]:
+    """Planabschnitte, aus deren Anfrage mindestens ein ausgewählter Chunk stammt"""
+    labels: Dict[str, None] = {}
+    for result in selected:
+        for label in result.get("ranks", {}):
+            labels[label] = None
+    return list(labels)
@@ -0,0 +1,104 @@
+"""
+Plan Text Store
+Extrahierter Plan-Text als komprimierte Sidecar-Datei je Dateiinhalt (SHA-256)
+"""
+
+import os
+import gzip
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Platzhalter, wenn weder Text noch OCR etwas liefern
+SCANNED_PLACEHOLDER = "# Gescanntes PDF - Nur visuelle Analyse verfügbar"
+
+PAGE_MARKERS = {
+    "native": "--- Seite {page} ---",
+    "ocr": "--- Seite {page} (OCR) ---"
+}
+
+
+def render_plan_text(pages: List[Dict]) -> str:
+    """Seiten im bisherigen Textformat mit Seitenmarkierungen zusammensetzen"""
+    if not pages:
+        return SCANNED_PLACEHOLDER
+
+    return "".join(
+        f"{PAGE_MARKERS[page['method']].format(page=page['page'])}\n{page['text']}\n\n"
+        for page in pages
+    )
+
+
+class PlanTextStore:
+    """Liest und schreibt Sidecar-Dateien mit dem seitenweise extrahierten Plan-Text"""
+
+    def __init__(self, base_dir: Path):
+        self.text_dir = Path(base_dir) / "texts"
+        self.text_dir.mkdir(parents=True, exist_ok=True)
+
+    def path(self, content_hash: str) -> Path:
+        return self.text_dir / f"{content_hash}.json.gz"
+
+    def exists(self, content_hash: str) -> bool:
+        return self.path(content_hash).exists()
+
+    def save(self, content_hash: str, pages: List[Dict], settings: Dict) -> Dict:
+        """Seiten samt Extraktionsmethode und Zeichen-Grenzen im Gesamttext speichern"""
+        offset = 0
+        page_entries = []
+        for page in pages:
+            length = len(render_plan_text([page]))
+            page_entries.append({
+                "page": page["page"],
+                "method": page["method"],
+                "start": offset,
+                "end": offset + length,
+                "text": page["text"]
+            })
+            offset += length
+
+        sidecar = {
+            "content_hash": content_hash,
+            "extracted_at": datetime.now().isoformat(),
+            "settings": settings,
+            "methods": sorted({page["method"] for page in pages}),
+            "pages": page_entries
+        }
+
+        path = self.path(content_hash)
+        tmp_path = path.with_suffix(".tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(sidecar, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        logger.info(f"💾 Plan-Text gespeichert: {len(pages)} Seiten ({content_hash[:12]}…)")
+        return sidecar
+
+    def load(self, content_hash: str) -> Optional[Dict]:
+        """Sidecar laden (None, wenn noch nicht extrahiert oder unlesbar)"""
+        path = self.path(content_hash)
+        if not path.exists():
+            return None
+
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"⚠️ Plan-Text-Sidecar {path.name} unlesbar: {e}")
+            return None
+
+    def load_text(self, content_hash: str) -> Optional[str]:
+        """Gesamttext aus dem Sidecar (None, wenn nicht vorhanden)"""
+        sidecar = self.load(content_hash)
+        if sidecar is None:
+            return None
+        return render_plan_text(sidecar["pages"])
+
+    def delete(self, content_hash: str):
+        path = self.path(content_hash)
+        if path.exists():
+            path.unlink()
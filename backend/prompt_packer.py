@@ -0,0 +1,145 @@
+"""
+Prompt Packer
+Stellt den Analyse-Prompt unter einem Token-Budget zusammen: Planauszug, dann Norm-Abschnitte
+nach Score, dann Feedback-Zusammenfassungen
+"""
+
+import os
+from typing import Dict, List, Tuple
+
+from plan_retrieval import split_plan_pages
+from token_counter import count_tokens, truncate_to_tokens
+
+# Budget für System- und User-Prompt zusammen (gpt-4: 8192 Kontext abzüglich max_tokens=2000 der Antwort)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+# Obergrenzen einzelner Abschnitte, damit der Planauszug nicht das ganze Budget belegt
+PROMPT_PLAN_MAX_TOKENS = int(os.getenv("PROMPT_PLAN_MAX_TOKENS", "2000"))
+PROMPT_FEEDBACK_MAX_TOKENS = int(os.getenv("PROMPT_FEEDBACK_MAX_TOKENS", "800"))
+
+# Trenner zwischen Norm-Abschnitten bzw. Planseiten
+_NORM_SEPARATOR = "\n\n"
+_PAGE_SEPARATOR = "\n\n"
+
+
+def _fit_tokens(text: str, max_tokens: int, model: str) -> str:
+    """
+    Auf höchstens `max_tokens` kürzen und nachzählen: nach dem Zusammenfügen bzw. Dekodieren
+    können Token-Grenzen anders verschmelzen, daher notfalls schrittweise weiter kürzen
+    """
+    limit = max_tokens
+    while limit > 0:
+        text = truncate_to_tokens(text, limit, model)
+        overflow = count_tokens(text, model) - max_tokens
+        if overflow <= 0:
+            return text
+        limit -= overflow
+    return ""
+
+
+def _plan_excerpt(plan_text: str, max_tokens: int, model: str) -> Tuple[str, bool]:
+    """
+    Planauszug mit höchstens `max_tokens` Token. Bei mehrseitigen Plänen erhält jede Seite
+    einen gleichen Anteil; was kurze Seiten nicht brauchen, geht an die längeren. Die Trenner
+    zwischen den Seiten werden vorab abgezogen, das Ergebnis wird nach dem Zusammenfügen nachgezählt.
+    """
+    if count_tokens(plan_text, model) <= max_tokens:
+        return plan_text, False
+
+    pages = [f"{marker}\n{text.strip()}" for _, marker, text in split_plan_pages(plan_text)]
+    if len(pages) <= 1:
+        return _fit_tokens(plan_text, max_tokens, model), True
+
+    sizes = [count_tokens(page, model) for page in pages]
+    shares = [0] * len(pages)
+    remaining = max(0, max_tokens - count_tokens(_PAGE_SEPARATOR, model) * (len(pages) - 1))
+    for position, index in enumerate(sorted(range(len(pages)), key=sizes.__getitem__)):
+        shares[index] = min(sizes[index], remaining // (len(pages) - position))
+        remaining -= shares[index]
+
+    excerpt = _PAGE_SEPARATOR.join(
+        truncate_to_tokens(page, share, model) for page, share in zip(pages, shares) if share > 0
+    )
+    return _fit_tokens(excerpt, max_tokens, model), True
+
+
+def _norm_entry(norm: Dict) -> str:
+    return f"DIN {norm['din_norm']}:\n{norm['content']}"
+
+
+def pack_analysis_prompt(template: str, system_prompt: str, plan_text: str, norms: List[Dict],
+                         feedback_context: str, budget: int = PROMPT_TOKEN_BUDGET,
+                         model: str = "gpt-4") -> Tuple[str, Dict]:
+    """
+    User-Prompt aus `template` (Platzhalter {plan}, {norms}, {feedback}) füllen, so dass System-
+    und User-Prompt zusammen `budget` Token nicht überschreiten. Liefert Prompt und Token-Aufstellung.
+    """
+    system_tokens = count_tokens(system_prompt, model)
+    template_tokens = count_tokens(template.format(plan="", norms="", feedback=""), model)
+    remaining = max(0, budget - system_tokens - template_tokens)
+
+    # 1. Planauszug
+    plan, plan_truncated = _plan_excerpt(plan_text, min(remaining, PROMPT_PLAN_MAX_TOKENS), model)
+    plan_tokens = count_tokens(plan, model)
+    remaining = max(0, remaining - plan_tokens)
+
+    # 2. Norm-Abschnitte nach Score; zu große Abschnitte werden übersprungen
+    entries = []
+    norms_tokens = 0
+    for norm in sorted(norms, key=lambda n: n.get("score", 0.0), reverse=True):
+        entry = _norm_entry(norm)
+        tokens = count_tokens(entry + _NORM_SEPARATOR, model)
+        if norms_tokens + tokens <= remaining:
+            entries.append(entry)
+            norms_tokens += tokens
+    norm_context = _NORM_SEPARATOR.join(entries)
+    remaining = max(0, remaining - norms_tokens)
+
+    # 3. Feedback zeilenweise, Zusammenfassungen stehen vorne
+    feedback_limit = min(remaining, PROMPT_FEEDBACK_MAX_TOKENS)
+    lines = []
+    feedback_tokens = 0
+    feedback_lines = feedback_context.splitlines() if feedback_context else []
+    for line in feedback_lines:
+        tokens = count_tokens(line + "\n", model)
+        if feedback_tokens + tokens > feedback_limit:
+            break
+        lines.append(line)
+        feedback_tokens += tokens
+    feedback = "\n".join(lines)
+
+    # Zusammengesetzt kann der Prompt durch verschmelzende Token-Grenzen über dem Budget liegen:
+    # dann zuerst Feedback-Zeilen, danach die schwächsten Normen, zuletzt Plan-Token abgeben
+    user_prompt = template.format(plan=plan, norms=norm_context, feedback=feedback)
+    user_tokens = count_tokens(user_prompt, model)
+    while system_tokens + user_tokens > budget:
+        if lines:
+            lines.pop()
+            feedback = "\n".join(lines)
+            feedback_tokens = count_tokens(feedback, model)
+        elif entries:
+            entries.pop()
+            norm_context = _NORM_SEPARATOR.join(entries)
+            norms_tokens = count_tokens(norm_context, model)
+        elif plan:
+            plan = _fit_tokens(plan, plan_tokens - (system_tokens + user_tokens - budget), model)
+            plan_tokens = count_tokens(plan, model)
+            plan_truncated = True
+        else:
+            break
+        user_prompt = template.format(plan=plan, norms=norm_context, feedback=feedback)
+        user_tokens = count_tokens(user_prompt, model)
+    breakdown = {
+        "budget": budget,
+        "total": system_tokens + user_tokens,
+        "system": system_tokens,
+        "template": template_tokens,
+        "plan": plan_tokens,
+        "norms": norms_tokens,
+        "feedback": feedback_tokens,
+        "plan_truncated": plan_truncated,
+        "norms_included": len(entries),
+        "norms_available": len(norms),
+        "feedback_lines_included": len(lines),
+        "feedback_lines_available": len(feedback_lines)
+    }
+    return user_prompt, breakdown
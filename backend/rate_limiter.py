@@ -0,0 +1,152 @@
+"""
+Rate Limiter
+Token-Bucket-Begrenzung der LLM-Aufrufe je Modell nach Anfragen und Token pro Minute
+(entspricht den Limits des Anbieters), statt fester Pausen zwischen den Aufrufen.
+Der Füllstand liegt in SQLite, damit API-Prozess und Job-Worker sich ein Limit teilen.
+"""
+
+import os
+import time
+import asyncio
+import sqlite3
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from usage_tracker import USAGE_DB
+
+logger = logging.getLogger(__name__)
+
+# Standardlimits je Modell für alle Prozesse zusammen; 0 = unbegrenzt
+LLM_RPM = float(os.getenv("LLM_RPM", "500"))
+LLM_TPM = float(os.getenv("LLM_TPM", "30000"))
+# Ausnahmen je Modell als "modell=rpm/tpm", z.B. "gpt-4=500/10000,gpt-4o=500/30000"
+LLM_RATE_LIMITS = os.getenv("LLM_RATE_LIMITS", "")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    model TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    level REAL NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (model, bucket)
+);
+"""
+
+
+def parse_rate_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    limits = {}
+    for item in spec.split(","):
+        model, _, value = item.partition("=")
+        if model.strip() and value.strip():
+            rpm, _, tpm = value.partition("/")
+            limits[model.strip()] = (float(rpm), float(tpm or 0))
+    return limits
+
+
+class TokenBucket:
+    """Füllt sich kontinuierlich mit `per_minute / 60` pro Sekunde bis zur Kapazität `per_minute`"""
+
+    def __init__(self, per_minute: float, level: Optional[float] = None, updated: Optional[float] = None):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute if level is None else level
+        self.updated = time.time() if updated is None else updated
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + max(0.0, now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Sekunden, bis `amount` verfügbar ist (0 = sofort)"""
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        # Einzelne Aufrufe über der Kapazität dürfen den Bucket ganz leeren
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount: float):
+        if self.capacity:
+            self.level -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """
+    Anfragen- und Token-Bucket je Modell, prozessübergreifend in einer SQLite-Zeile je Bucket
+    (Prüfen und Abbuchen in einer IMMEDIATE-Transaktion). Innerhalb eines Prozesses werden
+    Wartende eines Modells in Ankunftsreihenfolge bedient.
+    """
+
+    def __init__(self, rpm: float = LLM_RPM, tpm: float = LLM_TPM, overrides: Optional[str] = LLM_RATE_LIMITS,
+                 db_path: Path = USAGE_DB):
+        self.default = (rpm, tpm)
+        self.overrides = parse_rate_limits(overrides or "")
+        self.db_path = Path(db_path)
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._schema_ready = False
+
+    def limits(self, model: str) -> Tuple[float, float]:
+        return self.overrides.get(model, self.default)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _try_acquire(self, model: str, tokens: int) -> float:
+        """Buckets laden, auffüllen und - falls beides reicht - abbuchen; sonst Wartezeit liefern"""
+        rpm, tpm = self.limits(model)
+        conn = self._connect()
+        try:
+            if not self._schema_ready:
+                conn.executescript(SCHEMA)
+                self._schema_ready = True
+            conn.execute("BEGIN IMMEDIATE")
+            rows = {
+                row["bucket"]: row for row in conn.execute(
+                    "SELECT bucket, level, updated FROM rate_buckets WHERE model = ?", (model,)
+                )
+            }
+            buckets = {}
+            for name, per_minute in (("requests", rpm), ("tokens", tpm)):
+                row = rows.get(name)
+                # Geänderte Limits: Füllstand auf die neue Kapazität begrenzen
+                level = min(row["level"], per_minute) if row else None
+                buckets[name] = TokenBucket(per_minute, level, row["updated"] if row else None)
+
+            now = time.time()
+            delay = max(buckets["requests"].wait_time(1, now), buckets["tokens"].wait_time(tokens, now))
+            if delay <= 0:
+                buckets["requests"].take(1)
+                buckets["tokens"].take(tokens)
+            conn.executemany(
+                "INSERT INTO rate_buckets (model, bucket, level, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (model, bucket) DO UPDATE SET level = excluded.level, updated = excluded.updated",
+                [(model, name, bucket.level, bucket.updated) for name, bucket in buckets.items()]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return delay
+
+    async def acquire(self, model: str, tokens: int) -> float:
+        """Wartet, bis Anfrage und Token frei sind, und gibt die Wartezeit (s) zurück"""
+        rpm, tpm = self.limits(model)
+        if not rpm and not tpm:
+            return 0.0
+
+        started = time.monotonic()
+        lock = self._locks.setdefault(model, asyncio.Lock())
+        async with lock:
+            while True:
+                delay = await asyncio.to_thread(self._try_acquire, model, tokens)
+                if delay <= 0:
+                    break
+                # Andere Prozesse können in der Zwischenzeit abbuchen - danach neu prüfen
+                await asyncio.sleep(delay)
+        return time.monotonic() - started
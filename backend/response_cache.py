@@ -0,0 +1,168 @@
+"""
+Response Cache
+Persistenter Cache für LLM-Antworten (SQLite), Schlüssel: Modell + Hashes von System-Prompt,
+Benutzerinhalt und Bilddaten + Aufrufparameter; mit Ablaufzeit und LRU-Verdrängung nach Größe
+"""
+
+import os
+import json
+import time
+import base64
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+LLM_RESPONSE_CACHE_DB = Path(os.getenv("LLM_RESPONSE_CACHE_DB", "llm_response_cache.db"))
+LLM_RESPONSE_CACHE_MAX_MB = float(os.getenv("LLM_RESPONSE_CACHE_MAX_MB", "64"))
+# Ablaufzeit in Stunden (Normen und Prompts ändern sich selten; 0 = kein Cache)
+LLM_RESPONSE_CACHE_TTL_HOURS = float(os.getenv("LLM_RESPONSE_CACHE_TTL_HOURS", "720"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    cache_key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used);
+"""
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _image_bytes(url: str) -> bytes:
+    """Bilddaten einer data-URL dekodieren; externe URLs werden über die URL selbst gehasht"""
+    if url.startswith("data:") and "," in url:
+        try:
+            return base64.b64decode(url.split(",", 1)[1])
+        except ValueError:
+            pass
+    return url.encode("utf-8")
+
+
+def response_cache_key(model: str, messages: List[Dict], params: Dict) -> str:
+    """Schlüssel aus Modell, System-Prompt-, Inhalts- und Bild-Hashes sowie den Parametern"""
+    system, content, images = hashlib.sha256(), hashlib.sha256(), []
+    for message in messages:
+        parts = message.get("content")
+        if isinstance(parts, str):
+            parts = [{"type": "text", "text": parts}]
+        target = system if message.get("role") == "system" else content
+        for part in parts or []:
+            if part.get("type") == "image_url":
+                image = part["image_url"]
+                images.append(_sha256(_image_bytes(image["url"])))
+                content.update(f"{message.get('role')}:image:{image.get('detail', '')}\n".encode("utf-8"))
+            else:
+                target.update(f"{message.get('role')}:{part.get('text', '')}\n".encode("utf-8"))
+
+    key = {
+        "model": model,
+        "system": system.hexdigest(),
+        "content": content.hexdigest(),
+        "images": images,
+        "params": params
+    }
+    return _sha256(json.dumps(key, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+
+
+class ResponseCache:
+    """Speichert Antworten als JSON; abgelaufene und am längsten ungenutzte Einträge fallen zuerst weg"""
+
+    def __init__(self, db_path: Path = LLM_RESPONSE_CACHE_DB, max_mb: float = LLM_RESPONSE_CACHE_MAX_MB,
+                 ttl_hours: float = LLM_RESPONSE_CACHE_TTL_HOURS):
+        self.db_path = Path(db_path)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ttl_seconds = ttl_hours * 3600
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._lock = threading.Lock()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_bytes > 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        """Gespeicherte Antwort (JSON) oder None; zählt Treffer und Fehlschläge"""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT response FROM responses WHERE cache_key = ? AND created_at >= ?",
+                (key, now - self.ttl_seconds)
+            ).fetchone()
+            if row:
+                conn.execute("UPDATE responses SET last_used = ? WHERE cache_key = ?", (now, key))
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, model: str, response: str):
+        """Antwort speichern, danach Abgelaufenes löschen und bei Bedarf verdrängen"""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (cache_key, model, response, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, len(response.encode("utf-8")), now, now)
+            )
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Älteste Einträge löschen, bis die Gesamtgröße unter dem Limit liegt"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        excess = total - self.max_bytes
+        freed = 0
+        evicted = 0
+        for key, size in conn.execute("SELECT cache_key, size FROM responses ORDER BY last_used").fetchall():
+            if freed >= excess:
+                break
+            conn.execute("DELETE FROM responses WHERE cache_key = ?", (key,))
+            freed += size
+            evicted += 1
+
+        logger.info(f"🧹 Antwort-Cache: {evicted} Einträge verdrängt ({freed / 1024 / 1024:.1f} MB)")
+
+    def record_bypass(self):
+        with self._lock:
+            self.bypassed += 1
+
+    def stats(self) -> Dict:
+        """Trefferzahlen seit Prozessstart sowie Größe des Caches"""
+        with self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": entries,
+            "size_mb": round(size / 1024 / 1024, 2),
+            "max_mb": round(self.max_bytes / 1024 / 1024, 2),
+            "ttl_hours": round(self.ttl_seconds / 3600, 1)
+        }
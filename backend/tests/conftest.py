@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Backend-Module liegen direkt in backend/ (kein Paket)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
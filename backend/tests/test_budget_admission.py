@@ -0,0 +1,36 @@
+"""
+Tests für Budget-Reservierungen (Verlängerung während eines lang laufenden Aufrufs)
+"""
+
+import time
+
+import budget_admission
+from budget_admission import ADMIT, BudgetController
+from usage_tracker import UsageTracker
+
+MESSAGES = [{"role": "user", "content": "Prüfe den Plan"}]
+
+
+def test_reservation_is_renewed_while_call_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(budget_admission, "RESERVATION_TTL_SECONDS", 0.3)
+    monkeypatch.setattr(budget_admission, "RESERVATION_RENEW_SECONDS", 0.05)
+    controller = BudgetController(UsageTracker(tmp_path / "usage.db", max_budget=20.0, warn_budget=15.0))
+
+    admission = controller.admit("test", "gpt-4o", MESSAGES, max_tokens=100)
+    assert admission.decision == ADMIT
+    with admission:
+        # Länger als die TTL: ohne Verlängerung wäre die Reservierung verfallen
+        time.sleep(0.8)
+        assert controller.reserved() == admission.estimated_cost
+
+    assert controller.reserved() == 0
+
+
+def test_reservation_expires_without_running_call(tmp_path, monkeypatch):
+    monkeypatch.setattr(budget_admission, "RESERVATION_TTL_SECONDS", 0.1)
+    controller = BudgetController(UsageTracker(tmp_path / "usage.db", max_budget=20.0, warn_budget=15.0))
+
+    # Abgestürzter Aufruf: zugelassen, aber nie ausgeführt oder freigegeben
+    controller.admit("test", "gpt-4o", MESSAGES, max_tokens=100)
+    time.sleep(0.3)
+    assert controller.reserved() == 0
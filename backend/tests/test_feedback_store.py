@@ -0,0 +1,45 @@
+"""
+Tests für die einmalige Übernahme von feedback_db.json (mehrere Prozesse starten gleichzeitig)
+"""
+
+import json
+import threading
+
+from feedback_store import FeedbackStore
+
+
+def _write_legacy(path, count: int):
+    examples = [{"rating": 5, "positive_aspects": ["Treppe"], "timestamp": f"2024-01-0{i % 9 + 1}"}
+                for i in range(count)]
+    path.write_text(json.dumps({"positive_examples": examples, "negative_examples": []}), encoding="utf-8")
+
+
+def test_concurrent_stores_import_legacy_json_once(tmp_path):
+    legacy = tmp_path / "feedback_db.json"
+    _write_legacy(legacy, 7)
+    errors = []
+
+    def open_store():
+        try:
+            FeedbackStore(tmp_path / "feedback.db", legacy)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=open_store) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert FeedbackStore(tmp_path / "feedback.db", legacy).statistics()["positive"] == 7
+    assert not legacy.exists()
+    assert (tmp_path / "feedback_db.json.migrated").exists()
+
+
+def test_missing_legacy_file_counts_as_migrated(tmp_path):
+    store = FeedbackStore(tmp_path / "feedback.db", tmp_path / "feedback_db.json")
+
+    # Datei zwischen Prüfung und Übernahme von einem anderen Prozess umbenannt
+    assert store.migrate_json(tmp_path / "feedback_db.json") == 0
+    assert store.statistics()["positive"] == 0
@@ -0,0 +1,87 @@
+"""
+Tests für die Leases der Job-Queue (Neuvergabe nur bei abgelaufener Lease)
+"""
+
+import time
+
+import job_queue
+from job_queue import JobQueue, QUEUED, RUNNING, FAILED
+
+
+def _expire(queue: JobQueue, job_id: int):
+    with queue._connect() as conn:
+        conn.execute("UPDATE jobs SET lease_until = ? WHERE id = ?", (time.time() - 1, job_id))
+
+
+def test_running_job_with_valid_lease_is_not_reclaimed(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db")
+    job_id = queue.enqueue("din_check", {})
+
+    assert queue.claim("worker-a")["id"] == job_id
+    # Zweite Instanz/zweiter Worker: Job läuft noch, darf nicht doppelt starten
+    assert queue.claim("worker-b") is None
+    assert queue.get(job_id)["worker"] == "worker-a"
+
+
+def test_expired_lease_is_requeued_and_claimed_again(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db")
+    job_id = queue.enqueue("din_check", {})
+    queue.claim("worker-a")
+    _expire(queue, job_id)
+
+    job = queue.claim("worker-b")
+    assert job["id"] == job_id
+    assert job["status"] == RUNNING
+    assert job["worker"] == "worker-b"
+    assert job["attempts"] == 2
+    assert not queue.renew_lease(job_id, "worker-a")
+    assert queue.renew_lease(job_id, "worker-b")
+
+
+def test_expired_lease_without_attempts_left_fails(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db")
+    job_id = queue.enqueue("din_check", {}, max_attempts=1)
+    queue.claim("worker-a")
+    _expire(queue, job_id)
+
+    assert queue.claim("worker-b") is None
+    assert queue.get(job_id)["status"] == FAILED
+
+
+def test_expire_leases_releases_jobs_of_dead_worker(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db")
+    job_id = queue.enqueue("din_check", {})
+    queue.claim("worker-a")
+
+    assert queue.expire_leases("worker-a") == 1
+    assert queue.claim("worker-b")["id"] == job_id
+
+
+def _crash_once(ctx, marker: str):
+    """Handler für den Pool-Test: erster Versuch beendet den Prozess hart (wie ein OOM-Kill)"""
+    import os
+    from pathlib import Path
+    if not Path(marker).exists():
+        Path(marker).touch()
+        os._exit(137)
+    return {"ok": True}
+
+
+def test_pool_respawns_dead_worker_and_retries_job(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "SUPERVISE_INTERVAL", 0.2)
+    db_path = tmp_path / "jobs.db"
+    queue = JobQueue(db_path)
+    job_id = queue.enqueue("crash", {"marker": str(tmp_path / "crashed")})
+
+    pool = job_queue.WorkerPool(db_path, {"crash": "test_job_queue:_crash_once"}, workers=1)
+    pool.start()
+    try:
+        deadline = time.time() + 60
+        while time.time() < deadline and queue.get(job_id)["status"] in (QUEUED, RUNNING):
+            time.sleep(0.2)
+    finally:
+        pool.stop()
+
+    job = queue.get(job_id)
+    assert job["status"] == "done"
+    assert job["attempts"] == 2
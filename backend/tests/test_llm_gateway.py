@@ -0,0 +1,213 @@
+"""
+Tests für das LLM-Gateway gegen einen lokalen Mock-Server (OpenAI-kompatibles /v1/chat/completions)
+"""
+
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openai
+import pytest
+
+import llm_gateway
+from llm_gateway import LLMGateway, RETRY_BASE_SECONDS
+from rate_limiter import RateLimiter
+from response_cache import ResponseCache
+from usage_tracker import UsageTracker
+
+MESSAGES = [{"role": "user", "content": "Hallo"}]
+
+
+def _completion(model: str) -> bytes:
+    return json.dumps({
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": model,
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": "{\"ok\": true}"}}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110}
+    }).encode()
+
+
+class MockServer:
+    """
+    Antwortet der Reihe nach mit den Einträgen aus `script` (Status, Header, Verzögerung),
+    danach immer mit 200; zählt Anfragen und gleichzeitig offene Anfragen
+    """
+
+    def __init__(self):
+        self.script = []
+        self.requests = 0
+        self.active = 0
+        self.peak = 0
+        self.delay = 0.0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with server.lock:
+                    server.requests += 1
+                    server.active += 1
+                    server.peak = max(server.peak, server.active)
+                    status, headers, delay = server.script.pop(0) if server.script else (200, {}, server.delay)
+                try:
+                    time.sleep(delay)
+                    data = _completion(body["model"]) if status == 200 else json.dumps(
+                        {"error": {"message": f"mock {status}", "type": "mock"}}
+                    ).encode()
+                    self.send_response(status)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with server.lock:
+                        server.active -= 1
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_port}/v1"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    mock = MockServer()
+    yield mock
+    mock.close()
+
+
+@pytest.fixture
+def make_gateway(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(openai, "api_key", "sk-test")
+    gateways = []
+
+    def factory(**kwargs):
+        kwargs.setdefault("max_retries", 3)
+        gateway = LLMGateway(
+            base_url=server.base_url,
+            rate_limiter=RateLimiter(rpm=0, tpm=0, overrides="", db_path=tmp_path / "usage.db"),
+            response_cache=ResponseCache(tmp_path / "responses.db", ttl_hours=0),
+            usage_tracker=UsageTracker(tmp_path / "usage.db"),
+            **kwargs
+        )
+        gateways.append(gateway)
+        return gateway
+
+    yield factory
+    for gateway in gateways:
+        gateway.close()
+
+
+def test_rate_limit_honours_retry_after(server, make_gateway, monkeypatch):
+    jitter_calls = []
+    monkeypatch.setattr(llm_gateway.random, "uniform", lambda a, b: jitter_calls.append((a, b)) or 0.0)
+    server.script = [(429, {"retry-after": "0.3"}, 0.0)]
+    gateway = make_gateway()
+
+    started = time.perf_counter()
+    response = gateway.chat_sync("test", "gpt-4", MESSAGES, max_tokens=5)
+
+    assert response.choices[0].message.content == "{\"ok\": true}"
+    assert time.perf_counter() - started >= 0.3
+    assert server.requests == 2
+    # Retry-After hat Vorrang vor dem Jitter
+    assert jitter_calls == []
+
+
+def test_server_errors_retry_with_full_jitter(server, make_gateway, monkeypatch):
+    jitter_calls = []
+    monkeypatch.setattr(llm_gateway.random, "uniform", lambda a, b: jitter_calls.append((a, b)) or 0.0)
+    server.script = [(503, {}, 0.0), (500, {}, 0.0), (502, {}, 0.0)]
+    gateway = make_gateway()
+
+    gateway.chat_sync("test", "gpt-4", MESSAGES, max_tokens=5)
+
+    assert server.requests == 4
+    assert jitter_calls == [(0, RETRY_BASE_SECONDS * 2 ** attempt) for attempt in range(3)]
+
+
+def test_retries_exhausted_raise_and_count_error(server, make_gateway, monkeypatch):
+    monkeypatch.setattr(llm_gateway.random, "uniform", lambda a, b: 0.0)
+    server.script = [(503, {}, 0.0)] * 3
+    gateway = make_gateway(max_retries=2)
+
+    with pytest.raises(openai.InternalServerError):
+        gateway.chat_sync("test", "gpt-4", MESSAGES, max_tokens=5)
+
+    metrics = gateway.metrics()["models"]["gpt-4"]
+    assert metrics["retries"] == 2
+    assert metrics["errors"] == 1
+
+
+def test_client_errors_are_not_retried(server, make_gateway):
+    server.script = [(400, {}, 0.0)]
+    gateway = make_gateway()
+
+    with pytest.raises(openai.BadRequestError):
+        gateway.chat_sync("test", "gpt-4", MESSAGES, max_tokens=5)
+    assert server.requests == 1
+
+
+def test_per_call_timeout(server, make_gateway):
+    server.delay = 2.0
+    gateway = make_gateway(max_retries=0)
+
+    started = time.perf_counter()
+    with pytest.raises(openai.APITimeoutError):
+        gateway.chat_sync("test", "gpt-4", MESSAGES, timeout=0.3, max_tokens=5)
+
+    assert time.perf_counter() - started < 1.5
+    assert gateway.metrics()["models"]["gpt-4"]["errors"] == 1
+
+
+def test_per_model_concurrency_cap(server, make_gateway):
+    server.delay = 0.2
+    gateway = make_gateway(default_concurrency=4, concurrency="gpt-4=2")
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        list(executor.map(lambda _: gateway.chat_sync("test", "gpt-4", MESSAGES, max_tokens=5), range(6)))
+    assert server.peak == 2
+
+    server.peak = 0
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        list(executor.map(lambda _: gateway.chat_sync("test", "gpt-4o", MESSAGES, max_tokens=5), range(6)))
+    assert server.peak == 4
+
+
+def test_metrics_counters(server, make_gateway, monkeypatch):
+    monkeypatch.setattr(llm_gateway.random, "uniform", lambda a, b: 0.0)
+    server.script = [(429, {}, 0.0)]
+    gateway = make_gateway()
+
+    for _ in range(3):
+        gateway.chat_sync("test", "gpt-4", MESSAGES, max_tokens=5)
+
+    metrics = gateway.metrics()
+    assert metrics["base_url"] == server.base_url
+    model = metrics["models"]["gpt-4"]
+    assert model["requests"] == 3
+    assert model["retries"] == 1
+    assert model["errors"] == 0
+    assert model["prompt_tokens"] == 300
+    assert model["completion_tokens"] == 30
+    assert model["latency_p50"] is not None and model["latency_max"] >= model["latency_p50"]
+    assert gateway.usage_tracker.status()["requests"] == 3
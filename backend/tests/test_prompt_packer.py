@@ -0,0 +1,40 @@
+"""
+Tests für den Prompt Packer (Token-Budget wird auch bei vielen Planseiten eingehalten)
+"""
+
+from prompt_packer import PROMPT_PLAN_MAX_TOKENS, pack_analysis_prompt
+from token_counter import count_tokens
+
+TEMPLATE = "BAUPLAN:\n{plan}\n\nNORMEN:\n{norms}\n\n{feedback}\nNur JSON."
+
+
+def _plan(pages: int) -> str:
+    return "\n".join(
+        f"--- Seite {page} ---\nRaum {page}: Wandstärke 24 cm, Türbreite 0,90 m, Fluchtweg {page * 3} m. " * 12
+        for page in range(1, pages + 1)
+    )
+
+
+def _norms(count: int):
+    return [{"din_norm": f"DIN 18040-{i}", "content": "Bewegungsfläche 150 x 150 cm. " * 40, "score": 1.0 / (i + 1)}
+            for i in range(count)]
+
+
+def test_plan_excerpt_respects_cap_for_many_pages():
+    plan_text = _plan(200)
+    user_prompt, breakdown = pack_analysis_prompt(TEMPLATE, "System", plan_text, [], "")
+
+    assert breakdown["plan_truncated"]
+    assert breakdown["plan"] <= PROMPT_PLAN_MAX_TOKENS
+    assert "--- Seite 200 ---" in user_prompt
+
+
+def test_total_never_exceeds_budget():
+    feedback = "\n".join(f"- Häufiger Fehler {i}: fehlende Bemaßung" for i in range(200))
+    for pages, system_words, budget in ((200, 1000, 6000), (50, 1400, 6000), (3, 100, 1500), (120, 1480, 6000)):
+        system_prompt = "Prüfe nach DIN. " * system_words
+        user_prompt, breakdown = pack_analysis_prompt(
+            TEMPLATE, system_prompt, _plan(pages), _norms(30), feedback, budget=budget
+        )
+        assert breakdown["total"] <= budget
+        assert count_tokens(system_prompt) + count_tokens(user_prompt) == breakdown["total"]
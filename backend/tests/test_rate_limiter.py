@@ -0,0 +1,45 @@
+"""
+Tests für den prozessübergreifenden Rate-Limiter (gemeinsame Buckets in SQLite)
+"""
+
+import asyncio
+
+from rate_limiter import RateLimiter
+
+
+def test_limiters_on_same_db_share_one_bucket(tmp_path):
+    # Zwei Instanzen stehen für API-Prozess und Job-Worker
+    api = RateLimiter(rpm=120, tpm=0, overrides="", db_path=tmp_path / "usage.db")
+    worker = RateLimiter(rpm=120, tpm=0, overrides="", db_path=tmp_path / "usage.db")
+
+    async def run():
+        for limiter in (api, worker) * 60:
+            await limiter.acquire("gpt-4", 100)
+        # Kapazität (120) gemeinsam verbraucht: die nächste Anfrage wartet ~0,5 s
+        return await worker.acquire("gpt-4", 100)
+
+    waited = asyncio.run(run())
+    assert 0.3 < waited < 2.0
+
+
+def test_token_bucket_limits_across_instances(tmp_path):
+    first = RateLimiter(rpm=0, tpm=600, overrides="", db_path=tmp_path / "usage.db")
+    second = RateLimiter(rpm=0, tpm=600, overrides="", db_path=tmp_path / "usage.db")
+
+    async def run():
+        assert await first.acquire("gpt-4o", 600) < 0.1
+        # 600 Token/min = 10 Token/s: 5 Token erfordern ~0,5 s, auch in der anderen Instanz
+        return await second.acquire("gpt-4o", 5)
+
+    waited = asyncio.run(run())
+    assert 0.3 < waited < 2.0
+
+
+def test_other_models_are_not_throttled(tmp_path):
+    limiter = RateLimiter(rpm=1, tpm=0, overrides="gpt-4o-mini=0/0", db_path=tmp_path / "usage.db")
+
+    async def run():
+        await limiter.acquire("gpt-4", 10)
+        return await limiter.acquire("gpt-4o-mini", 10)
+
+    assert asyncio.run(run()) == 0.0
@@ -0,0 +1,38 @@
+"""
+Tests für die Bildkodierung der Vision-Eingaben (Zwischenbilder werden geschlossen)
+"""
+
+import os
+
+from PIL import Image
+
+from vision_input import encode_image
+
+
+def test_intermediate_images_are_closed(monkeypatch):
+    created, closed = [], []
+    original_convert, original_resize, original_close = Image.Image.convert, Image.Image.resize, Image.Image.close
+
+    def convert(self, *args, **kwargs):
+        created.append(original_convert(self, *args, **kwargs))
+        return created[-1]
+
+    def resize(self, *args, **kwargs):
+        created.append(original_resize(self, *args, **kwargs))
+        return created[-1]
+
+    def close(self):
+        closed.append(self)
+        original_close(self)
+
+    monkeypatch.setattr(Image.Image, "convert", convert)
+    monkeypatch.setattr(Image.Image, "resize", resize)
+    monkeypatch.setattr(Image.Image, "close", close)
+
+    # Rauschen im Modus L: zu groß für PNG und JPEG, erzwingt RGB-Kopien und Verkleinerung
+    source = Image.frombytes("L", (1200, 1200), os.urandom(1200 * 1200))
+    encoded = encode_image(source, max_bytes=200 * 1024)
+
+    assert encoded["width"] < 1200
+    assert created and all(any(image is done for done in closed) for image in created)
+    assert not any(image is source for image in closed)
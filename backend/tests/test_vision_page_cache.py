@@ -0,0 +1,33 @@
+"""
+Tests für den Seiten-Hash des Vision-Caches (streifenweise statt tobytes() der ganzen Seite)
+"""
+
+import hashlib
+
+from PIL import Image
+
+from vision_page_cache import page_image_hash
+
+
+def _full_hash(image) -> str:
+    digest = hashlib.sha256(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode("utf-8"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def test_strip_hash_matches_full_bitmap_hash():
+    image = Image.new("RGB", (640, 905), "white")
+    image.putpixel((17, 900), (1, 2, 3))
+
+    # Bestehende Cache-Einträge bleiben gültig, unabhängig von der Streifengröße
+    assert page_image_hash(image) == _full_hash(image)
+    assert page_image_hash(image, strip_bytes=1000) == _full_hash(image)
+
+
+def test_hash_changes_with_pixels_and_size():
+    image = Image.new("L", (300, 200), 255)
+    changed = image.copy()
+    changed.putpixel((299, 199), 0)
+
+    assert page_image_hash(image) != page_image_hash(changed)
+    assert page_image_hash(image) != page_image_hash(Image.new("L", (200, 300), 255))
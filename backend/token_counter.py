@@ -0,0 +1,55 @@
+"""
+Token Counter
+Lokale Token-Zählung mit tiktoken (ohne tiktoken: Schätzung über die Zeichenanzahl)
+"""
+
+import logging
+from functools import lru_cache
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+    logging.warning("⚠️ tiktoken nicht verfügbar. Token werden geschätzt.")
+
+logger = logging.getLogger(__name__)
+
+# Faustregel für deutsche/englische Texte ohne Tokenizer
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=16)
+def _get_encoding(model: str):
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # z.B. Encoding-Datei offline nicht ladbar
+        logger.warning(f"⚠️ tiktoken-Encoding für {model} nicht ladbar, Token werden geschätzt: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4") -> int:
+    """Anzahl der Token eines Textes für das angegebene Modell"""
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "gpt-4") -> str:
+    """Text auf höchstens `max_tokens` Token kürzen"""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    return text if count_tokens(text, model) <= max_tokens else text[:max_tokens * CHARS_PER_TOKEN]
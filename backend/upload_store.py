@@ -0,0 +1,191 @@
+"""
+Upload Store
+Inhaltsadressierte Ablage hochgeladener Pläne (SHA-256) mit Wiederverwendung von Analysen
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class UploadStore:
+    """Speichert jede PDF genau einmal unter ihrem SHA-256 und verlinkt Plan-Dateien darauf"""
+
+    def __init__(self, upload_dir: Path):
+        self.upload_dir = Path(upload_dir)
+        self.blob_dir = self.upload_dir / "blobs"
+        self.index_path = self.blob_dir / "index.json"
+        self._lock = threading.Lock()
+
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def content_hash(content: bytes) -> str:
+        """SHA-256 der Dateibytes"""
+        return hashlib.sha256(content).hexdigest()
+
+    @staticmethod
+    def file_hash(filepath: Path) -> str:
+        """SHA-256 einer Datei, blockweise gelesen"""
+        digest = hashlib.sha256()
+        with open(filepath, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def blob_path(self, content_hash: str) -> Path:
+        """Ablageort eines Blobs"""
+        return self.blob_dir / content_hash[:2] / f"{content_hash}.pdf"
+
+    def save(self, content: bytes, filepath: Path) -> Tuple[str, bool]:
+        """
+        Inhalt als Blob ablegen (falls neu) und unter `filepath` verlinken.
+
+        Gibt (content_hash, is_new) zurück.
+        """
+        content_hash = self.content_hash(content)
+        blob = self.blob_path(content_hash)
+        is_new = not blob.exists()
+
+        if is_new:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = blob.with_suffix(".tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, blob)
+            logger.info(f"💾 Neuer Blob gespeichert: {content_hash[:12]}…")
+        else:
+            logger.info(f"♻️ Identische Datei bereits vorhanden: {content_hash[:12]}…")
+
+        self._link(blob, Path(filepath))
+        return content_hash, is_new
+
+    def _link(self, blob: Path, filepath: Path):
+        """Plan-Datei als Hardlink auf den Blob anlegen (Fallback: Kopie)"""
+        if filepath.exists():
+            if os.path.samefile(blob, filepath):
+                return
+            filepath.unlink()
+        try:
+            os.link(blob, filepath)
+        except OSError:
+            shutil.copyfile(blob, filepath)
+
+    def register_plan(self, content_hash: str, plan_id: str, size: int):
+        """Plan-ID dem Blob zuordnen"""
+        with self._lock:
+            index = self._load_index()
+            entry = index.setdefault(content_hash, {
+                "size": size,
+                "created": datetime.now().isoformat(),
+                "plans": []
+            })
+            if plan_id not in entry["plans"]:
+                entry["plans"].append(plan_id)
+            self._save_index(index)
+
+    def plans_for(self, content_hash: str) -> List[str]:
+        """Alle Plan-IDs mit diesem Inhalt (älteste zuerst)"""
+        with self._lock:
+            return list(self._load_index().get(content_hash, {}).get("plans", []))
+
+    def release(self, content_hash: str, plan_id: str, filepath: Optional[Path] = None) -> bool:
+        """
+        Plan-Zuordnung lösen und den Blob entfernen, wenn ihn kein Plan mehr nutzt.
+
+        Gibt True zurück, wenn der Blob gelöscht wurde.
+        """
+        if filepath is not None and Path(filepath).exists():
+            Path(filepath).unlink()
+
+        with self._lock:
+            index = self._load_index()
+            entry = index.get(content_hash)
+            if entry is None:
+                return False
+
+            if plan_id in entry["plans"]:
+                entry["plans"].remove(plan_id)
+
+            removed = not entry["plans"]
+            if removed:
+                del index[content_hash]
+                blob = self.blob_path(content_hash)
+                if blob.exists():
+                    blob.unlink()
+                logger.info(f"🗑️ Blob entfernt: {content_hash[:12]}…")
+
+            self._save_index(index)
+            return removed
+
+    def discard(self, content_hash: str) -> bool:
+        """
+        Blob eines fehlgeschlagenen Uploads löschen, der noch keinem Plan zugeordnet ist.
+
+        Gibt True zurück, wenn der Blob gelöscht wurde.
+        """
+        with self._lock:
+            if self._load_index().get(content_hash, {}).get("plans"):
+                return False
+            blob = self.blob_path(content_hash)
+            if not blob.exists():
+                return False
+            blob.unlink()
+            logger.info(f"🗑️ Blob eines fehlgeschlagenen Uploads entfernt: {content_hash[:12]}…")
+            return True
+
+    def index_existing(self, plans: Iterable[Tuple[str, Path]]) -> int:
+        """
+        Bereits vorhandene Uploads einmalig übernehmen (Migration).
+
+        `plans` liefert (plan_id, Pfad der Plan-Datei); identische Dateien werden dabei
+        durch Hardlinks auf einen gemeinsamen Blob ersetzt.
+        """
+        if self.index_path.exists():
+            return 0
+
+        count = 0
+        for plan_id, filepath in plans:
+            try:
+                if not filepath.exists():
+                    continue
+                content_hash = self.file_hash(filepath)
+                blob = self.blob_path(content_hash)
+                if not blob.exists():
+                    blob.parent.mkdir(parents=True, exist_ok=True)
+                    try:
+                        os.link(filepath, blob)
+                    except OSError:
+                        shutil.copyfile(filepath, blob)
+                else:
+                    self._link(blob, filepath)
+                self.register_plan(content_hash, plan_id, filepath.stat().st_size)
+                count += 1
+            except Exception as e:
+                logger.warning(f"⚠️ Upload {filepath} konnte nicht indiziert werden: {e}")
+
+        if not self.index_path.exists():
+            self._save_index({})
+
+        logger.info(f"📇 {count} vorhandene Uploads in den Blob-Store übernommen")
+        return count
+
+    def _load_index(self) -> Dict:
+        if not self.index_path.exists():
+            return {}
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_index(self, index: Dict):
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.index_path)
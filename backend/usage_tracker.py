@@ -0,0 +1,239 @@
+"""
+Usage Tracker
+Token- und Kostenerfassung aller OpenAI-Aufrufe (Chat, Vision, Embeddings) in SQLite:
+jeder Aufruf ist ein INSERT plus Fortschreiben der Tages- und Monatssummen, so dass
+Budget-Abfragen nie das Protokoll durchsuchen müssen
+"""
+
+import os
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+USAGE_DB = Path(os.getenv("USAGE_DB", "usage.db"))
+MAX_MONTHLY_BUDGET = float(os.getenv("MAX_MONTHLY_BUDGET", "20.0"))
+WARN_AT_BUDGET = float(os.getenv("WARN_AT_BUDGET", "15.0"))
+
+# USD je 1000 Token (Eingabe, Ausgabe); Zuordnung über das längste passende Präfix,
+# so dass datierte Modellnamen wie "gpt-4o-2024-08-06" ihren Basispreis finden
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-32k": (0.06, 0.12),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4-vision-preview": (0.01, 0.03),
+    "gpt-4-1106-vision-preview": (0.01, 0.03),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "text-embedding-ada-002": (0.0001, 0.0),
+    "text-embedding-3-small": (0.00002, 0.0),
+    "text-embedding-3-large": (0.00013, 0.0)
+}
+# Unbekannte Modelle werden vorsichtshalber wie gpt-4 abgerechnet
+DEFAULT_PRICE = MODEL_PRICES["gpt-4"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    cost REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS usage_daily (
+    day TEXT NOT NULL,
+    model TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    cost REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, model)
+);
+CREATE TABLE IF NOT EXISTS usage_monthly (
+    month TEXT PRIMARY KEY,
+    requests INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    cost REAL NOT NULL DEFAULT 0
+);
+"""
+
+_UPSERT_DAILY = """
+INSERT INTO usage_daily (day, model, requests, prompt_tokens, completion_tokens, cost) VALUES (?, ?, 1, ?, ?, ?)
+ON CONFLICT (day, model) DO UPDATE SET requests = requests + 1,
+    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+    completion_tokens = completion_tokens + excluded.completion_tokens,
+    cost = cost + excluded.cost
+"""
+
+_UPSERT_MONTHLY = """
+INSERT INTO usage_monthly (month, requests, prompt_tokens, completion_tokens, cost) VALUES (?, 1, ?, ?, ?)
+ON CONFLICT (month) DO UPDATE SET requests = requests + 1,
+    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+    completion_tokens = completion_tokens + excluded.completion_tokens,
+    cost = cost + excluded.cost
+"""
+
+
+def model_price(model: str) -> Tuple[float, float]:
+    """Preis (Eingabe, Ausgabe) je 1000 Token für ein Modell"""
+    matches = [name for name in MODEL_PRICES if model == name or model.startswith(name + "-")]
+    return MODEL_PRICES[max(matches, key=len)] if matches else DEFAULT_PRICE
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int = 0) -> float:
+    input_price, output_price = model_price(model)
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1000
+
+
+class UsageTracker:
+    """Protokoll und laufende Summen; jeder Prozess verwendet eigene Verbindungen"""
+
+    def __init__(self, db_path: Path = USAGE_DB, max_budget: float = MAX_MONTHLY_BUDGET,
+                 warn_budget: float = WARN_AT_BUDGET):
+        self.db_path = Path(db_path)
+        self.max_budget = max_budget
+        self.warn_budget = warn_budget
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def record(self, endpoint: str, model: str, prompt_tokens: int, completion_tokens: int = 0,
+               kind: str = "chat") -> float:
+        """Einen Aufruf verbuchen und seine geschätzten Kosten (USD) zurückgeben"""
+        now = datetime.now()
+        cost = estimate_cost(model, prompt_tokens, completion_tokens)
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO usage_log (timestamp, endpoint, kind, model, prompt_tokens, completion_tokens, cost) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (now.isoformat(), endpoint, kind, model, prompt_tokens, completion_tokens, cost)
+            )
+            conn.execute(_UPSERT_DAILY, (now.strftime("%Y-%m-%d"), model, prompt_tokens, completion_tokens, cost))
+            conn.execute(_UPSERT_MONTHLY, (now.strftime("%Y-%m"), prompt_tokens, completion_tokens, cost))
+            monthly_cost = conn.execute(
+                "SELECT cost FROM usage_monthly WHERE month = ?", (now.strftime("%Y-%m"),)
+            ).fetchone()["cost"]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        self._check_budget(monthly_cost)
+        return cost
+
+    def record_response(self, endpoint: str, response, model: str, kind: str = "chat") -> Optional[float]:
+        """Token-Angaben (response.usage) einer Chat-/Vision-Antwort verbuchen"""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return None
+        try:
+            return self.record(endpoint, getattr(response, "model", None) or model,
+                               usage.prompt_tokens or 0, usage.completion_tokens or 0, kind)
+        except Exception as e:
+            logger.warning(f"⚠️ Usage-Logging fehlgeschlagen: {e}")
+            return None
+
+    def _check_budget(self, monthly_cost: float):
+        if monthly_cost >= self.max_budget:
+            logger.error(f"🚨 BUDGET ÜBERSCHRITTEN: ${monthly_cost:.2f} / ${self.max_budget:.2f}")
+        elif monthly_cost >= self.warn_budget:
+            logger.warning(f"⚠️ Budget-Warnung: ${monthly_cost:.2f} / ${self.max_budget:.2f}")
+
+    def monthly_cost(self, month: Optional[str] = None) -> float:
+        month = month or datetime.now().strftime("%Y-%m")
+        with self._connect() as conn:
+            row = conn.execute("SELECT cost FROM usage_monthly WHERE month = ?", (month,)).fetchone()
+        return row["cost"] if row else 0.0
+
+    def status(self) -> Dict:
+        """Budget-Status aus den Summen des laufenden Monats und Tages"""
+        now = datetime.now()
+        month, day = now.strftime("%Y-%m"), now.strftime("%Y-%m-%d")
+        with self._connect() as conn:
+            monthly = conn.execute("SELECT * FROM usage_monthly WHERE month = ?", (month,)).fetchone()
+            daily = conn.execute(
+                "SELECT COALESCE(SUM(requests), 0) AS requests, COALESCE(SUM(cost), 0) AS cost "
+                "FROM usage_daily WHERE day = ?", (day,)
+            ).fetchone()
+            by_model = conn.execute(
+                "SELECT model, SUM(requests) AS requests, SUM(prompt_tokens) AS prompt_tokens, "
+                "SUM(completion_tokens) AS completion_tokens, SUM(cost) AS cost "
+                "FROM usage_daily WHERE day BETWEEN ? AND ? GROUP BY model ORDER BY cost DESC",
+                (f"{month}-01", f"{month}-31")
+            ).fetchall()
+
+        monthly_cost = monthly["cost"] if monthly else 0.0
+        return {
+            "month": month,
+            "monthly_cost": round(monthly_cost, 2),
+            "max_budget": self.max_budget,
+            "remaining": round(self.max_budget - monthly_cost, 2),
+            "usage_percent": round((monthly_cost / self.max_budget) * 100, 1) if self.max_budget else 0.0,
+            "requests": monthly["requests"] if monthly else 0,
+            "prompt_tokens": monthly["prompt_tokens"] if monthly else 0,
+            "completion_tokens": monthly["completion_tokens"] if monthly else 0,
+            "today": {"requests": daily["requests"], "cost": round(daily["cost"], 4)},
+            "by_model": [dict(row, cost=round(row["cost"], 4)) for row in by_model]
+        }
+
+
+class UsageTrackingEmbeddings:
+    """Embeddings-Wrapper, der die lokal gezählten Token jedes Embedding-Requests verbucht"""
+
+    def __init__(self, underlying, tracker: UsageTracker, endpoint: str = "embeddings"):
+        self.underlying = underlying
+        self.tracker = tracker
+        self.endpoint = endpoint
+        # Gleicher Modellname wie das Original, damit Cache-Schlüssel unverändert bleiben
+        self.model = getattr(underlying, "model", type(underlying).__name__)
+
+    def _record(self, texts: List[str]):
+        try:
+            tokens = sum(count_tokens(text, self.model) for text in texts)
+            self.tracker.record(self.endpoint, self.model, tokens, kind="embedding")
+        except Exception as e:
+            logger.warning(f"⚠️ Usage-Logging fehlgeschlagen: {e}")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.underlying.embed_documents(texts)
+        self._record(texts)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.underlying.embed_query(text)
+        self._record([text])
+        return vector
+
+
+_tracker: Optional[UsageTracker] = None
+_tracker_lock = threading.Lock()
+
+
+def get_usage_tracker() -> UsageTracker:
+    """Ein Tracker je Prozess (Schema wird nur einmal angelegt)"""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = UsageTracker()
+        return _tracker
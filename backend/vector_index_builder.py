@@ -0,0 +1,139 @@
+"""
+Vector Index Builder
+Embeddet Chunks in nach Token-Anzahl bemessenen, parallelen Batches und baut den FAISS-Index in einem Durchgang
+"""
+
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+import numpy as np
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# OpenAI erlaubt bis zu 300k Token bzw. 2048 Eingaben pro Embedding-Request
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "100000"))
+EMBED_BATCH_MAX_INPUTS = 2048
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+
+
+class VectorIndexBuilder:
+    """Erzeugt Embeddings für viele Dokumente und legt sie in einer float32-Matrix ab"""
+
+    def __init__(self, embeddings, max_batch_tokens: int = EMBED_BATCH_TOKENS,
+                 concurrency: int = EMBED_CONCURRENCY):
+        self.embeddings = embeddings
+        self.max_batch_tokens = max_batch_tokens
+        self.concurrency = max(1, concurrency)
+        self.last_stats: Dict = {}
+
+    def _plan_batches(self, token_counts: List[int]) -> List[List[int]]:
+        """Indizes der Texte zu Batches bis `max_batch_tokens` Token zusammenfassen"""
+        batches = []
+        current = []
+        current_tokens = 0
+
+        for i, tokens in enumerate(token_counts):
+            if current and (current_tokens + tokens > self.max_batch_tokens
+                            or len(current) >= EMBED_BATCH_MAX_INPUTS):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(i)
+            current_tokens += tokens
+
+        if current:
+            batches.append(current)
+        return batches
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Alle Texte embedden; Ergebnis in Eingabereihenfolge als (n, dim)-Matrix"""
+        start = time.perf_counter()
+        model = getattr(self.embeddings, "model", "text-embedding-ada-002")
+        token_counts = [count_tokens(text, model) for text in texts]
+        total_tokens = sum(token_counts)
+        batches = self._plan_batches(token_counts)
+        matrix: Optional[np.ndarray] = None
+
+        logger.info(
+            f"📦 Embedde {len(texts)} Chunks in {len(batches)} Batches "
+            f"(≤{self.max_batch_tokens} Token, {self.concurrency} parallel)"
+        )
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {
+                executor.submit(self.embeddings.embed_documents, [texts[i] for i in batch]): batch
+                for batch in batches
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                batch = futures[future]
+                vectors = np.asarray(future.result(), dtype=np.float32)
+
+                # Matrix einmalig anlegen, sobald die Dimension bekannt ist
+                if matrix is None:
+                    matrix = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+                matrix[batch] = vectors
+
+                logger.info(f"🔄 Batch {done}/{len(batches)} fertig ({len(batch)} Chunks)")
+
+        elapsed = time.perf_counter() - start
+        self.last_stats = {
+            "chunks": len(texts),
+            "tokens": total_tokens,
+            "batches": len(batches),
+            "embed_seconds": round(elapsed, 2),
+            "chunks_per_second": round(len(texts) / elapsed, 1) if elapsed > 0 else None,
+            "tokens_per_second": round(total_tokens / elapsed, 1) if elapsed > 0 else None
+        }
+        logger.info(
+            f"⚡ Embedding-Durchsatz: {self.last_stats['chunks_per_second']} Chunks/s, "
+            f"{self.last_stats['tokens_per_second']} Token/s ({elapsed:.1f}s)"
+        )
+
+        if matrix is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return matrix
+
+    def build(self, documents: List, ids: List[str]) -> FAISS:
+        """Neuen FAISS-Store aus allen Dokumenten in einem Durchgang aufbauen"""
+        start = time.perf_counter()
+        matrix = self.embed([doc.page_content for doc in documents])
+
+        index = faiss.IndexFlatL2(matrix.shape[1])
+        index.add(matrix)
+
+        vectorstore = FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=InMemoryDocstore(dict(zip(ids, documents))),
+            index_to_docstore_id=dict(enumerate(ids))
+        )
+
+        self._finish_stats(start)
+        return vectorstore
+
+    def add(self, vectorstore: FAISS, documents: List, ids: List[str]):
+        """Dokumente zu einem bestehenden FAISS-Store hinzufügen (ein Embedding-Durchgang)"""
+        start = time.perf_counter()
+        texts = [doc.page_content for doc in documents]
+        matrix = self.embed(texts)
+
+        vectorstore.add_embeddings(
+            text_embeddings=list(zip(texts, matrix)),
+            metadatas=[doc.metadata for doc in documents],
+            ids=ids
+        )
+
+        self._finish_stats(start)
+
+    def _finish_stats(self, start: float):
+        total = time.perf_counter() - start
+        self.last_stats["build_seconds"] = round(total, 2)
+        logger.info(f"⏱️ Index-Aufbau: {total:.1f}s gesamt für {self.last_stats['chunks']} Chunks")
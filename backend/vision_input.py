@@ -0,0 +1,113 @@
+"""
+Vision Input Builder
+Rendert nur die benötigten PDF-Seiten und kodiert sie größenbegrenzt im Speicher
+"""
+
+import io
+import os
+import base64
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from pdf_rasterizer import render_page
+
+logger = logging.getLogger(__name__)
+
+# Obergrenze für ein kodiertes Bild (Rohbytes, vor Base64)
+VISION_MAX_IMAGE_BYTES = int(os.getenv("VISION_MAX_IMAGE_BYTES", str(3 * 1024 * 1024)))
+
+JPEG_QUALITIES = [85, 70, 55, 40]
+DOWNSCALE_FACTOR = 0.75
+MIN_IMAGE_SIDE = 512
+
+
+def encode_image(image, max_bytes: int = VISION_MAX_IMAGE_BYTES) -> Dict:
+    """
+    Bild im Speicher kodieren, sodass es höchstens `max_bytes` groß ist.
+
+    Zuerst PNG (verlustfrei, bei Strichzeichnungen meist klein genug), danach JPEG mit
+    sinkender Qualität und zuletzt schrittweise verkleinert.
+    """
+    current = image
+    try:
+        while True:
+            buffer = io.BytesIO()
+            current.save(buffer, format='PNG', optimize=True)
+            if buffer.tell() <= max_bytes:
+                return _encoded(buffer, 'png', current)
+
+            rgb = current if current.mode == 'RGB' else current.convert('RGB')
+            try:
+                for quality in JPEG_QUALITIES:
+                    buffer = io.BytesIO()
+                    rgb.save(buffer, format='JPEG', quality=quality, optimize=True)
+                    if buffer.tell() <= max_bytes:
+                        return _encoded(buffer, 'jpeg', current, quality)
+            finally:
+                if rgb is not current:
+                    rgb.close()
+
+            width, height = current.size
+            if min(width, height) * DOWNSCALE_FACTOR < MIN_IMAGE_SIDE:
+                logger.warning(f"⚠️ Bild bleibt über {max_bytes} Bytes ({buffer.tell()} Bytes)")
+                return _encoded(buffer, 'jpeg', current, JPEG_QUALITIES[-1])
+
+            resized = current.resize((int(width * DOWNSCALE_FACTOR), int(height * DOWNSCALE_FACTOR)))
+            if current is not image:
+                current.close()
+            current = resized
+    finally:
+        if current is not image:
+            current.close()
+
+
+def _encoded(buffer: io.BytesIO, fmt: str, image, quality: Optional[int] = None) -> Dict:
+    """Kodiertes Bild als Data-URL samt Kennzahlen beschreiben"""
+    data = buffer.getvalue()
+    return {
+        "data_url": f"data:image/{fmt};base64,{base64.b64encode(data).decode('utf-8')}",
+        "format": fmt,
+        "quality": quality,
+        "bytes": len(data),
+        "width": image.size[0],
+        "height": image.size[1]
+    }
+
+
+def build_vision_inputs(filepath: Path, pages: Iterable[int] = (1,), dpi: int = 150,
+                        max_bytes: int = VISION_MAX_IMAGE_BYTES) -> List[Dict]:
+    """Genau die angegebenen Seiten rendern und als Vision-Eingaben kodieren"""
+    inputs = []
+
+    for page_num in pages:
+        image = render_page(filepath, page_num, dpi=dpi)
+        if image is None:
+            logger.warning(f"⚠️ Seite {page_num} nicht vorhanden in {Path(filepath).name}")
+            continue
+
+        try:
+            encoded = encode_image(image, max_bytes=max_bytes)
+        finally:
+            image.close()
+
+        encoded["page"] = page_num
+        inputs.append(encoded)
+        logger.info(
+            f"🖼️ Seite {page_num} kodiert: {encoded['format'].upper()}, "
+            f"{encoded['width']}x{encoded['height']}, {encoded['bytes'] / 1024:.0f} KB"
+        )
+
+    return inputs
+
+
+def describe_vision_inputs(inputs: List[Dict]) -> Dict:
+    """Zusammenfassung der gesendeten Bilder (ohne Bilddaten) für Analyse-Ergebnisse"""
+    return {
+        "pages": [item["page"] for item in inputs],
+        "bytes": sum(item["bytes"] for item in inputs),
+        "images": [
+            {key: item[key] for key in ("page", "format", "quality", "bytes", "width", "height")}
+            for item in inputs
+        ]
+    }
@@ -0,0 +1,107 @@
+"""
+Vision Page Cache
+Persistente Bildbeschreibungen von Normseiten (SQLite), Schlüssel: Inhalts-Hash der gerenderten
+Seite + Version des Vision-Prompts; beim Neuaufbau werden nur unbekannte Seiten analysiert
+"""
+
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Größe der Pixelstreifen beim Hashen (begrenzt den zusätzlichen Speicher je Seite)
+HASH_STRIP_BYTES = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS page_descriptions (
+    page_hash TEXT NOT NULL,
+    prompt_version INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    model TEXT NOT NULL,
+    source TEXT,
+    page_num INTEGER,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (page_hash, prompt_version)
+);
+"""
+
+
+def page_image_hash(image, strip_bytes: int = HASH_STRIP_BYTES) -> str:
+    """
+    SHA-256 über Pixeldaten, Modus und Größe (unabhängig von der JPEG-Kodierung).
+    Die Pixel werden in Streifen von ca. `strip_bytes` gelesen statt als Kopie der ganzen Seite;
+    der Hash ist identisch mit dem über `image.tobytes()`.
+    """
+    width, height = image.size
+    digest = hashlib.sha256(f"{image.mode}:{width}x{height}:".encode("utf-8"))
+    rows = max(1, strip_bytes // max(1, width * len(image.getbands())))
+    for top in range(0, height, rows):
+        strip = image.crop((0, top, width, min(height, top + rows)))
+        try:
+            digest.update(strip.tobytes())
+        finally:
+            strip.close()
+    return digest.hexdigest()
+
+
+class VisionPageCache:
+    """Beschreibungen je Seitenbild; Einträge einer älteren Prompt-Version werden nicht mehr verwendet"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get(self, page_hash: str, prompt_version: int) -> Optional[str]:
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT description FROM page_descriptions WHERE page_hash = ? AND prompt_version = ?",
+                (page_hash, prompt_version)
+            ).fetchone()
+            if row:
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, page_hash: str, prompt_version: int, description: str, model: str,
+            source: str = None, page_num: int = None):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO page_descriptions "
+                "(page_hash, prompt_version, description, model, source, page_num, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (page_hash, prompt_version, description, model, source, page_num, time.time())
+            )
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict:
+        """Seiten aus dem Cache bzw. ohne Eintrag seit dem letzten Reset sowie Größe des Caches"""
+        with self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM page_descriptions").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": entries
+        }